@@ -34,32 +34,28 @@ class ASX(Indicator):
         # minus spine movement
         self.msm = []
 
-        self.add_managed_sequence(self.psm)
-        self.add_managed_sequence(self.msm)
-
         # smoothed plus spine movement
         self.spsm = []
         # smoothed minus spine movement
         self.smsm = []
 
-        self.add_managed_sequence(self.spsm)
-        self.add_managed_sequence(self.smsm)
-
         # plus spine index
         self.psi = []
         # minus spine index
         self.msi = []
 
-        self.add_managed_sequence(self.psi)
-        self.add_managed_sequence(self.msi)
-
         # spine index
         self.sx = []
-        self.add_managed_sequence(self.sx)
+
+        # 以上序列只在满足条件时追加，跟输入不对齐，不能作为managed sequence按输入逐个弹出；
+        # 每次计算前记录各序列的长度，remove（盘中更新）时回滚到该长度
+        self.sequences = [self.psm, self.msm, self.spsm, self.smsm, self.psi, self.msi, self.sx]
+        self.last_lengths: List[int] = None
 
         self.initialize(input_values)
 
     def _calculate_new_value(self) -> Any:
+        self.last_lengths = [len(lst) for lst in self.sequences]
         if not has_valid_values(self.input_values, 2):
             return None
 
@@ -107,3 +103,24 @@ class ASX(Indicator):
             asx = (self.output_values[-1].asx * (self.period_asx - 1) + self.sx[-1]) / float(self.period_asx)
 
         return ASXVal(asx, self.psi[-1], self.msi[-1])
+
+    def _remove_custom(self) -> None:
+        if self.last_lengths is not None:
+            for lst, length in zip(self.sequences, self.last_lengths):
+                del lst[length:]
+            self.last_lengths = None
+
+    def _remove_all_custom(self) -> None:
+        for lst in self.sequences:
+            lst.clear()
+        self.last_lengths = None
+
+    def _purge_oldest_custom(self, size: int) -> None:
+        # 计算时依赖各序列的长度，所以这些序列只裁剪计算不再需要的头部，避免重新走初始化的分支
+        # 每个序列比计算所需的多保留一个元素：裁剪之后紧接着的盘中更新会先回滚最后一个元素，再重新计算
+        keeps = (self.period_si + 1, self.period_si + 1, 2, 2, 2, 2, self.period_asx + 2)
+        for i, (lst, keep) in enumerate(zip(self.sequences, keeps)):
+            drop = max(0, min(size, len(lst) - keep))
+            del lst[:drop]
+            if self.last_lengths is not None:
+                self.last_lengths[i] -= drop
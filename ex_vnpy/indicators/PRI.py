@@ -124,6 +124,13 @@ class PRI(Indicator):
             self.low = self.low[:-1]
         super().remove()
 
+    def _purge_oldest_custom(self, size: int) -> None:
+        if len(self.open) > 0:
+            self.open = self.open[size:]
+            self.high = self.high[size:]
+            self.close = self.close[size:]
+            self.low = self.low[size:]
+
     def _calculate_new_value(self) -> Any:
         if not has_valid_values(self.input_values, 13):
             return None
@@ -0,0 +1,291 @@
+import logging
+from enum import Enum
+from typing import Any, Dict, List
+
+import numpy as np
+import pandas as pd
+
+from ex_vnpy.manager.bar_store import BarStore, DATETIME_COLUMN, widen
+from ex_vnpy.manager.heikin_ashi import heikin_ashi_values
+
+
+logger = logging.getLogger("BarAggregator")
+
+EXCLUDE_COLUMNS = ['symbol', 'exchange', 'interval', 'symbol_id', 'datetime', 'stype']
+HA_COLUMNS = ['ha_open', 'ha_high', 'ha_low', 'ha_close']
+
+
+class ExInterval(Enum):
+    """
+    vnpy的Interval中没有的聚合周期
+    """
+    MONTHLY = "M"
+
+
+def week_id(ts: pd.Timestamp) -> int:
+    year, week, _ = ts.isocalendar()
+    return year * 100 + week
+
+
+def week_ids(index: pd.DatetimeIndex) -> np.ndarray:
+    """
+    向量化的week_id
+    """
+    iso = index.isocalendar()
+    return iso['year'].to_numpy(dtype=np.int64) * 100 + iso['week'].to_numpy(dtype=np.int64)
+
+
+def week_label(ts: pd.Timestamp) -> pd.Timestamp:
+    # 周线以当周周五为标签
+    return ts.normalize() + pd.Timedelta(days=4 - ts.weekday())
+
+
+def segment_sums(values: np.ndarray, starts: np.ndarray, ends: np.ndarray) -> np.ndarray:
+    """
+    每个分组内按顺序逐个累加，跟增量更新的累加顺序一致，浮点结果逐位相同（reduceat的累加顺序不同）
+    按分组内的偏移向量化，循环次数为最长分组的长度
+    """
+    sums = values[starts].copy()
+    lengths = ends - starts
+    for k in range(1, int(lengths.max()) if len(lengths) > 0 else 0):
+        mask = lengths > k
+        sums[mask] += values[starts[mask] + k]
+    return sums
+
+
+class PeriodAggregator(object):
+    """
+    低级别bar到高级别bar（日线、周线、月线）的流式聚合，子类只需要定义周期的编号和标签
+    1. 初始化：按周期编号对低级别bar做一次向量化的group-by
+    2. 增量：当前周期的OHLC、成交量、成交额、资金流等累计值以标量保存，每根低级别bar O(1)更新；
+       只有跨周期时才提交新的一行，当前周期的数据原地写入存储的最后一行
+    3. 同一根低级别bar的盘中更新，基于当前周期之前的累计值重新合并，不会重复累加
+
+    聚合规则按列名/类型决定：*open取first，*high取max，*low取min，*close取last，其他数值列求和；
+    Heikin-Ashi列根据聚合后的OHLC重新计算
+    """
+
+    def __init__(self, source_interval: Any = None):
+        """Constructor"""
+        self.source_interval: Any = source_interval     # 低级别bar的周期
+        self.store: BarStore = None
+        self.agg_funcs: Dict[str, str] = {}     # 列名 -> 聚合方式(first/max/min/last/sum)
+        self.inited: bool = False
+
+        self.current_id: int = None             # 当前周期的编号
+        self.bar_ts: pd.Timestamp = None        # 最近一根参与聚合的低级别bar时间
+        self.period_ts: pd.Timestamp = None     # 当前周期的标签
+        self.period_ha_open: float = 0.0        # 当前周期的ha_open，由上一周期决定
+        self.current: Dict[str, Any] = {}       # 当前周期的累计值（包含最新一根低级别bar）
+        self.base: Dict[str, Any] = {}          # 当前周期的累计值（不包含最新一根低级别bar）
+        self.has_base: bool = False
+
+    def period_id(self, ts: pd.Timestamp) -> int:
+        raise NotImplementedError
+
+    def period_ids(self, index: pd.DatetimeIndex) -> np.ndarray:
+        raise NotImplementedError
+
+    def period_label(self, ts: pd.Timestamp) -> pd.Timestamp:
+        raise NotImplementedError
+
+    def period_labels(self, index: pd.DatetimeIndex) -> pd.DatetimeIndex:
+        raise NotImplementedError
+
+    def init_columns(self, daily: BarStore) -> List[str]:
+        columns = []
+        for column in daily.columns:
+            if column in EXCLUDE_COLUMNS:
+                continue
+
+            if column in HA_COLUMNS:
+                columns.append(column)
+                continue
+
+            col_type = daily.arrays[column].dtype
+            # 根据数据类型决定聚合函数
+            if column.endswith('open'):
+                self.agg_funcs[column] = 'first'
+            elif column.endswith('high'):
+                self.agg_funcs[column] = 'max'
+            elif column.endswith('low'):
+                self.agg_funcs[column] = 'min'
+            elif column.endswith('close'):
+                self.agg_funcs[column] = 'last'
+            elif col_type.kind in 'if':
+                self.agg_funcs[column] = 'sum'
+            else:
+                logger.warning(f"column not support resample: {column}")
+                continue
+            columns.append(column)
+
+        columns.append(DATETIME_COLUMN)
+        return columns
+
+    def init(self, daily: BarStore):
+        """
+        由全部低级别bar批量聚合：按周期编号分组，每一列用一次reduceat完成聚合
+        """
+        columns = self.init_columns(daily)
+        n = len(daily)
+        index = daily.index
+        ids = self.period_ids(index)
+        starts = np.flatnonzero(np.r_[True, ids[1:] != ids[:-1]])
+        ends = np.r_[starts[1:], n]
+
+        arrays = {}
+        for column, func in self.agg_funcs.items():
+            values = widen(daily.column(column))
+            is_float = values.dtype.kind == 'f'
+            if func == 'first':
+                arrays[column] = values[starts]
+            elif func == 'last':
+                arrays[column] = values[ends - 1]
+            elif func == 'max':
+                arrays[column] = (np.fmax if is_float else np.maximum).reduceat(values, starts)
+            elif func == 'min':
+                arrays[column] = (np.fmin if is_float else np.minimum).reduceat(values, starts)
+            elif is_float:
+                # 跟sum(min_count=1)一致：忽略nan，整个周期都是nan时结果为nan
+                valid = ~np.isnan(values)
+                sums = segment_sums(np.where(valid, values, 0), starts, ends)
+                sums[np.add.reduceat(valid, starts) == 0] = np.nan
+                arrays[column] = sums
+            else:
+                arrays[column] = np.add.reduceat(values, starts)
+
+        ha_open, ha_high, ha_low, ha_close = heikin_ashi_values(arrays['open'].astype(np.float64), arrays['high'].astype(np.float64),
+                                                                arrays['low'].astype(np.float64), arrays['close'].astype(np.float64))
+        arrays.update(ha_open=ha_open, ha_high=ha_high, ha_low=ha_low, ha_close=ha_close)
+
+        labels = self.period_labels(index[starts])
+        arrays[DATETIME_COLUMN] = labels.as_unit('ns').asi8
+        self.store = BarStore.from_arrays(columns, arrays, tz=daily.tz)
+
+        # 恢复当前周期的累计状态，以便后续增量更新
+        self.current_id = int(ids[-1])
+        self.period_ts = labels[-1]
+        self.period_ha_open = ha_open[-1]
+        self.has_base = False
+        for pos in range(starts[-1], n - 1):
+            self.accumulate(daily, pos)
+            self.base, self.current = self.current, self.base
+            self.has_base = True
+        self.accumulate(daily, n - 1)
+        self.bar_ts = index[-1]
+        self.inited = True
+
+    def accumulate(self, daily: BarStore, pos: int):
+        """
+        当前周期的累计值(base)与低级别bar pos位置的bar合并，结果写入current
+        """
+        current = self.current
+        arrays = daily.arrays
+        if not self.has_base:
+            for column in self.agg_funcs:
+                current[column] = widen(arrays[column][pos])
+        else:
+            base = self.base
+            for column, func in self.agg_funcs.items():
+                value = widen(arrays[column][pos])
+                if func == 'first':
+                    current[column] = base[column]
+                elif func == 'last':
+                    current[column] = value
+                elif func == 'max':
+                    current[column] = max(base[column], value)
+                elif func == 'min':
+                    current[column] = min(base[column], value)
+                else:
+                    current[column] = base[column] + value
+
+        current['ha_close'] = (current['open'] + current['high'] + current['low'] + current['close']) / 4
+        current['ha_open'] = self.period_ha_open
+        current['ha_high'] = max(current['high'], current['ha_open'], current['ha_close'])
+        current['ha_low'] = min(current['low'], current['ha_open'], current['ha_close'])
+        current[DATETIME_COLUMN] = self.period_ts
+
+    def update(self, daily: BarStore) -> bool:
+        """
+        低级别bar的最后一根（新增或盘中更新）合并到当前周期
+        :return: 是否新开了一个周期（提交了新的一行）
+        """
+        pos = len(daily) - 1
+        ts = daily.timestamp(pos)
+        new_id = self.period_id(ts)
+        opened = False
+        if ts == self.bar_ts:
+            # 同一根低级别bar的盘中更新，基于之前的累计值重新合并
+            self.accumulate(daily, pos)
+            self.store.update_last(self.current)
+        elif new_id == self.current_id:
+            self.base, self.current = self.current, self.base
+            self.has_base = True
+            self.accumulate(daily, pos)
+            self.store.update_last(self.current)
+        else:
+            # 跨周期，上一周期已经定型，提交新的一行
+            self.period_ha_open = (self.current['ha_open'] + self.current['ha_close']) / 2
+            self.current_id = new_id
+            self.period_ts = self.period_label(ts)
+            self.has_base = False
+            self.accumulate(daily, pos)
+            self.store.append(self.current)
+            opened = True
+        self.bar_ts = ts
+        return opened
+
+
+class DayAggregator(PeriodAggregator):
+    """
+    分钟线/小时线到日线的流式聚合，日线以当天0点为标签
+    """
+
+    def period_id(self, ts: pd.Timestamp) -> int:
+        return ts.year * 10000 + ts.month * 100 + ts.day
+
+    def period_ids(self, index: pd.DatetimeIndex) -> np.ndarray:
+        return index.year.to_numpy(dtype=np.int64) * 10000 + index.month.to_numpy(dtype=np.int64) * 100 + \
+            index.day.to_numpy(dtype=np.int64)
+
+    def period_label(self, ts: pd.Timestamp) -> pd.Timestamp:
+        return ts.normalize()
+
+    def period_labels(self, index: pd.DatetimeIndex) -> pd.DatetimeIndex:
+        return index.normalize()
+
+
+class WeekAggregator(PeriodAggregator):
+    """
+    日线到周线的流式聚合，按ISO周编号分组，周线以当周周五为标签
+    """
+
+    def period_id(self, ts: pd.Timestamp) -> int:
+        return week_id(ts)
+
+    def period_ids(self, index: pd.DatetimeIndex) -> np.ndarray:
+        return week_ids(index)
+
+    def period_label(self, ts: pd.Timestamp) -> pd.Timestamp:
+        return week_label(ts)
+
+    def period_labels(self, index: pd.DatetimeIndex) -> pd.DatetimeIndex:
+        return index.normalize() + pd.to_timedelta(4 - index.weekday, unit='D')
+
+
+class MonthAggregator(PeriodAggregator):
+    """
+    日线到月线的流式聚合，月线以当月最后一天为标签（跟pandas按月resample一致）
+    """
+
+    def period_id(self, ts: pd.Timestamp) -> int:
+        return ts.year * 100 + ts.month
+
+    def period_ids(self, index: pd.DatetimeIndex) -> np.ndarray:
+        return index.year.to_numpy(dtype=np.int64) * 100 + index.month.to_numpy(dtype=np.int64)
+
+    def period_label(self, ts: pd.Timestamp) -> pd.Timestamp:
+        return ts.normalize() + pd.offsets.MonthEnd(0)
+
+    def period_labels(self, index: pd.DatetimeIndex) -> pd.DatetimeIndex:
+        return index.normalize() + pd.offsets.MonthEnd(0)
@@ -0,0 +1,91 @@
+import logging
+from typing import Any, List, Mapping
+
+import numpy as np
+import pandas as pd
+from pandas import DataFrame
+
+from ex_vnpy.object import ExBarData
+
+
+logger = logging.getLogger("BarLoader")
+
+EXCLUDE_COLUMNS = ['symbol_id', 'symbol', 'exchange', 'interval']      # 每个标的取值固定的列，不进入bar数据
+PRICE_ALIASES = {'open_price': 'open', 'high_price': 'high', 'low_price': 'low', 'close_price': 'close'}
+REQUIRED_COLUMNS = ['datetime', 'open', 'high', 'low', 'close']
+
+
+def bar_columns() -> List[str]:
+    """
+    SourceManager中bar数据的列，跟ExBarData.to_dict的列名一致
+    """
+    return ExBarData.columns(exclude=EXCLUDE_COLUMNS)
+
+
+def project_columns(names: List[str]) -> List[str]:
+    """
+    列式数据中需要读取的列：ExBarData中有的列，价格列可以是open/high/low/close，也可以是open_price等
+    """
+    needed = set(bar_columns())
+    return [name for name in names if PRICE_ALIASES.get(name, name) in needed]
+
+
+def column_names(data: Any) -> List[str]:
+    if isinstance(data, DataFrame):
+        return list(data.columns)
+    if hasattr(data, 'column_names'):     # pyarrow.Table
+        return list(data.column_names)
+    return list(data.keys())
+
+
+def load_columns(data: Mapping[str, Any]) -> DataFrame:
+    """
+    列式数据（dict、DataFrame、pyarrow.Table等按列名取列的对象）转为SourceManager初始化用的DataFrame
+    1. 只保留需要的列（见project_columns），按ExBarData的列顺序排列，数值列直接引用原数组，不经过ExBarData
+    2. datetime列转为pandas的时间类型，保留时区
+    """
+    names = {PRICE_ALIASES.get(name, name): name for name in project_columns(column_names(data))}
+    missing = [name for name in REQUIRED_COLUMNS if name not in names]
+    if missing:
+        raise ValueError(f"[BarLoader] required columns not found: {missing}")
+
+    columns = {}
+    for name in bar_columns():
+        if name not in names:
+            continue
+        values = data[names[name]]
+        if hasattr(values, 'to_pandas'):    # pyarrow的列
+            values = values.to_pandas()
+        if name == 'datetime':
+            columns[name] = pd.DatetimeIndex(values)
+        else:
+            columns[name] = values.to_numpy() if hasattr(values, 'to_numpy') else np.asarray(values)
+    return DataFrame(columns)
+
+
+def first_value(data: Mapping[str, Any], name: str) -> Any:
+    """
+    列式数据中某一列的第一个值，列不存在或者为空时返回None
+    """
+    if name not in column_names(data):
+        return None
+    values = data[name]
+    if len(values) == 0:
+        return None
+    value = values.iloc[0] if hasattr(values, 'iloc') else values[0]
+    return value.as_py() if hasattr(value, 'as_py') else value
+
+
+def read_parquet(path: str, columns: List[str] = None) -> Any:
+    """
+    以memory map的方式打开Parquet文件，只读取需要的列（以及标的信息列），返回pyarrow.Table
+    :param columns: 额外限定读取的bar数据列，默认为ExBarData中有的全部列
+    """
+    import pyarrow.parquet as pq      # 可选依赖，只有读取Parquet时才需要
+
+    schema_names = pq.read_schema(path).names
+    names = project_columns(schema_names)
+    if columns is not None:
+        names = [name for name in names if PRICE_ALIASES.get(name, name) in columns or PRICE_ALIASES.get(name, name) in REQUIRED_COLUMNS]
+    names += [name for name in EXCLUDE_COLUMNS if name in schema_names]
+    return pq.read_table(path, columns=names, memory_map=True)
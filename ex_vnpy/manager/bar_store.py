@@ -0,0 +1,364 @@
+import logging
+from typing import Any, Dict, List
+
+import numpy as np
+import pandas as pd
+from pandas import DataFrame, DatetimeIndex, Series
+
+
+logger = logging.getLogger("BarStore")
+
+DATETIME_COLUMN = 'datetime'
+WIDE_DTYPES = {'i': np.dtype(np.int64), 'f': np.dtype(np.float64)}      # 紧凑存储的窄类型参与计算前转回的64位类型
+
+
+def compact_dtype(values: np.ndarray) -> np.dtype:
+    """
+    无损的紧凑类型：整数的取值范围在int32以内时为int32，浮点数转为float32后取值不变时为float32，否则返回None
+    """
+    kind = values.dtype.kind
+    if kind not in WIDE_DTYPES or values.dtype.itemsize <= 4:
+        return None
+    if kind == 'i':
+        info = np.iinfo(np.int32)
+        if len(values) == 0 or (values.min() >= info.min and values.max() <= info.max):
+            return np.dtype(np.int32)
+    elif np.array_equal(values.astype(np.float32), values, equal_nan=True):
+        return np.dtype(np.float32)
+    return None
+
+
+def widen(values: Any) -> Any:
+    """
+    紧凑存储的int32/float32（数组或numpy标量）转回64位，其他类型原样返回
+    """
+    dtype = getattr(values, 'dtype', None)
+    if dtype is None or dtype.itemsize >= 8 or dtype.kind not in WIDE_DTYPES:
+        return values
+    return values.astype(WIDE_DTYPES[dtype.kind])
+
+
+class BarStore(object):
+    """
+    列式bar数据存储
+    1. 每一列对应一个预分配的numpy数组，容量不足时按2倍扩容，append为均摊O(1)
+    2. datetime列以int64(ns)存储，时区单独记录
+    3. DataFrame视图在访问时才构建，并缓存到下一次数据变动
+    4. 紧凑存储（compact_columns）：取值范围允许的列以int32/float32存放，读取单个值、DataFrame视图时转回64位，
+       写入的值超出范围或者有精度损失时，整列转回64位，结果跟非紧凑存储完全一致
+    """
+
+    def __init__(self, columns: List[str], capacity: int = 256):
+        """Constructor"""
+        self.columns: List[str] = list(columns)
+        self.capacity: int = max(capacity, 1)
+        self.size: int = 0
+        self.offset: int = 0        # 已经从头部裁剪掉的行数，offset + pos 即为行的绝对位置
+        self.tz: Any = None
+        self.arrays: Dict[str, np.ndarray] = {}
+        self.version: int = 0       # 数据每变动一次加1，用于判断视图缓存是否失效
+
+        self._df: DataFrame = None
+        self._df_version: int = -1
+        self._index: DatetimeIndex = None
+        self._index_version: int = -1
+
+    @classmethod
+    def from_dataframe(cls, df: DataFrame, capacity: int = 256) -> 'BarStore':
+        if len(df) == 0:
+            return cls(df.columns, capacity=capacity)
+
+        arrays = {}
+        tz = None
+        for name in df.columns:
+            if name == DATETIME_COLUMN:
+                index = pd.DatetimeIndex(df[name])
+                tz = index.tz
+                arrays[name] = index.as_unit('ns').asi8
+            else:
+                arrays[name] = df[name].to_numpy()
+        return cls.from_arrays(df.columns, arrays, tz=tz, capacity=capacity)
+
+    @classmethod
+    def from_arrays(cls, columns: List[str], arrays: Dict[str, np.ndarray], tz: Any = None, capacity: int = 256) -> 'BarStore':
+        """
+        直接由列数组构建，datetime列为int64(ns)
+        """
+        size = len(arrays[DATETIME_COLUMN])
+        store = cls(columns, capacity=max(capacity, size * 2))
+        store.tz = tz
+        for name in store.columns:
+            values = np.asarray(arrays[name])
+            arr = np.empty(store.capacity, dtype=values.dtype)
+            arr[:size] = values
+            store.arrays[name] = arr
+
+        store.size = size
+        store.version += 1
+        return store
+
+    def __len__(self) -> int:
+        return self.size
+
+    def __getstate__(self) -> Dict[str, Any]:
+        """
+        序列化时去掉DataFrame视图缓存，并且只保留有效的行
+        """
+        state = dict(self.__dict__)
+        state['_df'], state['_df_version'] = None, -1
+        state['_index'], state['_index_version'] = None, -1
+        if self.size > 0:
+            state['arrays'] = {name: arr[:self.size].copy() for name, arr in self.arrays.items()}
+            state['capacity'] = self.size
+        return state
+
+    def _to_ns(self, value: Any) -> int:
+        ts = pd.Timestamp(value)
+        if self.size == 0 and self.tz is None:
+            self.tz = ts.tz
+        return ts.value
+
+    @staticmethod
+    def _dtype_of(value: Any) -> np.dtype:
+        if isinstance(value, (bool, np.bool_)):
+            return np.dtype(bool)
+        elif isinstance(value, (int, np.integer)):
+            return np.dtype(np.int64)
+        elif value is None or isinstance(value, (float, np.floating)):
+            return np.dtype(np.float64)
+        return np.dtype(object)
+
+    def _allocate(self, row: Dict[str, Any]):
+        for name in self.columns:
+            dtype = np.dtype(np.int64) if name == DATETIME_COLUMN else self._dtype_of(row.get(name))
+            self.arrays[name] = np.empty(self.capacity, dtype=dtype)
+
+    def _grow(self, min_capacity: int):
+        new_capacity = self.capacity
+        while new_capacity < min_capacity:
+            new_capacity *= 2
+
+        for name, arr in self.arrays.items():
+            new_arr = np.empty(new_capacity, dtype=arr.dtype)
+            new_arr[:self.size] = arr[:self.size]
+            self.arrays[name] = new_arr
+        self.capacity = new_capacity
+
+    def _upcast(self, name: str, value: Any) -> np.ndarray:
+        """
+        跟pandas一样，写入的值跟列类型不兼容时，对整列进行类型提升
+        """
+        arr = self.arrays[name]
+        if arr.dtype.kind in 'iu' and (value is None or isinstance(value, (float, np.floating))):
+            dtype = np.float64
+        else:
+            dtype = object
+        logger.debug(f"[BarStore] column {name} upcast: {arr.dtype} -> {np.dtype(dtype)}")
+        return self._astype(name, dtype)
+
+    def _astype(self, name: str, dtype: Any) -> np.ndarray:
+        self.arrays[name] = self.arrays[name].astype(dtype)
+        return self.arrays[name]
+
+    def compact_columns(self):
+        """
+        把现有的数值列转为无损的紧凑类型（见compact_dtype），datetime列保持int64
+        """
+        for name in self.columns:
+            if name == DATETIME_COLUMN or name not in self.arrays:
+                continue
+            dtype = compact_dtype(self.column(name))
+            if dtype is not None:
+                with np.errstate(over='ignore', invalid='ignore'):      # 容量以内未使用的部分可能是任意值
+                    self._astype(name, dtype)
+        self.version += 1
+
+    @staticmethod
+    def _fits(dtype: np.dtype, value: Any) -> bool:
+        """
+        值能否无损写入紧凑类型的列
+        """
+        try:
+            if dtype.kind in 'iu':
+                info = np.iinfo(dtype)
+                return info.min <= value <= info.max
+            return value != value or float(np.float32(value)) == value
+        except (TypeError, ValueError):
+            return False
+
+    def _write(self, name: str, pos: int, value: Any):
+        if name == DATETIME_COLUMN:
+            self.arrays[name][pos] = self._to_ns(value)
+            return
+
+        arr = self.arrays[name]
+        kind = arr.dtype.kind
+        if (kind in 'iu' and not isinstance(value, (int, np.integer))) or \
+                (kind == 'b' and not isinstance(value, (bool, np.bool_))):
+            arr = self._upcast(name, value)
+        elif kind == 'f' and value is None:
+            value = np.nan
+        if arr.dtype.itemsize < 8 and arr.dtype.kind in WIDE_DTYPES and not self._fits(arr.dtype, value):
+            logger.debug(f"[BarStore] column {name} widen: {arr.dtype}")
+            arr = self._astype(name, WIDE_DTYPES[arr.dtype.kind])
+
+        try:
+            arr[pos] = value
+        except (TypeError, ValueError):
+            arr = self._upcast(name, value)
+            arr[pos] = value
+
+    def append(self, row: Dict[str, Any]):
+        """
+        追加一行数据，row中不存在的列按空值处理
+        """
+        if not self.arrays:
+            self._allocate(row)
+        elif self.size >= self.capacity:
+            self._grow(self.size + 1)
+
+        pos = self.size
+        for name in self.columns:
+            self._write(name, pos, row.get(name))
+        self.size += 1
+        self.version += 1
+
+    def update_last(self, row: Dict[str, Any]):
+        """
+        覆盖最后一行数据（同一根bar的盘中更新）
+        """
+        pos = self.size - 1
+        for name in self.columns:
+            if name in row:
+                self._write(name, pos, row[name])
+        self.version += 1
+
+    def trim(self, n: int):
+        """
+        从头部裁剪掉n行，剩余数据原地前移，容量不变
+        """
+        n = min(max(n, 0), self.size)
+        if n == 0:
+            return
+
+        remain = self.size - n
+        for arr in self.arrays.values():
+            arr[:remain] = arr[n:self.size]
+        self.size = remain
+        self.offset += n
+        self.version += 1
+
+    def _position(self, pos: int) -> int:
+        ix = pos if pos >= 0 else self.size + pos
+        if ix < 0 or ix >= self.size:
+            raise IndexError(f"BarStore position out of range: {pos}")
+        return ix
+
+    def column(self, name: str) -> np.ndarray:
+        """
+        列数据的只读视图（不复制），datetime列为int64(ns)，紧凑存储的列为int32/float32，参与计算前需要widen
+        """
+        if not self.arrays:
+            return np.empty(0)
+        return self.arrays[name][:self.size]
+
+    def value(self, name: str, pos: int = -1) -> Any:
+        if name == DATETIME_COLUMN:
+            return self.timestamp(pos)
+        return widen(self.arrays[name][self._position(pos)])
+
+    def timestamp(self, pos: int = -1) -> pd.Timestamp:
+        ts = pd.Timestamp(int(self.arrays[DATETIME_COLUMN][self._position(pos)]))
+        return ts.tz_localize('UTC').tz_convert(self.tz) if self.tz is not None else ts
+
+    def row(self, pos: int = -1) -> Series:
+        """
+        单行数据，跟DataFrame.iloc[pos]的结果一致：以列名为index，以时间为name
+        """
+        ix = self._position(pos)
+        ts = self.timestamp(ix)
+        values = [ts if name == DATETIME_COLUMN else widen(self.arrays[name][ix]) for name in self.columns]
+        return Series(data=values, index=self.columns, name=ts, dtype=object)
+
+    def view(self, pos: int = -1) -> 'BarRow':
+        """
+        单行数据的只读视图，不复制数据，可以直接作为指标的输入
+        """
+        return BarRow(self, self.offset + self._position(pos))
+
+    def views(self) -> List['BarRow']:
+        return [BarRow(self, self.offset + ix) for ix in range(self.size)]
+
+    @property
+    def index(self) -> DatetimeIndex:
+        if self._index_version != self.version:
+            values = self.column(DATETIME_COLUMN).astype(np.int64).view('M8[ns]')
+            index = pd.DatetimeIndex(values, name=DATETIME_COLUMN)
+            if self.tz is not None:
+                index = index.tz_localize('UTC').tz_convert(self.tz)
+            self._index = index
+            self._index_version = self.version
+        return self._index
+
+    def memory_usage(self) -> Dict[str, int]:
+        """
+        占用的字节数：arrays为列数组（按容量预分配），frame为缓存的DataFrame视图
+        """
+        arrays = sum(arr.nbytes for arr in self.arrays.values())
+        frame = int(self._df.memory_usage(deep=True).sum()) if self._df is not None else 0
+        return {'arrays': arrays, 'frame': frame}
+
+    def to_dataframe(self) -> DataFrame:
+        """
+        按需构建DataFrame视图，数据未变动时重复访问直接返回缓存
+        """
+        if self._df_version != self.version:
+            index = self.index
+            if self.size == 0:
+                df = DataFrame(columns=self.columns, index=index)
+            else:
+                data = {name: (index if name == DATETIME_COLUMN else widen(self.arrays[name][:self.size])) for name in self.columns}
+                df = DataFrame(data=data, index=index, columns=self.columns)
+            self._df = df
+            self._df_version = self.version
+        return self._df
+
+
+class BarRow(object):
+    """
+    BarStore中一行数据的只读视图，按属性名读取对应列的值，替代ExBarData作为指标的输入
+    1. 只记录存储和行的绝对位置，读取时才访问列数组，存储扩容、裁剪头部之后依然指向同一行
+    2. 同一根bar盘中更新后，读到的是更新后的值（指标通过update重新计算最后一个输入，跟原来一致）
+    """
+
+    __slots__ = ('store', 'pos')
+
+    def __init__(self, store: BarStore, pos: int):
+        """Constructor"""
+        self.store: BarStore = store
+        self.pos: int = pos         # 绝对位置
+
+    def __getattr__(self, name: str) -> Any:
+        if name in BarRow.__slots__ or name.startswith('__'):
+            raise AttributeError(name)
+
+        store = self.store
+        ix = self.pos - store.offset
+        if name == DATETIME_COLUMN:
+            return store.timestamp(ix)
+        arr = store.arrays.get(name)
+        if arr is None:
+            raise AttributeError(f"BarRow has no column {name}")
+        return arr.item(ix)
+
+    def __getitem__(self, name: str) -> Any:
+        """
+        按列名读取，跟DataFrame的行一致
+        """
+        try:
+            return self.__getattr__(name)
+        except AttributeError:
+            raise KeyError(name)
+
+    def __repr__(self) -> str:
+        return f"BarRow(pos={self.pos})"
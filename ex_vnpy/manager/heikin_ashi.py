@@ -0,0 +1,25 @@
+import numpy as np
+
+
+def heikin_ashi_values(open: np.ndarray, high: np.ndarray, low: np.ndarray, close: np.ndarray):
+    """
+    批量计算Heikin-Ashi蜡烛图的值
+    :return: ha_open, ha_high, ha_low, ha_close
+    """
+    ha_close = (open + high + low + close) / 4
+    if len(open) == 0:
+        return open.copy(), high.copy(), low.copy(), ha_close
+
+    # ha_open[i] = (ha_open[i-1] + ha_close[i-1]) / 2 是逐行依赖的递推，用普通的float循环求值（不是向量化），
+    # 运算顺序跟逐根bar计算(heikin_ashi_row)相同，结果完全一致；其余的列按数组一次计算
+    last_open = float(open[0])
+    ha_open = [last_open]
+    for last_close in ha_close[:-1].tolist():
+        last_open = (last_open + last_close) / 2
+        ha_open.append(last_open)
+    ha_open = np.array(ha_open, dtype=np.float64)
+
+    # fmax/fmin 忽略nan，跟DataFrame.max(axis=1)的行为一致
+    ha_high = np.fmax(np.fmax(high, ha_open), ha_close)
+    ha_low = np.fmin(np.fmin(low, ha_open), ha_close)
+    return ha_open, ha_high, ha_low, ha_close
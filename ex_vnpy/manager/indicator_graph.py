@@ -0,0 +1,197 @@
+import json
+import logging
+import sys
+from typing import Any, Callable, Dict, List, Tuple
+
+import numpy as np
+
+import talipp.indicators as tainds
+from talipp.indicators.Indicator import Indicator
+
+import ex_vnpy.indicators as exinds
+from ex_vnpy.manager.bar_store import BarStore
+from ex_vnpy.manager.indicator_warmup import warm_up
+
+
+logger = logging.getLogger("IndicatorGraph")
+
+
+def macd_params(ind: tainds.MACD) -> tuple:
+    if any(type(ma) is not tainds.EMA for ma in (ind.ma_fast, ind.ma_slow, ind.signal_line)):
+        return None
+    return ind.ma_fast.period, ind.ma_slow.period, ind.signal_line.period
+
+
+# 可以共享的指标：类型 -> 由指标对象还原构造参数，跟ta配置中的params一致；返回None表示不能共享
+NODE_PARAMS: Dict[type, Callable[[Indicator], tuple]] = {
+    tainds.EMA: lambda ind: (ind.period,),
+    tainds.ATR: lambda ind: (ind.period,),
+    tainds.MACD: macd_params,
+    exinds.CFNI: lambda ind: (ind.dim,),
+}
+
+
+def object_nbytes(value: Any, seen: set) -> int:
+    """
+    指标内部数据的近似字节数：列表逐个元素累加，输出的dataclass按属性累加，同一个对象只计一次
+    """
+    if id(value) in seen:
+        return 0
+    seen.add(id(value))
+    size = sys.getsizeof(value)
+    if isinstance(value, (list, tuple)):
+        size += sum(object_nbytes(item, seen) for item in value)
+    elif hasattr(value, '__dict__') and not isinstance(value, (Indicator, type)):
+        size += sum(object_nbytes(item, seen) for item in vars(value).values())
+    return size
+
+
+def node_params(ind: Indicator) -> tuple:
+    func = NODE_PARAMS.get(type(ind))
+    if func is None or len(ind.output_listeners) > 0 or \
+            getattr(ind, 'input_modifier', None) is not None or getattr(ind, 'input_sampler', None) is not None:
+        return None
+    return func(ind)
+
+
+class IndicatorGraph(object):
+    """
+    指标的依赖图，ta配置中的指标以及它们的子指标按 (类型, 参数, 输入列, 周期) 规范化，相同的计算只保留一份
+    1. 子指标（sub_indicators，跟父指标的输入相同）如果可以由NODE_PARAMS还原参数，就从父指标中摘出来，成为图中的节点，
+       父指标的属性指向共享的节点。如CFNIDays/CFNIS/CFNISN共用一个CFNI，ASX、ADX跟配置的ATR共用一个ATR
+    2. 输入相同的节点归为一组，组内按依赖顺序排列（子指标在前），每根bar每个节点只计算一次
+    3. 多列输入的指标读取的都是存储的同一个行视图（BarRow），跟声明的输入列无关，因此规范为同一个输入(None)
+    4. 每根bar每个周期只取一次最后一行的视图，分发给该周期的所有组；新增还是盘中更新由调用方的事件决定
+    """
+
+    def __init__(self):
+        """Constructor"""
+        self.nodes: Dict[tuple, Indicator] = {}
+        self.subs: Dict[tuple, List[tuple]] = {}                     # 节点 -> 直接依赖的子节点
+        self.groups: Dict[Tuple[Any, str], List[tuple]] = {}        # (周期, 输入列) -> 按依赖顺序排列的节点
+        self.columns: Dict[Tuple[Any, str], List[str]] = {}          # (周期, 输入列) -> 批量预热需要的列
+        self.feeds: Dict[Any, List[Tuple[str, List[Indicator]]]] = {}   # 周期 -> [(输入列, 按依赖顺序排列的指标)]
+
+    @staticmethod
+    def input_key(input_names: List[str]) -> str:
+        return input_names[0] if len(input_names) == 1 else None
+
+    def add(self, ind: Indicator, params: tuple, input_names: List[str], interval: Any) -> Indicator:
+        """
+        加入ta配置中的一个指标，已经有相同的计算时返回共享的指标对象
+        """
+        group_key = (interval, self.input_key(input_names))
+        columns = self.columns.setdefault(group_key, [])
+        columns.extend(name for name in input_names if name not in columns)
+
+        shared_params = node_params(ind)
+        return self.add_node(ind, shared_params if shared_params is not None else params, group_key)
+
+    def add_node(self, ind: Indicator, params: tuple, group_key: Tuple[Any, str]) -> Indicator:
+        key = (type(ind), json.dumps(list(params), default=str)) + group_key
+        if key in self.nodes:
+            return self.nodes[key]
+
+        subs = []
+        for sub in list(ind.sub_indicators):
+            sub_params = node_params(sub)
+            if sub_params is None:
+                continue
+
+            shared = self.add_node(sub, sub_params, group_key)
+            # 子指标改由图统一输入，父指标只引用它的输出
+            ind.sub_indicators.remove(sub)
+            if shared is not sub:
+                for name, value in list(vars(ind).items()):
+                    if value is sub:
+                        setattr(ind, name, shared)
+            subs.append((type(sub), json.dumps(list(sub_params), default=str)) + group_key)
+
+        self.nodes[key] = ind
+        self.subs[key] = subs
+        self.groups.setdefault(group_key, []).append(key)
+        self.feed_nodes(group_key).append(ind)
+        return ind
+
+    def feed_nodes(self, group_key: Tuple[Any, str]) -> List[Indicator]:
+        interval, input_name = group_key
+        feeds = self.feeds.setdefault(interval, [])
+        for name, nodes in feeds:
+            if name == input_name:
+                return nodes
+        feeds.append((input_name, []))
+        return feeds[-1][1]
+
+    def initialize(self, group_key: Tuple[Any, str], input_values: list, columns: Dict[str, np.ndarray] = None):
+        """
+        用历史数据初始化一组节点
+        1. 指定columns时先按依赖顺序尝试批量预热，父指标的预热会重写共享的子指标，结果相同
+        2. 预热失败的节点，连同它依赖的节点，逐根bar按依赖顺序输入
+        """
+        keys = self.groups[group_key]
+        pending = set()
+        for key in keys:
+            if columns is None or not warm_up(self.nodes[key], input_values, columns):
+                pending.add(key)
+
+        # 父节点在子节点之后，倒序遍历即可把依赖传递下去
+        for key in reversed(keys):
+            if key in pending:
+                pending.update(self.subs[key])
+
+        nodes = [self.nodes[key] for key in keys if key in pending]
+        for ind in nodes:
+            ind.remove_all()
+        for value in input_values:
+            for ind in list(nodes):
+                try:
+                    ind.add(value)
+                except Exception as e:
+                    # 跟单独初始化一致：出错的指标不再继续输入
+                    logger.error(f"[IG] indicator initialize error! {type(ind).__name__}: {e}")
+                    nodes.remove(ind)
+
+    def feed(self, interval: Any, source: BarStore, opened: bool):
+        """
+        周期interval的最后一根bar输入该周期的所有指标
+        :param opened: True为新开的bar（add），False为最后一根bar的盘中更新（update）
+        """
+        feeds = self.feeds.get(interval)
+        if not feeds:
+            return
+
+        row = source.view(-1)
+        for input_name, nodes in feeds:
+            value = row if input_name is None else getattr(row, input_name)
+            if opened:
+                for ind in nodes:
+                    ind.add(value)
+            else:
+                for ind in nodes:
+                    ind.update(value)
+
+    def purge_oldest(self, group_key: Tuple[Any, str], size: int):
+        for key in self.groups[group_key]:
+            self.nodes[key].purge_oldest(size)
+
+    def memory_usage(self) -> int:
+        """
+        所有节点的近似字节数，子指标、共享的输入只计一次
+        """
+        seen = set()
+        size = 0
+        for ind in self.nodes.values():
+            stack = [ind]
+            while stack:
+                node = stack.pop()
+                if id(node) in seen:
+                    continue
+                seen.add(id(node))
+                for value in vars(node).values():
+                    if isinstance(value, Indicator):
+                        stack.append(value)
+                    elif isinstance(value, list) and value and isinstance(value[0], Indicator):
+                        stack.extend(value)
+                    else:
+                        size += object_nbytes(value, seen)
+        return size
@@ -0,0 +1,96 @@
+from dataclasses import fields, is_dataclass
+from typing import Any, Dict, List, Tuple, Union
+
+from talipp.indicators import Indicator
+
+
+class IndicatorOutputs(object):
+    """
+    指标输出的增量缓存，内容跟SourceManager.get_indicator_values一致
+    1. 每个输出名对应一个列表，复合指标按字段拆分，并且已经去掉头部的None值
+    2. 同步时只重新读取最后一个输出值（盘中更新可能改变它）以及新增的输出值，不再对整个历史做composite_to_lists
+    3. 指标被purge_oldest裁剪时，需要同步调用purge
+    4. 对外只提供只读的tuple视图（views），每次同步之后第一次读取时生成，之后重复读取直接返回
+    """
+
+    def __init__(self, indicator: Indicator, output_names: Union[str, Dict[str, str]]):
+        """Constructor"""
+        self.indicator: Indicator = indicator
+
+        # 输出名 -> 复合指标的字段名，非复合指标为None
+        self.fields: Dict[str, str] = {}
+        output_type = indicator.get_output_value_type()
+        if is_dataclass(output_type):
+            self.fields = {f.name: f.name for f in fields(output_type)}
+            for new_name, origin_name in output_names.items():
+                if new_name != origin_name:        # 名字存在映射
+                    self.fields[new_name] = self.fields.pop(origin_name)
+        else:
+            self.fields = {output_names: None}
+
+        self.columns: Dict[str, List[Any]] = {}
+        self.starts: Dict[str, int] = {}        # 每个列表第一个元素在指标输出中的位置，列表为空时为None
+        self.synced: int = 0                    # 已经同步的输出数量
+        self.version: int = -1
+        self.frozen: Dict[str, Tuple[Any, ...]] = None     # columns的只读视图，同步或裁剪之后失效
+        self.reset()
+
+    def reset(self):
+        self.columns = {name: [] for name in self.fields}
+        self.starts = {name: None for name in self.fields}
+        self.synced = 0
+        self.version = -1
+        self.frozen = None
+
+    def views(self) -> Dict[str, Tuple[Any, ...]]:
+        """
+        各输出的只读视图，调用方不能借此修改缓存
+        """
+        if self.frozen is None:
+            self.frozen = {name: tuple(column) for name, column in self.columns.items()}
+        return self.frozen
+
+    def sync(self):
+        self.frozen = None
+        values = self.indicator.output_values
+        n = len(values)
+        pos = max(0, min(self.synced, n) - 1)
+
+        for name, column in self.columns.items():
+            start = self.starts[name]
+            if start is not None:
+                del column[max(0, pos - start):]
+                if len(column) == 0:
+                    self.starts[name] = None
+
+        for i in range(pos, n):
+            value = values[i]
+            for name, field in self.fields.items():
+                item = value if field is None or value is None else getattr(value, field)
+                column = self.columns[name]
+                if len(column) == 0:
+                    if item is None:
+                        continue
+                    self.starts[name] = i
+                column.append(item)
+        self.synced = n
+
+    def purge(self, size: int):
+        """
+        指标输出的头部被裁剪了size个
+        """
+        self.frozen = None
+        self.synced = max(0, self.synced - size)
+        for name, column in self.columns.items():
+            start = self.starts[name]
+            if start is None:
+                continue
+
+            drop = max(0, size - start)
+            start = start - size + drop
+            del column[:drop]
+            # 裁剪之后新的头部可能是None
+            while len(column) > 0 and column[0] is None:
+                del column[0]
+                start += 1
+            self.starts[name] = start if len(column) > 0 else None
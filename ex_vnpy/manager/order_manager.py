@@ -1,5 +1,5 @@
 import logging
-from datetime import datetime, timedelta
+from datetime import datetime
 from typing import Any
 
 from vnpy.trader.object import OrderData
@@ -8,6 +8,8 @@ from vnpy.trader.utility import round_to
 from vnpy_ctastrategy import StopOrder, CtaTemplate
 from vnpy_ctastrategy.base import STOPORDER_PREFIX, StopOrderStatus
 
+from ex_vnpy.manager.trading_calendar import DUPLICATE_DAYS, DUPLICATE_TRADING_DAYS, TradingCalendar, in_duplicate_window
+
 logger = logging.getLogger("OrderManager")
 
 
@@ -175,11 +177,14 @@ class OrderManager(object):
 
         return order.vt_orderid
 
-    def is_signal_duplicated(self, today: datetime, trigger_price: float):
+    in_duplicate_window = staticmethod(in_duplicate_window)
+
+    def is_signal_duplicated(self, today: datetime, trigger_price: float, calendar: TradingCalendar = None):
         """
         连续出现相同信号，但是价格却在不断抬高，应该过滤掉
         :param today:
         :param trigger_price:
+        :param calendar: 交易日历（SourceManager.calendar），指定时按交易日判断窗口，避免节假日的影响；不指定时按自然日
         :return:
         """
         if self.stop_order_count <= 0:
@@ -187,16 +192,17 @@ class OrderManager(object):
 
         stop_order_id = f"{STOPORDER_PREFIX}.{self.stop_order_count}"
         last_stop_order = self.stop_orders[stop_order_id]
-        if last_stop_order.datetime + timedelta(days=14) >= today and last_stop_order.trigger_price <= trigger_price:
+        if self.in_duplicate_window(last_stop_order.datetime, today, calendar) and last_stop_order.trigger_price <= trigger_price:
             logger.info("[OM][Signal_Duplicated] date: {}, last_trigger_price: {:.2f}, new_trigger_price: {:.2f} (dropped)".format(today.strftime("%Y-%m-%d"), last_stop_order.trigger_price, trigger_price))
             return True
         return False
 
-    def is_limit_signal_duplicated(self, today: datetime, buy_price: float):
+    def is_limit_signal_duplicated(self, today: datetime, buy_price: float, calendar: TradingCalendar = None):
         """
         连续出现相同信号，但是价格却在不断抬高，应该过滤掉
         :param today:
         :param buy_price:
+        :param calendar: 同is_signal_duplicated
         :return:
         """
         if self.limit_order_count<= 0:
@@ -204,12 +210,13 @@ class OrderManager(object):
 
         vt_orderid: str = f"{self.gateway_name}.{self.limit_order_count}"
         last_order = self.limit_orders[vt_orderid]
-        if last_order.direction == Direction.LONG and last_order.datetime + timedelta(days=14) >= today and last_order.price >= buy_price:
+        if last_order.direction == Direction.LONG and self.in_duplicate_window(last_order.datetime, today, calendar) and last_order.price >= buy_price:
             logger.info("[OM][Signal_Duplicated] date: {}, last_market_price: {:.2f}, new_market_price: {:.2f} (dropped)".format(today.strftime("%Y-%m-%d"), last_order.price, buy_price))
             return True
         return False
 
-    def is_signal_duplicated_uni(self, today: datetime, last_day_high: float, trigger_price: float, buy_price: float):
+    def is_signal_duplicated_uni(self, today: datetime, last_day_high: float, trigger_price: float, buy_price: float,
+                                 calendar: TradingCalendar = None):
         last_order = None
         if trigger_price <= last_day_high and self.limit_order_count > 0:  # 限价单/市价单
             vt_orderid: str = f"{self.gateway_name}.{self.limit_order_count}"
@@ -218,7 +225,7 @@ class OrderManager(object):
             stop_order_id: str = f"{STOPORDER_PREFIX}.{self.stop_order_count}"
             last_order = self.stop_orders[stop_order_id]
 
-        if last_order and last_order.direction == Direction.LONG and last_order.datetime + timedelta(days=14) >= today:
+        if last_order and last_order.direction == Direction.LONG and self.in_duplicate_window(last_order.datetime, today, calendar):
             if isinstance(last_order, StopOrder) and last_order.trigger_price <= trigger_price:
                 logger.info("[OM][Signal_Duplicated] date: {}, last_trigger_price: {:.2f}, new_trigger_price: {:.2f} (dropped)".format(today.strftime("%Y-%m-%d"), last_order.trigger_price, trigger_price))
                 return True
@@ -0,0 +1,105 @@
+import sys
+from bisect import bisect_left
+from typing import Callable, List
+
+import numpy as np
+
+from ex_vnpy.manager.bar_store import BarStore, widen
+
+
+def column_values(name: str) -> Callable[[BarStore, int, int], np.ndarray]:
+    def values(store: BarStore, start: int, end: int) -> np.ndarray:
+        return widen(store.column(name)[start:end])
+    return values
+
+
+def hl_gap_values(store: BarStore, start: int, end: int) -> np.ndarray:
+    """
+    bar的振幅：(high - low) / close
+    """
+    high = widen(store.column('high')[start:end])
+    low = widen(store.column('low')[start:end])
+    close = widen(store.column('close')[start:end])
+    return (high - low) / close
+
+
+class RollingExtreme(object):
+    """
+    单调队列实现的滑动窗口极值，每根bar均摊O(1)，查询O(1)
+    1. 只纳入已经完成的bar（存储中除最后一根以外的bar），最后一根bar可能被盘中更新，查询时由调用方单独合并
+    2. window为None时不淘汰旧数据，队列即为单调栈，可以按位置二分查询任意起点以来的极值
+    3. 位置使用存储的绝对位置(offset + pos)，存储裁剪头部之后依然有效
+    4. nan不进入队列，跟pandas的max/min忽略nan一致
+    """
+
+    def __init__(self, store: BarStore, values: Callable[[BarStore, int, int], np.ndarray], is_max: bool = True, window: int = None):
+        """Constructor"""
+        self.store: BarStore = store
+        self.values = values
+        self.is_max: bool = is_max
+        self.window: int = window
+
+        self.positions: List[int] = []      # 队列中bar的绝对位置，递增
+        self.extremes: List[float] = []     # 队列中bar的取值，max时递减，min时递增
+        self.head: int = 0                  # 队首在列表中的下标，出队只移动下标，定期压缩
+        self.synced: int = 0                # 已经纳入队列的绝对位置上界（不含）
+
+    def push(self, pos: int, value: float):
+        if value != value:
+            return
+
+        positions, extremes = self.positions, self.extremes
+        while len(extremes) > self.head and (extremes[-1] <= value if self.is_max else extremes[-1] >= value):
+            extremes.pop()
+            positions.pop()
+        positions.append(pos)
+        extremes.append(value)
+
+    def sync(self):
+        """
+        纳入新完成的bar，并淘汰窗口以外或者已经被裁剪的bar
+        """
+        store = self.store
+        end = store.offset + len(store) - 1
+        self.synced = max(self.synced, store.offset)
+        if self.synced < end:
+            values = self.values(store, self.synced - store.offset, end - store.offset)
+            for pos, value in enumerate(values, self.synced):
+                self.push(pos, value)
+            self.synced = end
+
+        start = store.offset if self.window is None else max(store.offset, end - self.window)
+        positions = self.positions
+        while self.head < len(positions) and positions[self.head] < start:
+            self.head += 1
+        if self.head > 64 and self.head * 2 > len(positions):
+            del positions[:self.head]
+            del self.extremes[:self.head]
+            self.head = 0
+
+    def front(self) -> float:
+        """
+        窗口内已完成bar的极值，没有数据时返回None
+        """
+        return self.extremes[self.head] if self.head < len(self.extremes) else None
+
+    def since(self, start: int) -> float:
+        """
+        绝对位置start以来（含）已完成bar的极值，没有数据时返回None
+        """
+        ix = bisect_left(self.positions, start, self.head)
+        return self.extremes[ix] if ix < len(self.extremes) else None
+
+    def last_value(self) -> float:
+        """
+        最后一根（可能未完成的）bar的取值
+        """
+        size = len(self.store)
+        return self.values(self.store, size - 1, size)[0]
+
+    def memory_usage(self) -> int:
+        """
+        队列占用的字节数（列表及其中的元素）
+        """
+        return sys.getsizeof(self.positions) + sys.getsizeof(self.extremes) + \
+            sum(map(sys.getsizeof, self.positions)) + sum(map(sys.getsizeof, self.extremes))
@@ -0,0 +1,89 @@
+import json
+import logging
+import os
+from typing import Any, Dict, Tuple
+from zoneinfo import ZoneInfo
+
+import numpy as np
+import pandas as pd
+
+from ex_vnpy.manager.bar_store import BarStore
+
+
+logger = logging.getLogger("SharedHistory")
+
+META_FILE = 'meta.json'
+
+
+def segment_path(directory: str, vt_symbol: str) -> str:
+    return os.path.join(directory, vt_symbol)
+
+
+def write_segment(store: BarStore, directory: str, vt_symbol: str, reserve: int = 256, meta: Dict[str, Any] = None) -> str:
+    """
+    把bar历史写入共享段：每个数值列一个.npy文件，容量为已有行数 + reserve，非数值列（如gateway_name）随meta.json保存
+    所有文件都先写临时文件再替换，meta.json最后替换，attach_segment只会看到完整的共享段
+    :param meta: 标的信息（symbol、exchange等），attach时原样返回
+    :return: 共享段的目录
+    """
+    path = segment_path(directory, vt_symbol)
+    os.makedirs(path, exist_ok=True)
+    size = len(store)
+    capacity = size + max(reserve, 1)
+
+    objects = {}
+    for name in store.columns:
+        values = store.column(name) if store.arrays else np.empty(0)
+        if values.dtype.kind not in 'iufb':
+            objects[name] = values.tolist()
+            continue
+
+        # 先写临时文件再替换，已经挂载旧文件的进程不受影响
+        file = os.path.join(path, f"{name}.npy")
+        arr = np.lib.format.open_memmap(f"{file}.tmp", mode='w+', dtype=values.dtype, shape=(capacity,))
+        arr[:size] = values
+        arr.flush()
+        del arr
+        os.replace(f"{file}.tmp", file)
+
+    content = {
+        'columns': list(store.columns),
+        'size': size,
+        'capacity': capacity,
+        'tz': str(store.tz) if store.tz is not None else None,
+        'zoneinfo': isinstance(store.tz, ZoneInfo),        # 还原为相同类型的时区对象（vnpy使用zoneinfo）
+        'objects': objects,
+        'meta': meta if meta is not None else {},
+    }
+    tmp_file = os.path.join(path, f"{META_FILE}.tmp")
+    with open(tmp_file, 'w') as f:
+        json.dump(content, f, default=str)
+    os.replace(tmp_file, os.path.join(path, META_FILE))
+    return path
+
+
+def attach_segment(directory: str, vt_symbol: str) -> Tuple[BarStore, Dict[str, Any]]:
+    """
+    以copy-on-write方式映射共享段，返回 (存储, 标的信息)
+    1. 各进程映射的是同一个文件，未改动的页面由操作系统共享，常驻内存不随挂载的SourceManager数量增加
+    2. 新的bar写入预留的容量，只有被写入的页面成为私有；容量不足扩容、类型提升、裁剪头部时，对应的列整体复制为私有
+    """
+    path = segment_path(directory, vt_symbol)
+    with open(os.path.join(path, META_FILE)) as f:
+        content = json.load(f)
+
+    size, capacity = content['size'], content['capacity']
+    store = BarStore(content['columns'], capacity=capacity)
+    if size > 0:
+        for name in store.columns:
+            if name in content['objects']:
+                arr = np.empty(capacity, dtype=object)
+                arr[:size] = content['objects'][name]
+            else:
+                arr = np.load(os.path.join(path, f"{name}.npy"), mmap_mode='c')
+            store.arrays[name] = arr
+        store.size = size
+    if content['tz'] is not None:
+        store.tz = ZoneInfo(content['tz']) if content['zoneinfo'] else pd.Timestamp(0, tz=content['tz']).tz
+    store.version += 1
+    return store, content['meta']
@@ -0,0 +1,157 @@
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing.shared_memory import SharedMemory
+from typing import Any, Callable, Dict, List, Tuple, Union
+
+import numpy as np
+import pandas as pd
+from pandas import DataFrame
+
+from vnpy.trader.constant import Interval
+
+from ex_vnpy.manager.source_manager import SourceManager
+from ex_vnpy.object import ExBarData
+
+
+logger = logging.getLogger("SourceBuilder")
+
+META_COLUMNS = ['gateway_name', 'symbol', 'exchange', 'interval']      # 每个标的取值固定的列，不放入共享内存
+
+
+class SharedBars(object):
+    """
+    多个标的的bar数据按列拼接后放入共享内存，子进程按名字挂载，只复制自己的那一段
+    1. 每一列一块共享内存，datetime列为int64(ns)
+    2. 非数值列（gateway_name、exchange等）每个标的取第一根bar的值，随任务传递
+    """
+
+    def __init__(self, frames: Dict[str, DataFrame]):
+        """Constructor"""
+        self.columns: Dict[str, Tuple[str, str]] = {}       # 列名 -> (共享内存名, dtype)
+        self.slices: Dict[str, Tuple[int, int]] = {}        # 标的 -> (起点, 终点)
+        self.metas: Dict[str, Dict[str, Any]] = {}          # 标的 -> 非数值列的取值、时区
+        self.total: int = 0
+        self.blocks: List[SharedMemory] = []
+
+        names = []
+        for vt_symbol, df in frames.items():
+            self.slices[vt_symbol] = (self.total, self.total + len(df))
+            self.total += len(df)
+            index = pd.DatetimeIndex(df['datetime']) if len(df) > 0 else None
+            meta = {name: df[name].iloc[0] for name in META_COLUMNS if name in df.columns and len(df) > 0}
+            meta['tz'] = index.tz if index is not None else None
+            self.metas[vt_symbol] = meta
+            names.extend(name for name in df.columns if name not in names and name not in META_COLUMNS)
+
+        for name in names:
+            values = [self.column_values(df, name) for df in frames.values()]
+            values = [v for v in values if v is not None and len(v) > 0]
+            dtype = np.result_type(*values) if values else np.dtype(np.float64)
+            if dtype.kind not in 'iufb':
+                logger.warning(f"[SharedBars] column not support shared memory: {name}")
+                continue
+
+            block = SharedMemory(create=True, size=max(self.total * dtype.itemsize, 1))
+            self.blocks.append(block)
+            arr = np.ndarray((self.total,), dtype=dtype, buffer=block.buf)
+            for vt_symbol, df in frames.items():
+                start, end = self.slices[vt_symbol]
+                column = self.column_values(df, name)
+                arr[start:end] = column if column is not None else 0
+            self.columns[name] = (block.name, dtype.str)
+
+    @staticmethod
+    def column_values(df: DataFrame, name: str) -> np.ndarray:
+        if name not in df.columns:
+            return None
+        if name == 'datetime':
+            return pd.DatetimeIndex(df[name]).as_unit('ns').asi8
+        return df[name].to_numpy()
+
+    def release(self):
+        for block in self.blocks:
+            block.close()
+            block.unlink()
+        self.blocks = []
+
+
+def read_shared_bars(columns: Dict[str, Tuple[str, str]], total: int, start: int, end: int, meta: Dict[str, Any]) -> List[ExBarData]:
+    """
+    子进程中由共享内存还原单个标的的bar
+    """
+    if end <= start:
+        return []
+
+    data = {}
+    for name, (block_name, dtype) in columns.items():
+        block = SharedMemory(name=block_name)
+        try:
+            data[name] = np.ndarray((total,), dtype=np.dtype(dtype), buffer=block.buf)[start:end].copy()
+        finally:
+            block.close()
+
+    datetimes = pd.to_datetime(data.pop('datetime'), utc=meta['tz'] is not None)
+    if meta['tz'] is not None:
+        datetimes = datetimes.tz_convert(meta['tz'])
+    df = DataFrame(data)
+    df['datetime'] = datetimes.to_pydatetime()
+    for name in META_COLUMNS:
+        if name in meta:
+            df[name] = meta[name]
+    return ExBarData.from_dicts(df.to_dict("records"))
+
+
+def warm_up_symbol(task: Tuple) -> Tuple[str, Any]:
+    """
+    子进程的任务：构建单个标的的SourceManager，返回快照（或快照文件的路径）
+    """
+    vt_symbol, columns, total, (start, end), meta, ta, options, state_dir = task
+    bars = read_shared_bars(columns, total, start, end, meta)
+    sm = SourceManager(bars, ta=ta, **options)
+    if sm.centrum:
+        # 中枢探测器默认在首次使用时才计算，这里提前在子进程中完成
+        sm.find_centrum_sensor(Interval.DAILY)
+        sm.find_centrum_sensor(Interval.WEEKLY)
+    if state_dir is not None:
+        return vt_symbol, sm.save_state(state_dir)
+    return vt_symbol, sm.dump_state()
+
+
+def build_source_managers(symbols: List[str], bars_loader: Callable[[str], Union[List[ExBarData], DataFrame]], ta: dict = {},
+                          workers: int = None, state_dir: str = None, **options) -> Dict[str, Any]:
+    """
+    多进程并行构建多个标的的SourceManager
+    1. 父进程调用bars_loader加载每个标的的bar（ExBarData列表或DataFrame），按列放入共享内存
+    2. 子进程从共享内存读取各自的bar，完成DataFrame构建、Heikin-Ashi、周线聚合、中枢探测和指标初始化，
+       centrum为True时日线、周线的中枢探测器也在子进程中提前计算
+    3. 子进程返回dump_state的快照，父进程恢复为SourceManager；指定state_dir时子进程直接保存快照，返回文件路径
+    :param workers: 进程数，默认为CPU核数，小于等于1时在当前进程内顺序构建
+    :param options: SourceManager的其他参数，如centrum、min_size、max_history、compact
+    :return: vt_symbol -> SourceManager（或快照文件的路径）
+    """
+    frames = {}
+    for vt_symbol in symbols:
+        bars = bars_loader(vt_symbol)
+        if isinstance(bars, DataFrame):
+            frames[vt_symbol] = bars
+        else:
+            frames[vt_symbol] = DataFrame(data=[bar.to_dict() for bar in bars] if bars else None)
+
+    workers = workers if workers is not None else os.cpu_count()
+    shared = SharedBars(frames)
+    try:
+        tasks = [(vt_symbol, shared.columns, shared.total, shared.slices[vt_symbol], shared.metas[vt_symbol],
+                  ta, options, state_dir) for vt_symbol in symbols]
+        if workers <= 1 or len(tasks) <= 1:
+            results = [warm_up_symbol(task) for task in tasks]
+        else:
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                chunksize = max(1, len(tasks) // (workers * 4))
+                results = list(executor.map(warm_up_symbol, tasks, chunksize=chunksize))
+    finally:
+        shared.release()
+
+    if state_dir is not None:
+        return dict(results)
+    return {vt_symbol: SourceManager.restore_state(snapshot) for vt_symbol, snapshot in results}
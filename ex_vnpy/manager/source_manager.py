@@ -1,26 +1,61 @@
+import hashlib
+import json
 import logging
+import os
+import pickle
 import traceback
 from dataclasses import is_dataclass
-from datetime import datetime, timedelta
-from typing import Any, Dict, List
+from datetime import datetime
+from typing import Any, Dict, List, Mapping, Tuple, Union
 
+import numpy as np
 import pandas as pd
 from pandas import DataFrame, Series
-from pandas.tseries.frequencies import to_offset
 
 from vnpy.trader.constant import Interval, Exchange
 
 import talipp.indicators as tainds
 from talipp.indicators import Indicator
-from talipp.indicator_util import has_valid_values, composite_to_lists, valid_values_length
+from talipp.indicator_util import has_valid_values, composite_to_lists
 
 import ex_vnpy.indicators as exinds
+from ex_vnpy.manager.bar_aggregator import PeriodAggregator, DayAggregator, WeekAggregator, MonthAggregator, ExInterval
+from ex_vnpy.manager.bar_loader import EXCLUDE_COLUMNS, first_value, load_columns, read_parquet
+from ex_vnpy.manager.bar_store import BarStore
+from ex_vnpy.manager.heikin_ashi import heikin_ashi_values
+from ex_vnpy.manager.indicator_graph import IndicatorGraph
+from ex_vnpy.manager.indicator_outputs import IndicatorOutputs
+from ex_vnpy.manager.rolling_extreme import RollingExtreme, column_values, hl_gap_values
+from ex_vnpy.manager.shared_history import attach_segment, write_segment
+from ex_vnpy.manager.trading_calendar import TradingCalendar
 from ex_vnpy.object import ExBarData
 from ex_vnpy.sensor.centrum_sensor import CentrumSensor
 
 
 logger = logging.getLogger("SourceManager")
 
+HISTORY_MARGIN = 30     # 有界历史模式下，每个指标在参数之和以外额外保留的bar数
+INTRADAY_INTERVALS = (Interval.MINUTE, Interval.HOUR)
+LAZY_INTERVALS = (Interval.WEEKLY, ExInterval.MONTHLY)      # 首次使用时才开始聚合的周期
+CENTRUM_INTERVALS = (Interval.DAILY, Interval.WEEKLY)       # centrum为True时，首次使用时才开始探测的周期
+STATE_VERSION = 1       # 快照格式的版本，格式变化时加1，旧快照不再加载
+# 快照保存的属性，显式列出：新增属性时要么加到这里（同时STATE_VERSION加1），要么加到TRANSIENT_FIELDS
+STATE_FIELDS = ('exchange', 'interval', 'symbol', 'gateway_name', 'base_interval', 'store', 'aggregators',
+                'inited', 'size', 'today', 'centrum', 'compact', 'bulk_warmup', 'sensors', 'idle_sensors', 'ta',
+                'ind_graph', 'indicators', 'ind_inputs', 'ind_outputs', 'ind_interval', 'ind_caches', 'bar_version',
+                'max_history', 'history_chunk')
+# 不进入快照的属性，恢复时重新创建：滑动窗口极值索引、交易日历按需重建，外部传感器由调用方重新注册
+TRANSIENT_FIELDS = {'extremes': dict, 'history_listeners': list, 'trading_calendar': lambda: None}
+
+
+def ta_hash(ta: dict) -> str:
+    """
+    ta配置的hash，用于判断快照中的指标是否跟当前配置一致
+    """
+    text = json.dumps(ta if ta is not None else {}, sort_keys=True, default=str)
+    return hashlib.md5(text.encode('utf-8')).hexdigest()[:12]
+
+
 class SourceManager(object):
     """
     For:
@@ -28,8 +63,18 @@ class SourceManager(object):
     2. calculating technical indicator value
     """
 
-    def __init__(self, bars: list[ExBarData] = [], ta: dict = {}, centrum: bool = False, min_size: int = 100):
-        """Constructor"""
+    def __init__(self, bars: list[ExBarData] = [], ta: dict = {}, centrum: bool = False, min_size: int = 100,
+                 max_history: int = None, bulk_warmup: bool = False, base_interval: Interval = Interval.DAILY,
+                 compact: bool = False):
+        """
+        :param max_history: 有界历史模式，最多保留的原始bar数，None表示保留全部历史。详见trim_history
+        :param bulk_warmup: 初始化指标时按列批量计算历史输出，不支持的指标仍逐个输入。详见indicator_warmup
+        :param base_interval: 输入bar的周期，分钟线/小时线会先聚合为日线
+        :param compact: 紧凑存储，各周期的bar数据无损地以int32/float32存放，中枢探测器的pivot_df使用小整数编码。
+                        计算结果跟非紧凑存储完全一致，占用见memory_usage
+        周线、月线以及centrum的日线/周线中枢探测器都在首次使用时才开始计算，之后随bar增量更新
+        """
+
         self.exchange: Exchange = None
         self.interval: Interval = None
         self.symbol: str = None
@@ -38,20 +83,26 @@ class SourceManager(object):
         # self.func_price_map = {'open': 'first', 'high': 'max', 'low': 'min', 'close': 'last',
         #               'volume': lambda x: x.sum(min_count=1), 'turnover': lambda x: x.sum(min_count=1)}
 
-        self.data_df: DataFrame = None
-        self.daily_df: DataFrame = None
-        self.weekly_df: DataFrame = None
+        self.base_interval: Interval = base_interval
+        self.store: BarStore = None         # 输入bar的列式存储，data_df是它的DataFrame视图
+        # 逐级的流式聚合：分钟线/小时线 -> 日线 -> 周线/月线，按依赖顺序排列，周线/月线按需加入
+        self.aggregators: Dict[Any, PeriodAggregator] = {}
+        if base_interval in INTRADAY_INTERVALS:
+            self.aggregators[Interval.DAILY] = DayAggregator(base_interval)
+        self.extremes: Dict[tuple, RollingExtreme] = {}       # 按需注册的滑动窗口极值索引
+        self.trading_calendar: TradingCalendar = None         # 基于日线的交易日历，按需创建
         self.inited: bool = False
         self.size: int = min_size
-        self.today: datetime = bars[-1].datetime if len(bars) > 0 else None
+        self.today: datetime = None
         self.centrum = centrum
+        self.compact: bool = compact
 
         self.init_data_df(bars)
-        self.update_weekly_df()
+        self.update_aggregators()
 
-        # 更新central recognizer
-        self.dc_sensor = CentrumSensor()
-        self.wc_sensor = CentrumSensor()
+        # 更新central recognizer，各周期随bar更新的中枢探测器，centrum为True时日线和周线的探测器按需加入
+        self.sensors: Dict[Any, CentrumSensor] = {}
+        self.idle_sensors: Dict[Any, CentrumSensor] = {}    # 未启用的探测器，只为get_centrum_sensor保持原有的返回值
         self.init_central_sensor()
 
         # 更新增量指标
@@ -59,6 +110,10 @@ class SourceManager(object):
         self.ind_inputs: Dict[str, List] = {}
         self.ind_outputs: Dict[str, Any] = {}
         self.ind_interval: Dict[str, Interval] = {}
+        self.ind_caches: Dict[str, IndicatorOutputs] = {}     # 指标输出的增量缓存
+        self.ind_graph: IndicatorGraph = IndicatorGraph()     # 相同的指标、子指标只计算一次，按输入分组更新
+        self.bar_version: int = 0       # 每次更新bar加1，指标输出缓存据此判断是否需要同步
+        self.bulk_warmup: bool = bulk_warmup
 
         self.ta = ta
         if ta is not None and len(ta) > 0:
@@ -66,190 +121,506 @@ class SourceManager(object):
                 ind_name = name
                 params = ind["params"] if "params" in ind and (isinstance(ind["params"], tuple) or isinstance(ind["params"], list)) else tuple()
                 module_name = tainds if hasattr(tainds, ind["kind"]) else exinds
-                self.indicators[ind_name] = getattr(module_name, ind["kind"])(*params)
+                indicator = getattr(module_name, ind["kind"])(*params)
+                self.indicators[ind_name] = self.ind_graph.add(indicator, params, ind["input_values"], self.resolve_interval(ind['interval']))
                 self.ind_inputs[ind_name] = ind["input_values"]
                 self.ind_outputs[ind_name] = ind['output_values']
                 self.ind_interval[ind_name] = ind['interval']
+                self.ind_caches[ind_name] = IndicatorOutputs(self.indicators[ind_name], self.ind_outputs[ind_name])
 
             self.init_indicators()
 
         if self.count >= self.size:
             self.inited = True
 
+        # 有界历史模式，max_history不能小于指标计算所需的回看长度
+        self.history_listeners: List[Tuple[Any, Interval]] = []
+        self.max_history: int = None
+        self.history_chunk: int = 0
+        if max_history is not None:
+            lookback = max(self.history_lookback(self.base_interval), self.size)
+            if max_history < lookback:
+                logger.warning(f"[SM] max_history {max_history} is less than lookback {lookback}, use lookback instead")
+            self.max_history = max(max_history, lookback)
+            self.history_chunk = max(1, self.max_history // 10)
+
+    def state_key(self) -> Tuple[str, str, str]:
+        """
+        快照的键：(vt_symbol, 最后一根bar的日期, ta配置的hash)
+        """
+        vt_symbol = f"{self.symbol}.{self.exchange.value}" if self.exchange is not None else str(self.symbol)
+        last_date = self.store.timestamp(-1).strftime("%Y%m%d") if self.count > 0 else ""
+        return vt_symbol, last_date, ta_hash(self.ta)
+
+    def dump_state(self) -> Dict[str, Any]:
+        """
+        快照的内容：列式存储、周线聚合、中枢传感器以及指标的内部状态，save_state写入文件，进程间直接传递
+        """
+        vt_symbol, last_date, ta_key = self.state_key()
+        state = {name: getattr(self, name) for name in STATE_FIELDS}
+        return {'version': STATE_VERSION, 'vt_symbol': vt_symbol, 'last_date': last_date, 'ta_hash': ta_key,
+                'state': state}
+
+    def save_state(self, path: str) -> str:
+        """
+        保存快照，重启时用load_state恢复，不需要重新预热
+        path为目录时，文件名由state_key生成。返回快照文件的路径
+        """
+        snapshot = self.dump_state()
+        if os.path.isdir(path):
+            path = os.path.join(path, f"{snapshot['vt_symbol']}_{snapshot['last_date']}_{snapshot['ta_hash']}.pkl")
+
+        with open(path, 'wb') as f:
+            pickle.dump(snapshot, f, protocol=pickle.HIGHEST_PROTOCOL)
+        return path
+
+    @classmethod
+    def load_state(cls, path: str, ta: dict = None, bars: list[ExBarData] = None) -> 'SourceManager':
+        """
+        加载save_state保存的快照
+        :param ta: 当前的ta配置，跟快照的不一致时返回None，需要重新初始化
+        :param bars: 最新的bar，只补充快照最后一根bar之后的部分
+        """
+        with open(path, 'rb') as f:
+            snapshot = pickle.load(f)
+        return cls.restore_state(snapshot, ta=ta, bars=bars)
+
+    @classmethod
+    def restore_state(cls, snapshot: Dict[str, Any], ta: dict = None, bars: list[ExBarData] = None) -> 'SourceManager':
+        """
+        由dump_state的快照恢复，参数同load_state
+        """
+        if snapshot.get('version') != STATE_VERSION:
+            logger.warning(f"[SM] state version not matched: {snapshot.get('vt_symbol')}")
+            return None
+        if ta is not None and snapshot['ta_hash'] != ta_hash(ta):
+            logger.warning(f"[SM] ta config changed, state is discarded: {snapshot['vt_symbol']}")
+            return None
+
+        sm = cls.__new__(cls)
+        for name in STATE_FIELDS:
+            setattr(sm, name, snapshot['state'][name])
+        for name, factory in TRANSIENT_FIELDS.items():
+            setattr(sm, name, factory())
+        if bars:
+            last_dt = sm.store.timestamp(-1) if sm.count > 0 else None
+            for bar in bars:
+                dt = pd.Timestamp(bar.datetime)
+                if last_dt is None or dt > last_dt or (dt == last_dt and sm.is_revised(bar)):
+                    sm.update_bar(bar)
+        return sm
+
+    def is_revised(self, bar: ExBarData) -> bool:
+        """
+        跟最后一根bar时间相同的bar，价格或成交量是否有变化（快照保存时最后一根bar可能尚未完成）
+        """
+        return any(self.store.value(name) != value for name, value in
+                   (('open', bar.open_price), ('high', bar.high_price), ('low', bar.low_price),
+                    ('close', bar.close_price), ('volume', bar.volume)))
+
+    @staticmethod
+    def find_state(directory: str, vt_symbol: str, ta: dict) -> str:
+        """
+        目录中该标的、当前ta配置下最新的快照文件，没有时返回None
+        """
+        if not os.path.isdir(directory):
+            return None
+
+        prefix, suffix = f"{vt_symbol}_", f"_{ta_hash(ta)}.pkl"
+        names = [name for name in os.listdir(directory) if name.startswith(prefix) and name.endswith(suffix)]
+        return os.path.join(directory, max(names)) if names else None
+
     def init_heikin_ashi_candle_df(self, ha_df: DataFrame):
         # 计算Heikin-Ashi蜡烛图的值
-        ha_df['ha_close'] = (ha_df['open'] + ha_df['high'] + ha_df['low'] + ha_df['close']) / 4
-        ha_df['ha_open'] = ha_df['open']
-        ha_open_index = ha_df.columns.get_loc('ha_open')
-        # ha_df.iat[0, ha_open_index] = ha_df.iloc[0]['open']
-        for i in range(1, len(ha_df)):
-            ha_df.iat[i, ha_open_index] = (ha_df.iloc[i-1]['ha_open'] + ha_df.iloc[i-1]['ha_close']) / 2
-
-        ha_df['ha_high'] = ha_df[['high', 'ha_open', 'ha_close']].max(axis=1)
-        ha_df['ha_low'] = ha_df[['low', 'ha_open', 'ha_close']].min(axis=1)
+        ha_open, ha_high, ha_low, ha_close = heikin_ashi_values(ha_df['open'].to_numpy(dtype=float),
+                                                                ha_df['high'].to_numpy(dtype=float),
+                                                                ha_df['low'].to_numpy(dtype=float),
+                                                                ha_df['close'].to_numpy(dtype=float))
+        ha_df['ha_close'] = ha_close
+        ha_df['ha_open'] = ha_open
+        ha_df['ha_high'] = ha_high
+        ha_df['ha_low'] = ha_low
         return ha_df
 
-    def init_data_df(self, bars: list[ExBarData]):
-        # auto make columns, according to ExBarData
-        init_data = [item.to_dict() for item in bars]
-        self.data_df = pd.DataFrame(data=init_data, columns=ExBarData.columns(exclude=['symbol_id', 'symbol', 'exchange', 'interval']))
+    @classmethod
+    def from_columns(cls, data: Mapping[str, Any], ta: dict = {}, symbol: str = None, exchange: Exchange = None,
+                     interval: Interval = None, gateway_name: str = None, **options) -> 'SourceManager':
+        """
+        由列式数据直接构建，不创建ExBarData对象
+        :param data: 列名 -> 数组（dict、DataFrame、pyarrow.Table等），列名跟ExBarData.to_dict一致，价格列也可以是open_price等。
+                     只读取ExBarData中有的列，缺少的资金流等列不会补齐，依赖这些列的指标需要保证列存在
+        :param symbol/exchange/interval/gateway_name: 标的信息，未指定时取data中对应列的第一个值
+        :param options: SourceManager的其他参数
+        """
+        sm = cls(load_columns(data), ta=ta, **options)
+        meta = {'symbol': symbol, 'exchange': exchange, 'interval': interval, 'gateway_name': gateway_name}
+        for name, value in meta.items():
+            setattr(sm, name, value if value is not None else first_value(data, name))
+        if isinstance(sm.exchange, str):
+            sm.exchange = Exchange(sm.exchange)
+        if isinstance(sm.interval, str):
+            sm.interval = Interval(sm.interval)
+        return sm
+
+    @classmethod
+    def from_parquet(cls, path: str, ta: dict = {}, columns: List[str] = None, **kwargs) -> 'SourceManager':
+        """
+        由Parquet文件构建（需要pyarrow），只读取需要的列，文件以memory map的方式打开
+        :param columns: 额外限定读取的列（datetime和OHLC总会读取），默认为ExBarData中有的全部列
+        :param kwargs: 同from_columns
+        """
+        return cls.from_columns(read_parquet(path, columns), ta=ta, **kwargs)
+
+    def share_history(self, directory: str, reserve: int = 256) -> str:
+        """
+        把输入bar的历史写入directory下该标的的共享段，供同一标的的多个策略（可以在不同进程中）用from_shared_history挂载
+        :param reserve: 共享段中为之后的新bar预留的行数
+        :return: 共享段的目录
+        """
+        vt_symbol, _, _ = self.state_key()
+        meta = {'symbol': self.symbol, 'exchange': self.exchange.value if self.exchange is not None else None,
+                'interval': self.interval.value if self.interval is not None else None, 'gateway_name': self.gateway_name}
+        return write_segment(self.store, directory, vt_symbol, reserve=reserve, meta=meta)
+
+    @classmethod
+    def from_shared_history(cls, directory: str, vt_symbol: str, ta: dict = {}, **options) -> 'SourceManager':
+        """
+        挂载share_history写入的共享段构建SourceManager
+        输入bar的历史以copy-on-write方式映射，同一标的的所有SourceManager共用一份常驻内存；
+        周线聚合、中枢探测、指标等派生的状态仍然各自私有。共享的存储不做紧凑转换(compact)，
+        有界历史模式裁剪头部时，被裁剪的列会复制为私有
+        :param options: SourceManager的其他参数
+        """
+        store, meta = attach_segment(directory, vt_symbol)
+        sm = cls(store, ta=ta, **options)
+        sm.symbol = meta.get('symbol')
+        sm.exchange = Exchange(meta['exchange']) if meta.get('exchange') is not None else None
+        sm.interval = Interval(meta['interval']) if meta.get('interval') is not None else None
+        sm.gateway_name = meta.get('gateway_name')
+        return sm
+
+    def init_data_df(self, bars: Union[list[ExBarData], DataFrame, BarStore]):
+        """
+        :param bars: ExBarData列表，from_columns加载的DataFrame（列名已经跟ExBarData.to_dict一致），
+                     或者from_shared_history挂载的存储（已经包含Heikin-Ashi）
+        """
+        if isinstance(bars, BarStore):
+            self.store = bars
+            if len(bars) > 0:
+                self.today = bars.timestamp(-1).to_pydatetime()
+            return
+
+        if isinstance(bars, DataFrame):
+            data_df = bars
+        else:
+            # auto make columns, according to ExBarData
+            init_data = [item.to_dict() for item in bars]
+            data_df = pd.DataFrame(data=init_data, columns=ExBarData.columns(exclude=EXCLUDE_COLUMNS))
 
         # 增加Heikin Ashi蜡烛图信息
-        self.init_heikin_ashi_candle_df(self.data_df)
+        self.init_heikin_ashi_candle_df(data_df)
 
-        self.data_df.index = pd.DatetimeIndex(self.data_df['datetime'])
-        self.daily_df = self.data_df  # 先不做tick到daily的聚合
+        data_df.index = pd.DatetimeIndex(data_df['datetime'])
+        self.store = self.create_store(data_df)
 
-        if self.exchange is None and len(bars) > 0:
+        if len(data_df) > 0:
+            self.today = bars[-1].datetime if not isinstance(bars, DataFrame) else data_df['datetime'].iloc[-1].to_pydatetime()
+        if self.exchange is None and len(bars) > 0 and not isinstance(bars, DataFrame):
             self.exchange = bars[0].exchange
             self.interval = bars[0].interval
             self.symbol = bars[0].symbol
             self.gateway_name = bars[0].gateway_name
 
+    def create_store(self, data_df: DataFrame) -> BarStore:
+        store = BarStore.from_dataframe(data_df)
+        if self.compact:
+            store.compact_columns()
+        return store
+
     def init_central_sensor(self):
-        if self.centrum:
-            self.dc_sensor.init_sensor(self.daily_df)
-            self.wc_sensor.init_sensor(self.weekly_df)
+        for interval, sensor in self.sensors.items():
+            sensor.init_sensor(self.get_dataframe(interval))
+
+    def find_centrum_sensor(self, interval: Any) -> CentrumSensor:
+        """
+        随bar更新的中枢探测器，centrum为True时日线/周线的探测器在这里首次创建，未启用时返回None
+        """
+        interval = self.resolve_interval(interval)
+        sensor = self.sensors.get(interval)
+        if sensor is None and self.centrum and interval in CENTRUM_INTERVALS:
+            sensor = self.add_centrum_sensor(interval)
+        return sensor
+
+    @property
+    def dc_sensor(self) -> CentrumSensor:
+        return self.get_centrum_sensor(Interval.DAILY)
+
+    @property
+    def wc_sensor(self) -> CentrumSensor:
+        return self.get_centrum_sensor(Interval.WEEKLY)
+
+    def add_centrum_sensor(self, interval: Any) -> CentrumSensor:
+        """
+        在任意周期上挂载中枢探测器，之后随bar更新
+        """
+        interval = self.resolve_interval(interval)
+        if interval not in self.sensors:
+            sensor = CentrumSensor(compact=self.compact)
+            sensor.init_sensor(self.get_dataframe(interval))
+            self.sensors[interval] = sensor
+        return self.sensors[interval]
 
     def init_indicators(self):
-        if self.inited or len(self.daily_df) < 1:
+        if self.inited or self.count < 1:
             return
 
         # 初始化 indicator 指标计算
-        for ind_name, ind in self.indicators.items():
-            input_names = self.ind_inputs[ind_name]
-            interval = self.ind_interval[ind_name]
+        # 按输入分组，组内共享同一份输入：单列输入为列表，多列输入为存储的行视图（BarRow），不再为每根bar构造ExBarData
+        for group_key in self.ind_graph.groups:
+            interval, input_name = group_key
             source_df = self.get_dataframe(interval)
-            if len(input_names) == 1:
-                input_values = source_df[input_names[0]].to_list()
+            if input_name is not None:
+                input_values = source_df[input_name].to_list()
             else:
-                # data = source_df[input_names].to_dict("list")
-                # input_values = OHLCVFactory.from_dict(data)
-
-                data = source_df[input_names].to_dict("records")
-                input_values = ExBarData.from_dicts(data)
+                input_values = self.get_store(interval).views()
             try:
-                ind.initialize(input_values=input_values)
+                columns = {name: source_df[name].to_numpy() for name in self.ind_graph.columns[group_key]} if self.bulk_warmup else None
+                self.ind_graph.initialize(group_key, input_values, columns)
             except Exception as e:
                 logger.error(f"[SM] indicator initialize error! {e}")
                 traceback.print_exc()
 
+        for cache in self.ind_caches.values():
+            cache.reset()
+
     def update_bar(self, bar: ExBarData) -> None:
         """
         Update new bar data into array manager.
         """
-        if len(self.data_df) == 0:
+        if self.count == 0:
             self.init_data_df([bar])
+            self.process_bar(bar.datetime)
+            return
+
+        if pd.Timestamp(bar.datetime) == self.store.timestamp(-1):
+            # 同一根bar的盘中更新
+            self.revise_last_bar(bar)
+            return
+
+        # 追加到列式存储，均摊O(1)，不再触发DataFrame的重新分配
+        self.store.append(self.heikin_ashi_row(bar, is_revise=False))
+        self.process_bar(bar.datetime, opened=True)
+
+    def revise_last_bar(self, bar: ExBarData) -> bool:
+        """
+        最后一根bar的盘中更新（实盘中同一根bar会多次推送），只回滚并重做最后一步：
+        1. 列式存储覆盖最后一行，Heikin-Ashi基于前一根bar重新计算
+        2. 各级聚合基于当前周期之前的累计值重新合并，只改写最后一行
+        3. 中枢探测器回滚到这根bar之前的状态，再重新探测这根bar
+        4. 指标撤销最后一个输入后重新计算(update)
+        结果跟直接输入最终的bar完全一致
+        :return: bar不是最后一根bar时返回False，不做任何处理
+        """
+        if self.count == 0 or pd.Timestamp(bar.datetime) != self.store.timestamp(-1):
+            logger.warning(f"[SM] revise_last_bar: {bar.datetime} is not the last bar")
+            return False
+
+        self.store.update_last(self.heikin_ashi_row(bar, is_revise=True))
+        self.process_bar(bar.datetime, opened=False)
+        return True
+
+    def heikin_ashi_row(self, bar: ExBarData, is_revise: bool) -> Dict[str, Any]:
+        """
+        bar的数据加上Heikin-Ashi，ha_open由前一根bar决定
+        """
+        new_dict = bar.to_dict()
+        new_dict['ha_close'] = (new_dict['open'] + new_dict['high'] + new_dict['low'] + new_dict['close']) / 4
+        if is_revise and self.count == 1:
+            new_dict['ha_open'] = new_dict['open']
         else:
-            new_dict = bar.to_dict()
-
-            # add heikin ashi
-            new_dict['ha_close'] = (new_dict['open'] + new_dict['high'] + new_dict['low'] + new_dict['close']) / 4
-            last_bar = self.data_df.iloc[-1]
-            new_dict['ha_open'] = (last_bar['ha_open'] + last_bar['ha_close']) / 2
-            new_dict['ha_high'] = max(new_dict['high'], new_dict['ha_open'], new_dict['ha_close'])
-            new_dict['ha_low'] = min(new_dict['low'], new_dict['ha_open'], new_dict['ha_close'])
-
-            # TODO: check all isoformat
-            # nt = pd.to_datetime(bar.datetime.isoformat())
-            nt = pd.to_datetime(bar.datetime)
-            self.data_df.loc[nt, :] = new_dict
-
-        self.update_weekly_df()
-        self.today = bar.datetime
-        if self.centrum:
-            self.dc_sensor.update_bar(self.daily_df)
+            prior = -2 if is_revise else -1
+            new_dict['ha_open'] = (self.store.value('ha_open', prior) + self.store.value('ha_close', prior)) / 2
+        new_dict['ha_high'] = max(new_dict['high'], new_dict['ha_open'], new_dict['ha_close'])
+        new_dict['ha_low'] = min(new_dict['low'], new_dict['ha_open'], new_dict['ha_close'])
+        return new_dict
+
+    def process_bar(self, today: datetime, opened: bool = True):
+        """
+        最新的bar写入存储之后的处理：逐级聚合、中枢探测、指标更新、历史裁剪
+        :param opened: 最新的bar是追加的新bar(True)，还是对最后一根bar的盘中更新(False)
+        """
+        events = {self.base_interval: opened}
+        self.update_aggregators(events)
+        self.today = today
+        for interval, sensor in self.sensors.items():
             # if week_bar_cnt < len(self.weekly_df):   # 只有在week bar完成，才进行pivot探测
-            self.wc_sensor.update_bar(self.weekly_df)
+            store = self.get_store(interval)
+            if sensor.inited:
+                # 只读取最后一根bar，不为每根bar重建DataFrame视图
+                sensor.update_last_bar(store.timestamp(-1), store.view(-1), events.get(interval))
+            else:
+                sensor.update_bar(self.get_dataframe(interval), events.get(interval))
 
         if not self.inited and self.count >= self.size:
             self.init_indicators()
             self.inited = True
         else:
-            self.update_indicators()
-
-    def update_indicators(self):
-        # 更新指标计算
-        for ind_name, ind in self.indicators.items():
-            source_df = self.get_dataframe(self.ind_interval[ind_name])
-            input_names = self.ind_inputs[ind_name]
-            new_bar = source_df[input_names].iloc[-1]
-
-            # use ExBarData instead of OHLCV
-            # new_data = new_bar[input_names[0]] if len(input_names) == 1 else OHLCV(**(new_bar.to_dict()))
-            new_data = new_bar[input_names[0]] if len(input_names) == 1 else ExBarData.from_dict(new_bar.to_dict())
-
-            ind_len = len(ind.input_values)
-            data_len = len(source_df)
-            if data_len == ind_len:
-                ind.update(new_data)
-            elif data_len == ind_len + 1:
-                ind.add(new_data)
-            else:
-                logger.error("[ERROR] INDICATOR ERROR, length is not matched!")
-                raise Exception()
+            self.update_indicators(events)
+
+        self.trim_history()
+        self.bar_version += 1
+
+    def update_indicators(self, events: Dict[Any, bool]):
+        """
+        更新指标计算，每个周期的新bar只取一次，分发给该周期的所有指标
+        :param events: 周期 -> 最后一根bar是新开的(True)还是盘中更新(False)，由写入存储、聚合时确定
+        """
+        for interval, opened in events.items():
+            self.ind_graph.feed(interval, self.get_store(interval), opened)
+
+    def update_weekly_df(self):
+        self.update_aggregators()
+
+    def update_aggregators(self, events: Dict[Any, bool] = None):
+        """
+        输入bar的最后一根逐级合并到高级别周期，每一级O(1)
+        :param events: 记录每个周期的最后一根bar是新开的(True)还是被更新(False)
+        """
+        for interval, aggregator in self.aggregators.items():
+            opened = self.update_aggregator(aggregator)
+            if events is not None:
+                events[interval] = opened
+
+    def update_aggregator(self, aggregator: PeriodAggregator) -> bool:
+        """
+        :return: 是否新开了一根高级别bar
+        """
+        source = self.get_store(aggregator.source_interval)
+        if source is None or len(source) <= 0:
+            return False
+
+        if not aggregator.inited:
+            aggregator.init(source)
+            if self.compact:
+                aggregator.store.compact_columns()
+            return True
+        return aggregator.update(source)
+
+    def add_aggregator(self, interval: Any) -> PeriodAggregator:
+        """
+        按需开始聚合的周期（周线、月线），由当前的日线批量初始化，之后增量更新
+        """
+        if interval not in self.aggregators:
+            aggregator = WeekAggregator(Interval.DAILY) if interval == Interval.WEEKLY else MonthAggregator(Interval.DAILY)
+            self.aggregators[interval] = aggregator
+            self.update_aggregator(aggregator)
+        return self.aggregators[interval]
 
-    def resample_to_week_data(self, df):
-        agg_dict = {}
-        for column in df.columns:
-            if column in ['symbol', 'exchange', 'interval', 'symbol_id', 'datetime', 'stype']:
+    def resolve_interval(self, interval: Any) -> Any:
+        """
+        周期对应的存储层级：输入bar的周期，或者某个聚合周期
+        """
+        if interval in self.aggregators or interval in LAZY_INTERVALS:
+            return interval
+        return self.base_interval
+
+    @property
+    def week_aggregator(self) -> WeekAggregator:
+        return self.add_aggregator(Interval.WEEKLY)
+
+    def add_history_listener(self, listener: Any, interval: Interval = Interval.DAILY):
+        """
+        外部基于本数据计算的传感器（如SupertrendSensor），在有界历史模式下跟随裁剪，需要实现trim_history(before)
+        """
+        self.history_listeners.append((listener, interval))
+
+    def history_lookback(self, interval: Interval) -> int:
+        """
+        指定周期上的指标需要保留的最少bar数：指标的整数参数之和，再加上HISTORY_MARGIN
+        """
+        lookback = 2        # 中枢探测至少需要两根bar
+        if self.ta is None:
+            return lookback
+
+        for ind_name, ind in self.ta.items():
+            if self.resolve_interval(self.ind_interval[ind_name]) != self.resolve_interval(interval):
                 continue
+            params = ind["params"] if "params" in ind and isinstance(ind["params"], (tuple, list)) else tuple()
+            periods = sum(p for p in params if isinstance(p, int) and not isinstance(p, bool))
+            lookback = max(lookback, periods + HISTORY_MARGIN)
+        return lookback
 
-            col_type = df[column].dtype
-            # 根据数据类型决定聚合函数
-            if column.endswith('open'):
-                agg_dict[column] = 'first'
-            elif column.endswith('high'):
-                agg_dict[column] = 'max'
-            elif column.endswith('low'):
-                agg_dict[column] = 'min'
-            elif column.endswith('close'):
-                agg_dict[column] = 'last'
-            elif col_type == 'int64' or col_type == 'float64':
-                # 数值型列使用'sum'作为聚合函数，考虑min_count=1
-                agg_dict[column] = lambda x: x.sum(min_count=1)
-            else:
-                logger.warning(f"column not support resample: {column}")
+    def reference_position(self, interval: Interval) -> int:
+        """
+        中枢探测器引用的最早pivot在存储中的位置，没有引用时返回存储长度
+        """
+        store = self.get_store(interval)
+        sensor = self.sensors.get(self.resolve_interval(interval))
+        earliest = sensor.earliest_reference_date if sensor is not None else None
+        if earliest is None:
+            return len(store)
+        return int(np.searchsorted(store.column('datetime'), pd.Timestamp(earliest).value))
+
+    def trim_history(self):
+        """
+        有界历史模式：输入bar数量达到max_history + history_chunk时，一次性裁剪最早的bar，使裁剪的开销均摊到每根bar
+        1. 输入bar保留最近max_history根，每个聚合周期裁剪掉早于其低级别第一根bar所在周期的数据
+        2. 每个周期都会保留指标的回看长度(history_lookback)，以及中枢探测器引用的最近pivot之后的数据
+        3. 指标(purge_oldest)、pivot_df以及注册的history listener同步裁剪
+
+        保证：裁剪只删除计算不再依赖的头部数据，裁剪后新bar的指标值、pivot、周线，以及最近的查询结果，
+        跟保留全部历史时完全一致；只是早于裁剪点的历史数据不再可用
+        按需创建的周线、月线和中枢探测器在第一次裁剪之前全部创建（build_lazy_structures），都从完整的历史开始计算
+        """
+        if self.max_history is None or not self.inited or self.count < self.max_history + self.history_chunk:
+            return
 
-        w_df = df.resample('W').agg(agg_dict).dropna()
-        w_df.index = w_df.index + to_offset("-2D")
-        w_df['datetime'] = w_df.index
-        return w_df
+        self.build_lazy_structures()
+        n = min(self.count - self.max_history, self.reference_position(self.base_interval))
+        self.trim_interval(self.base_interval, n)
 
-    def update_weekly_df(self):
-        if self.daily_df is None or len(self.daily_df) <= 0:
+        for interval, aggregator in self.aggregators.items():
+            store = aggregator.store
+            source = self.get_store(aggregator.source_interval)
+            if store is None or source is None or len(source) == 0:
+                continue
+
+            first_period = aggregator.period_label(source.timestamp(0))
+            n = int(np.searchsorted(store.column('datetime'), first_period.value))
+            n = min(n, len(store) - self.history_lookback(interval), self.reference_position(interval))
+            self.trim_interval(interval, n)
+
+    def build_lazy_structures(self):
+        """
+        创建所有按需创建的周期聚合以及centrum的中枢探测器，已经创建的不受影响
+        """
+        for interval in LAZY_INTERVALS:
+            self.add_aggregator(interval)
+        if self.centrum:
+            for interval in CENTRUM_INTERVALS:
+                self.find_centrum_sensor(interval)
+
+    def trim_interval(self, interval: Interval, n: int):
+        if n <= 0:
             return
 
-        if self.weekly_df is None:
-            self.weekly_df = self.resample_to_week_data(self.daily_df)
-            self.init_heikin_ashi_candle_df(self.weekly_df)
-        else:
-            last_week_dt = self.weekly_df.index[-1]
-            last_bar = self.daily_df.iloc[-1]
-            _, last_week, _ = (last_week_dt - timedelta(days=last_week_dt.weekday())).isocalendar()
-            _, new_week, _ = (last_bar.name - timedelta(days=last_bar.name.weekday())).isocalendar()
-            if last_week == new_week:
-                last_week_s = self.weekly_df.iloc[-1].copy()
-
-                last_week_s["high"] = max(last_week_s["high"], last_bar["high"])
-                last_week_s["low"] = min(last_week_s["low"], last_bar["low"])
-                last_week_s["close"] = last_bar["close"]
-                last_week_s["volume"] += last_bar["volume"]
-                last_week_s["turnover"] += last_bar["turnover"]
-
-                last_week_s["ha_close"] = (last_week_s['open'] + last_week_s['high'] + last_week_s['low'] + last_week_s['close']) / 4
-                last_week_s["ha_high"] = max(last_week_s["high"], last_week_s["ha_open"], last_week_s["ha_close"])
-                last_week_s["ha_low"] = min(last_week_s["low"], last_week_s["ha_open"], last_week_s["ha_close"])
-
-                self.weekly_df.loc[last_week_s.name] = last_week_s
-            else:
-                last_bar_s = self.daily_df.iloc[-1].copy()
-                new_index = last_bar_s.name - timedelta(days=last_bar_s.name.weekday()) + timedelta(days=4)
-                last_bar_s['ha_close'] = (last_bar_s['open'] + last_bar_s['high'] + last_bar_s['low'] + last_bar_s['close']) / 4
-                last_bar_s['ha_open'] = (self.weekly_df.iloc[-1]['ha_open'] + self.weekly_df.iloc[-1]['ha_close']) / 2
-                last_bar_s['ha_high'] = max(last_bar_s['high'], last_bar_s['ha_open'], last_bar_s['ha_close'])
-                last_bar_s['ha_low'] = min(last_bar_s['low'], last_bar_s['ha_open'], last_bar_s['ha_close'])
-                self.weekly_df.loc[new_index] = last_bar_s
+        store = self.get_store(interval)
+        store.trim(n)
+        for group_key in self.ind_graph.groups:
+            if self.get_store(group_key[0]) is store:
+                self.ind_graph.purge_oldest(group_key, n)
+        for ind_name, cache in self.ind_caches.items():
+            if self.get_store(self.ind_interval[ind_name]) is store:
+                cache.purge(n)
+
+        before = store.timestamp(0)
+        sensor = self.sensors.get(self.resolve_interval(interval))
+        if sensor is not None:
+            sensor.trim_history(before)
+        for listener, listener_interval in self.history_listeners:
+            if self.get_store(listener_interval) is store:
+                listener.trim_history(before)
+        logger.debug(f"[SM] trim history, interval: {interval}, bars: {n}, before: {before}")
 
     def recent_week_high(self, recent_weeks: int = 7, last_contained: bool = True) -> float:
         return self.recent_high(Interval.WEEKLY, recent_weeks, last_contained)
@@ -264,24 +635,22 @@ class SourceManager(object):
         :param last_contained: 是否包含最后一周的数据，默认为包含。如果当周要根据价格突破判断入场位置的话，则不应该包含当周（最后一周）的数据；
         :return:
         """
-        source_df = self.weekly_df if interval == Interval.WEEKLY else self.daily_df
-        if source_df is None:
-            return None
-
-        n = recent_bars if last_contained else recent_bars + 1
-        if len(source_df) < recent_bars + 1:
-            n = len(source_df)
-
-        high = source_df['high']
-        return high[-1 * n:].max() if last_contained else high[-1 * n: -1].max()
+        return self.recent_extreme(interval, 'high', True, recent_bars, last_contained)
 
     def recent_week_high_since(self, start: datetime):
         # start 日期以来最高点(不包含本周), [start, last_week)
-        if self.weekly_df is None or start not in self.weekly_df.index:
+        weekly_store = self.week_aggregator.store
+        if weekly_store is None:
+            return None
+
+        start_value = pd.Timestamp(start).value
+        dates = weekly_store.column('datetime')
+        pos = int(np.searchsorted(dates, start_value))
+        if pos >= len(dates) or dates[pos] != start_value:
             return None
 
-        recent_df = self.weekly_df.loc[start:]
-        return recent_df['high'][:-1].max()
+        high = self.rolling_extreme(Interval.WEEKLY, 'high', True).since(weekly_store.offset + pos)
+        return high if high is not None else np.nan
 
     def recent_week_low(self, recent_weeks: int = 7, last_contained: bool = True) -> float:
         return self.recent_low(Interval.WEEKLY, recent_weeks, last_contained)
@@ -290,17 +659,7 @@ class SourceManager(object):
         return self.recent_low(Interval.DAILY, recent_days, last_contained)
 
     def recent_low(self, interval, recent_bars: int = 7, last_contained: bool = True) -> float:
-        source_df = self.weekly_df if interval == Interval.WEEKLY else self.daily_df
-        if source_df is None:
-            return None
-
-        n = recent_bars if last_contained else recent_bars + 1
-        if len(source_df) < recent_bars + 1:
-            n = len(source_df)
-
-        low = source_df['low']
-        return low[-1 * n:].min() if last_contained else low[-1 * n: -1].min()
-
+        return self.recent_extreme(interval, 'low', False, recent_bars, last_contained)
 
     def recent_week_hl_gap(self, recent_weeks, last_contained: bool = True):
         """
@@ -308,16 +667,10 @@ class SourceManager(object):
         :param recent_weeks:
         :return:
         """
-        if self.weekly_df is None:
+        if self.week_aggregator.store is None:
             return 0
 
-        n = recent_weeks if last_contained else recent_weeks + 1
-        if len(self.weekly_df) < recent_weeks + 1:
-            n = len(self.weekly_df)
-
-        data = self.weekly_df.iloc[-1 * n:] if last_contained else self.weekly_df.iloc[-1 * n: -1]
-        hl_gap_s = (data['high'] - data['low'])/data['close']
-        return hl_gap_s.max()
+        return self.recent_extreme(Interval.WEEKLY, 'hl_gap', True, recent_weeks, last_contained)
 
     def last_week_hl_gap(self, week_num):
         """
@@ -325,25 +678,114 @@ class SourceManager(object):
         :param week_num:
         :return:
         """
-        if self.weekly_df is None:
+        weekly_store = self.week_aggregator.store
+        if weekly_store is None:
             return 0
 
-        n = week_num
-        if len(self.weekly_df) < week_num:
-            n = len(self.weekly_df)
+        n = min(week_num, len(weekly_store))
+        # 跟iloc[-n]一致：week_num为0时取第一周
+        pos = len(weekly_store) - n if n > 0 else -n
+        return hl_gap_values(weekly_store, pos, pos + 1)[0]
 
-        data = self.weekly_df.iloc[-1 * n]
-        return (data['high'] - data['low'])/data['close']
+    def rolling_extreme(self, interval: Interval, name: str, is_max: bool, window: int = None) -> RollingExtreme:
+        """
+        按需注册的滑动窗口极值索引，(周期, 列, max/min, 窗口)相同的查询共用一个索引
+        :param name: 列名，或者hl_gap表示振幅
+        :param window: 已完成bar的窗口长度，None表示全部历史
+        """
+        store = self.get_store(interval)
+        key = (self.resolve_interval(interval), name, is_max, window)
+        extreme = self.extremes.get(key)
+        if extreme is None or extreme.store is not store:
+            values = hl_gap_values if name == 'hl_gap' else column_values(name)
+            extreme = RollingExtreme(store, values, is_max, window)
+            self.extremes[key] = extreme
+        extreme.sync()
+        return extreme
+
+    def recent_extreme(self, interval: Interval, name: str, is_max: bool, recent_bars: int, last_contained: bool) -> float:
+        """
+        最近N根bar的极值，跟对Series切片后求max/min的结果一致：
+        包含最后一根bar时，为前N-1根已完成bar的窗口极值再合并最后一根bar；不包含时，为前N根已完成bar的窗口极值
+        """
+        store = self.get_store(interval)
+        if store is None:
+            return None
+        if len(store) == 0:
+            return np.nan
+
+        window = recent_bars - 1 if last_contained else recent_bars
+        extreme = self.rolling_extreme(interval, name, is_max, max(window, 0))
+        values = [extreme.front(), extreme.last_value() if last_contained else None]
+        values = [v for v in values if v is not None and v == v]
+        if len(values) == 0:
+            return np.nan
+        return max(values) if is_max else min(values)
 
     def get_dataframe(self, interval: Interval):
-        return self.weekly_df if interval == Interval.WEEKLY else self.data_df
+        store = self.get_store(interval)
+        return store.to_dataframe() if store is not None else None
+
+    def get_store(self, interval: Interval) -> BarStore:
+        if interval in self.aggregators:
+            return self.aggregators[interval].store
+        if interval in LAZY_INTERVALS:
+            return self.add_aggregator(interval).store
+        return self.store
+
+    def memory_usage(self) -> Dict[str, int]:
+        """
+        按组件统计占用的字节数，用于估算全市场运行时的内存，键中带周期的取值（如d、w、M）：
+        bars.*: 各周期bar数据的列式存储（按容量预分配）；frame.*: 缓存的DataFrame视图
+        sensor.*: 中枢探测器的pivot_df；indicators: 指标的内部序列（共享的节点只计一次）；extremes: 滑动窗口极值索引
+        """
+        usage = {}
+        stores = [(self.base_interval, self.store)] + [(interval, aggregator.store) for interval, aggregator in self.aggregators.items()]
+        for interval, store in stores:
+            if store is None:
+                continue
+            store_usage = store.memory_usage()
+            usage[f"bars.{interval.value}"] = store_usage['arrays']
+            usage[f"frame.{interval.value}"] = store_usage['frame']
+        for interval, sensor in self.sensors.items():
+            usage[f"sensor.{interval.value}"] = sensor.memory_usage()
+        usage['indicators'] = self.ind_graph.memory_usage()
+        usage['extremes'] = sum(extreme.memory_usage() for extreme in self.extremes.values())
+        usage['total'] = sum(usage.values())
+        return usage
+
+    @property
+    def weekly_df(self) -> DataFrame:
+        """
+        周线的DataFrame视图，由周线聚合器的存储按需构建
+        """
+        weekly_store = self.week_aggregator.store
+        return weekly_store.to_dataframe() if weekly_store is not None else None
+
+    @property
+    def data_df(self) -> DataFrame:
+        """
+        bar数据的DataFrame视图，由列式存储按需构建
+        """
+        return self.store.to_dataframe() if self.store is not None else None
+
+    @property
+    def daily_df(self) -> DataFrame:
+        """
+        日线的DataFrame视图，输入为分钟线/小时线时由日线聚合器的存储构建
+        """
+        return self.get_dataframe(Interval.DAILY)
+
+    @property
+    def monthly_df(self) -> DataFrame:
+        return self.get_dataframe(ExInterval.MONTHLY)
 
     @property
     def count(self) -> int:
         """
-        Get open price time series.
+        Get bar count.
         """
-        return len(self.data_df)
+        return len(self.store) if self.store is not None else 0
 
     @property
     def open(self) -> pd.Series:
@@ -417,26 +859,30 @@ class SourceManager(object):
         return self.prior_bar(Interval.WEEKLY, 2)
 
     def prior_bar(self, interval: Interval, bar_count: int) -> Series:
-        source_df = self.daily_df if interval == Interval.DAILY else self.weekly_df
-        if source_df is None or len(source_df) < bar_count:
+        source = self.get_store(interval)
+        if source is None or len(source) < bar_count:
             return None
 
-        return source_df.iloc[-1 * bar_count, :]
+        return source.row(-1 * bar_count)
 
     @property
     def is_up(self) -> bool:
-        if self.daily_df is None or len(self.daily_df) < 2:
+        # 比较最后两根日线（分钟线/小时线输入时同样是日线）
+        daily_store = self.get_store(Interval.DAILY)
+        if daily_store is None or len(daily_store) < 2:
             return False
 
-        highs = self.daily_df['high']
+        highs = daily_store.column('high')
         return highs[-1] >= highs[-2]
 
     @property
     def is_down(self) -> bool:
-        if self.daily_df is None or len(self.daily_df) < 2:
+        # 比较最后两根日线（分钟线/小时线输入时同样是日线）
+        daily_store = self.get_store(Interval.DAILY)
+        if daily_store is None or len(daily_store) < 2:
             return False
 
-        lows = self.daily_df['low']
+        lows = daily_store.column('low')
         return lows[-1] <= lows[-2]
 
     @property
@@ -476,20 +922,39 @@ class SourceManager(object):
         return self.last_pivot_date(Interval.DAILY, "bottom")
 
     def last_pivot_date(self, interval: Interval, pivot_type: str) -> datetime:
-        if not self.centrum or (interval == Interval.DAILY and self.daily_df is None) or \
-                (interval == Interval.WEEKLY and self.weekly_df is None):
+        if self.get_store(interval) is None:
+            return None
+        source_detector = self.find_centrum_sensor(interval)
+        if source_detector is None:
             return None
 
-        source_detector = self.dc_sensor if interval == Interval.DAILY else self.wc_sensor
         return source_detector.last_top_date if pivot_type == "top" else source_detector.last_bottom_date
 
     def last_pivot_price(self, interval: Interval, pivot_type: str, price_type: str = 'low') -> float:
         index = self.last_pivot_date(interval, pivot_type)
-        source_detector = self.dc_sensor if interval == Interval.DAILY else self.wc_sensor
-        return source_detector.pivot_df.loc[index, price_type] if index is not None else None
+        source_detector = self.get_centrum_sensor(interval)
+        return source_detector.pivot_value(index, price_type) if index is not None else None
+
+    def centrum_zone(self, interval: Interval):
+        """
+        最后一个中枢（当前的，或者最近结束的），没有时为None
+        """
+        return self.get_centrum_sensor(interval).current_zone
+
+    def above_centrum_zone(self, interval: Interval, price: float = None) -> bool:
+        """
+        价格（默认最新收盘价）是否在最后一个中枢的ZG之上
+        """
+        if price is None:
+            price = self.store.column('close')[-1]
+        return self.get_centrum_sensor(interval).above_last_zone(price)
 
     def get_centrum_sensor(self, interval: Interval) -> CentrumSensor:
-        return self.dc_sensor if interval == Interval.DAILY else self.wc_sensor
+        sensor = self.find_centrum_sensor(interval)
+        if sensor is None:
+            key = Interval.DAILY if interval == Interval.DAILY else Interval.WEEKLY
+            sensor = self.idle_sensors.setdefault(key, CentrumSensor(compact=self.compact))
+        return sensor
 
     def get_indicator_origin_values(self, ind_name):
         indicator = self.indicators[ind_name]
@@ -506,31 +971,44 @@ class SourceManager(object):
             outputs = {new_name: indicator.output_values}
         return outputs
 
-    def get_indicator_values(self, ind_name):
+    def synced_outputs(self, ind_name) -> IndicatorOutputs:
         """
-        过滤掉指标头部的None值
+        同步到当前bar的指标输出缓存，同一根bar内只同步一次；指标还没有有效输出时返回None
         """
-        outputs = self.get_indicator_origin_values(ind_name)
-        if not outputs:
+        if not has_valid_values(self.indicators[ind_name]):
             return None
 
-        for key in outputs.keys():
-            ind_value = outputs[key]
-            start = len(ind_value) - valid_values_length(ind_value)
-            outputs[key] = ind_value[start:]
-        return outputs
+        cache = self.ind_caches[ind_name]
+        if cache.version != self.bar_version:
+            cache.sync()
+            cache.version = self.bar_version
+        return cache
+
+    def get_indicator_values(self, ind_name):
+        """
+        过滤掉指标头部的None值
+        结果来自增量缓存，每个输出是只读的tuple，同一根bar内重复读取直接返回缓存的视图
+        """
+        cache = self.synced_outputs(ind_name)
+        return dict(cache.views()) if cache is not None else None
 
     def get_indicator_value(self, ind_name, key):
-        outputs = self.get_indicator_values(ind_name)
-        return outputs[key] if outputs is not None else None
+        cache = self.synced_outputs(ind_name)
+        return cache.views()[key] if cache is not None else None
+
+    @property
+    def calendar(self) -> TradingCalendar:
+        """
+        日线的交易日历：交易日序号、周编号、N个交易日之前等查询
+        """
+        daily_store = self.get_store(Interval.DAILY)
+        if self.trading_calendar is None or self.trading_calendar.store is not daily_store:
+            self.trading_calendar = TradingCalendar(daily_store)
+        return self.trading_calendar
 
     def latest_week_days(self) -> int:
         if self.weekly_df is None:
             return None
 
-        latest_week_date = self.weekly_df.index[-1]
-        week_first_day = latest_week_date - timedelta(days=5)
-        for i in range(2, 7):
-            if self.daily_df.index[-1 * i] < week_first_day:
-                return i - 1
-        return 1
+        # 最后一周已有的交易日数，按周编号二分查找，跟周线的分组一致
+        return self.calendar.week_days()
@@ -0,0 +1,125 @@
+from datetime import timedelta
+from typing import Any
+
+import numpy as np
+import pandas as pd
+
+from ex_vnpy.manager.bar_aggregator import week_id, week_ids
+from ex_vnpy.manager.bar_store import BarStore, DATETIME_COLUMN
+
+DUPLICATE_DAYS = 14             # 重复信号的判断窗口（自然日）
+DUPLICATE_TRADING_DAYS = 10     # 指定交易日历时，重复信号的判断窗口（交易日）
+
+
+class TradingCalendar(object):
+    """
+    交易日历，直接基于日线存储的datetime列(int64 ns)，不复制数据
+    1. 交易日序号即为bar在存储中的绝对位置(offset + pos)，存储裁剪头部之后依然有效
+    2. 按日期定位交易日用searchsorted，O(log n)；按序号定位为O(1)
+    3. 每个交易日的周编号(week_id)预先计算并缓存在按2倍扩容的数组中，新增bar时只补算新增的部分
+    """
+
+    def __init__(self, store: BarStore):
+        """Constructor"""
+        self.store: BarStore = store
+        self.week_start: int = 0            # week_id缓存中第一个元素对应的交易日序号
+        self.week_size: int = 0             # week_id缓存的有效长度
+        self.week_cache: np.ndarray = np.empty(0, dtype=np.int64)
+
+    def _to_ns(self, dt: Any) -> int:
+        return pd.Timestamp(dt).value
+
+    def ordinal(self, dt: Any) -> int:
+        """
+        dt当天或之前最近一个交易日的序号，早于第一个交易日时为第一个交易日的序号减1
+        """
+        dates = self.store.column(DATETIME_COLUMN)
+        return self.store.offset + int(np.searchsorted(dates, self._to_ns(dt), side='right')) - 1
+
+    def position(self, dt: Any) -> int:
+        """
+        交易日dt在存储中的位置，dt不是交易日时返回None
+        """
+        dates = self.store.column(DATETIME_COLUMN)
+        value = self._to_ns(dt)
+        pos = int(np.searchsorted(dates, value))
+        return pos if pos < len(dates) and dates[pos] == value else None
+
+    def trading_days_between(self, start: Any, end: Any) -> int:
+        """
+        (start, end] 之间的交易日数，start、end都是交易日时即为两者序号之差
+        """
+        return self.ordinal(end) - self.ordinal(start)
+
+    def days_ago(self, n: int) -> pd.Timestamp:
+        """
+        最后一个交易日之前第n个交易日的日期，超出范围时返回None
+        """
+        if n < 0 or n >= len(self.store):
+            return None
+        return self.store.timestamp(-1 - n)
+
+    def days_since(self, dt: Any) -> int:
+        """
+        dt（含）以来的交易日数
+        """
+        dates = self.store.column(DATETIME_COLUMN)
+        return len(dates) - int(np.searchsorted(dates, self._to_ns(dt)))
+
+    def week_ids(self) -> np.ndarray:
+        """
+        存储中每个交易日的周编号，跟周线聚合的分组一致
+        """
+        store = self.store
+        if self.week_start < store.offset:
+            # 存储已经裁剪了头部，缓存同步前移
+            n = min(store.offset - self.week_start, self.week_size)
+            self.week_cache[:self.week_size - n] = self.week_cache[n:self.week_size]
+            self.week_size -= n
+            self.week_start = store.offset
+
+        size = len(store)
+        if self.week_size < size:
+            if len(self.week_cache) < size:
+                cache = np.empty(max(size, len(self.week_cache) * 2), dtype=np.int64)
+                cache[:self.week_size] = self.week_cache[:self.week_size]
+                self.week_cache = cache
+            index = pd.DatetimeIndex(store.column(DATETIME_COLUMN)[self.week_size:size].astype('M8[ns]'))
+            if store.tz is not None:
+                index = index.tz_localize('UTC').tz_convert(store.tz)
+            self.week_cache[self.week_size:size] = week_ids(index)
+            self.week_size = size
+        return self.week_cache[:size]
+
+    def week_of(self, dt: Any) -> int:
+        """
+        dt所在周的编号，交易日直接读取缓存
+        """
+        pos = self.position(dt)
+        if pos is not None:
+            return int(self.week_ids()[pos])
+        ts = pd.Timestamp(dt)
+        if self.store.tz is not None and ts.tz is not None:
+            ts = ts.tz_convert(self.store.tz)
+        return week_id(ts)
+
+    def same_week(self, a: Any, b: Any) -> bool:
+        return self.week_of(a) == self.week_of(b)
+
+    def week_days(self) -> int:
+        """
+        最后一周已有的交易日数（包含最后一个交易日）
+        """
+        ids = self.week_ids()
+        if len(ids) == 0:
+            return 0
+        return len(ids) - int(np.searchsorted(ids, ids[-1]))
+
+
+def in_duplicate_window(order_date: Any, today: Any, calendar: TradingCalendar = None) -> bool:
+    """
+    上一个订单是否还在重复信号的判断窗口内：指定交易日历时按交易日数（searchsorted），不受节假日的影响；否则按自然日
+    """
+    if calendar is not None:
+        return calendar.trading_days_between(order_date, today) <= DUPLICATE_TRADING_DAYS
+    return order_date + timedelta(days=DUPLICATE_DAYS) >= today
@@ -0,0 +1,371 @@
+import copy
+import logging
+from typing import Any, Dict, Iterator, List, Tuple
+
+import numpy as np
+import pandas as pd
+from pandas import DataFrame
+
+from ex_vnpy.manager.bar_store import BarStore, DATETIME_COLUMN
+from ex_vnpy.manager.source_manager import SourceManager
+from ex_vnpy.object import ExBarData
+from ex_vnpy.sensor.batch_centrum_sensor import BatchCentrumSensor
+
+
+logger = logging.getLogger("UniverseSourceManager")
+
+
+class BarPanel(object):
+    """
+    多标的bar数据的二维存储，每一列是一个 (标的 × 时间) 的numpy数组
+    1. 每个标的占一行，各自记录长度，允许停牌、上市时间不同
+    2. 每个标的的PanelBarStore直接引用二维数组中的一行，不复制数据
+    3. 时间维度、标的维度容量不足时都按2倍扩容，扩容后重新绑定所有标的的行
+    """
+
+    def __init__(self, capacity: int = 256):
+        """Constructor"""
+        self.columns: List[str] = []
+        self.capacity: int = max(capacity, 1)     # 时间维度的容量
+        self.row_capacity: int = 16               # 标的维度的容量
+        self.arrays: Dict[str, np.ndarray] = {}
+        self.stores: List['PanelBarStore'] = []
+
+    def __len__(self) -> int:
+        return len(self.stores)
+
+    def add_row(self) -> int:
+        row = len(self.stores)
+        self.stores.append(None)
+        if row >= self.row_capacity:
+            self._resize(self.row_capacity * 2, self.capacity)
+        return row
+
+    def allocate(self, dtypes: Dict[str, np.dtype]):
+        for name in self.columns:
+            self.arrays[name] = np.empty((self.row_capacity, self.capacity), dtype=dtypes[name])
+        self._rebind()
+
+    def reserve(self, capacity: int):
+        """
+        保证时间维度的容量不小于capacity
+        """
+        if capacity <= self.capacity:
+            return
+
+        new_capacity = self.capacity
+        while new_capacity < capacity:
+            new_capacity *= 2
+        self._resize(self.row_capacity, new_capacity)
+
+    def _resize(self, row_capacity: int, capacity: int):
+        for name, arr in self.arrays.items():
+            new_arr = np.empty((row_capacity, capacity), dtype=arr.dtype)
+            new_arr[:self.row_capacity, :self.capacity] = arr
+            self.arrays[name] = new_arr
+        self.row_capacity = row_capacity
+        self.capacity = capacity
+        self._rebind()
+
+    def astype(self, name: str, dtype: Any):
+        self.arrays[name] = self.arrays[name].astype(dtype)
+        self._rebind()
+
+    def _rebind(self):
+        for store in self.stores:
+            if store is not None:
+                store.bind()
+
+    def attach(self, row: int, data_df: DataFrame) -> 'PanelBarStore':
+        """
+        把单个标的的初始数据写入第row行，返回该标的的存储
+        """
+        if not self.columns:
+            self.columns = list(data_df.columns)
+
+        source = BarStore.from_dataframe(data_df)      # 借用单标的的转换逻辑（datetime转为int64等）
+        store = PanelBarStore(self, row)
+        self.stores[row] = store
+        if len(source) == 0:
+            return store
+
+        if not self.arrays:
+            self.allocate({name: source.arrays[name].dtype for name in self.columns})
+        self.reserve(len(source))
+        for name in self.columns:
+            values = source.column(name)
+            if values.dtype != self.arrays[name].dtype:
+                dtype = np.result_type(values.dtype, self.arrays[name].dtype)
+                if dtype != self.arrays[name].dtype:
+                    self.astype(name, dtype)
+            self.arrays[name][row, :len(values)] = values
+
+        store.tz = source.tz
+        store.size = len(source)
+        store.version += 1
+        return store
+
+
+class PanelBarStore(BarStore):
+    """
+    BarPanel中一个标的的存储，列数组是二维数组中对应行的视图
+    扩容、类型提升都交给BarPanel统一处理
+    """
+
+    def __init__(self, panel: BarPanel, row: int):
+        """Constructor"""
+        super().__init__(panel.columns, capacity=panel.capacity)
+        self.panel: BarPanel = panel
+        self.panel_row: int = row
+        self.bind()
+
+    def bind(self):
+        self.capacity = self.panel.capacity
+        self.arrays = {name: arr[self.panel_row] for name, arr in self.panel.arrays.items()}
+
+    def _allocate(self, row: Dict[str, Any]):
+        dtypes = {name: np.dtype(np.int64) if name == DATETIME_COLUMN else self._dtype_of(row.get(name)) for name in self.columns}
+        self.panel.allocate(dtypes)
+
+    def _grow(self, min_capacity: int):
+        self.panel.reserve(min_capacity)
+
+    def _astype(self, name: str, dtype: Any) -> np.ndarray:
+        self.panel.astype(name, dtype)
+        return self.arrays[name]
+
+    def detach(self) -> BarStore:
+        """
+        复制为独立的BarStore，不再引用BarPanel
+        """
+        if not self.arrays:
+            return BarStore(self.columns, capacity=self.capacity)
+
+        store = BarStore.from_arrays(self.columns, {name: arr[:self.size] for name, arr in self.arrays.items()}, tz=self.tz)
+        store.offset = self.offset
+        return store
+
+    def __reduce_ex__(self, protocol: int):
+        # 序列化、deepcopy时只带上本标的的数据，得到独立的BarStore，而不是整个BarPanel
+        return self.detach().__reduce_ex__(protocol)
+
+
+class PanelSourceManager(SourceManager):
+    """
+    UniverseSourceManager中单个标的的视图，bar数据存放在BarPanel中，其他接口跟SourceManager完全一致
+    快照（dump_state/save_state）中的存储是BarPanel中该行的独立副本，恢复为普通的SourceManager
+    """
+
+    def __init__(self, panel: BarPanel, row: int, bars: list[ExBarData] = [], ta: dict = {}, centrum: bool = False,
+                 min_size: int = 100, max_history: int = None, bulk_warmup: bool = False):
+        """Constructor"""
+        self.panel: BarPanel = panel
+        self.panel_row: int = row
+        super().__init__(bars, ta=ta, centrum=centrum, min_size=min_size, max_history=max_history, bulk_warmup=bulk_warmup)
+
+    def create_store(self, data_df: DataFrame) -> BarStore:
+        return self.panel.attach(self.panel_row, data_df)
+
+    def dump_state(self) -> Dict[str, Any]:
+        # 深拷贝使快照不再跟BarPanel、本视图共享数据，存储由PanelBarStore.detach复制，指标中的行视图随之指向副本
+        snapshot = super().dump_state()
+        snapshot['state'] = copy.deepcopy(snapshot['state'])
+        return snapshot
+
+    @classmethod
+    def restore_state(cls, snapshot: Dict[str, Any], ta: dict = None, bars: list[ExBarData] = None) -> SourceManager:
+        return SourceManager.restore_state(snapshot, ta=ta, bars=bars)
+
+
+class UniverseSourceManager(object):
+    """
+    多标的的数据管理器
+    1. OHLCV、Heikin-Ashi、资金流等列存放在 (标的 × 时间) 的二维数组中，所有标的共用
+    2. update_bars一次接收所有标的同一时刻的bar，按列向量化写入
+    3. 每个标的对应一个PanelSourceManager视图，提供跟SourceManager一致的接口，SignalDetector无需修改
+    4. batch_centrum为True时，所有标的的中枢探测由一个BatchCentrumSensor完成，每次update_bars一起推进
+    """
+
+    def __init__(self, bars: Dict[str, List[ExBarData]] = None, ta: dict = {}, centrum: bool = False,
+                 min_size: int = 100, max_history: int = None, bulk_warmup: bool = False, batch_centrum: bool = False):
+        """
+        :param bars: vt_symbol -> 该标的的历史bar
+        :param batch_centrum: 以二维数组批量探测所有标的（bar所在周期）的中枢，结果由centrum_sensor按标的查询
+        """
+        self.ta = ta
+        self.centrum = centrum
+        self.min_size = min_size
+        self.max_history = max_history
+        self.bulk_warmup = bulk_warmup
+
+        capacity = max([len(symbol_bars) for symbol_bars in bars.values()], default=0) * 2 if bars else 256
+        self.panel: BarPanel = BarPanel(capacity=capacity)
+        self.symbols: List[str] = []
+        self.managers: Dict[str, PanelSourceManager] = {}
+
+        self.centrum_sensor: BatchCentrumSensor = BatchCentrumSensor() if batch_centrum else None
+
+        if bars:
+            for vt_symbol, symbol_bars in bars.items():
+                self.add_symbol(vt_symbol, symbol_bars)
+            self.init_centrum_sensor()
+
+    def init_centrum_sensor(self, symbols: List[str] = None):
+        """
+        用二维数组中的历史数据批量初始化尚未加入centrum_sensor的标的
+        """
+        if self.centrum_sensor is None:
+            return
+        symbols = [vt_symbol for vt_symbol in (self.symbols if symbols is None else symbols)
+                   if self.managers[vt_symbol].count > 0 and vt_symbol not in self.centrum_sensor]
+        if not symbols:
+            return
+
+        rows = np.array([self.managers[vt_symbol].panel_row for vt_symbol in symbols])
+        sizes = np.array([self.managers[vt_symbol].count for vt_symbol in symbols])
+        arrays = {name: self.panel.arrays[name][rows] for name in [DATETIME_COLUMN, 'open', 'high', 'low', 'close']}
+        self.centrum_sensor.init_sensor(symbols, arrays[DATETIME_COLUMN], arrays['high'], arrays['low'], sizes,
+                                        arrays['open'], arrays['close'], tz=self.managers[symbols[0]].store.tz)
+
+    def update_centrum(self, managers: List[PanelSourceManager]):
+        """
+        各标的最后一根bar输入centrum_sensor（新增或盘中更新），每个标的最多一次
+        尚未加入的标的（如之后通过add_symbol加入的）用包括这根bar在内的全部历史数据初始化
+        """
+        if self.centrum_sensor is None or len(managers) == 0:
+            return
+
+        symbols = [self.symbols[sm.panel_row] for sm in managers]
+        known = [vt_symbol in self.centrum_sensor for vt_symbol in symbols]
+        self.init_centrum_sensor([vt_symbol for vt_symbol, is_known in zip(symbols, known) if not is_known])
+
+        managers = [sm for sm, is_known in zip(managers, known) if is_known]
+        if len(managers) == 0:
+            return
+
+        rows = np.array([sm.panel_row for sm in managers])
+        pos = np.array([sm.count - 1 for sm in managers])
+        values = {name: self.panel.arrays[name][rows, pos] for name in [DATETIME_COLUMN, 'open', 'high', 'low', 'close']}
+        self.centrum_sensor.update_bars([self.symbols[row] for row in rows], values[DATETIME_COLUMN],
+                                        values['high'], values['low'], values['open'], values['close'])
+
+    def add_symbol(self, vt_symbol: str, bars: list[ExBarData] = []) -> SourceManager:
+        row = self.panel.add_row()
+        sm = PanelSourceManager(self.panel, row, bars, ta=self.ta, centrum=self.centrum,
+                                min_size=self.min_size, max_history=self.max_history, bulk_warmup=self.bulk_warmup)
+        self.symbols.append(vt_symbol)
+        self.managers[vt_symbol] = sm
+        return sm
+
+    def __getitem__(self, vt_symbol: str) -> SourceManager:
+        return self.managers[vt_symbol]
+
+    def __contains__(self, vt_symbol: str) -> bool:
+        return vt_symbol in self.managers
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.symbols)
+
+    def __len__(self) -> int:
+        return len(self.symbols)
+
+    def get(self, vt_symbol: str) -> SourceManager:
+        return self.managers.get(vt_symbol)
+
+    def update_bars(self, bars: List[ExBarData]):
+        """
+        批量更新所有标的同一时刻的bar（新增或盘中更新）
+        1. 所有列按列向量化写入二维数组，Heikin-Ashi一并向量化计算
+        2. 之后逐个标的做周线聚合、中枢探测、指标更新
+        首次出现的标的、以及同一批次中重复出现的标的，按SourceManager.update_bar逐个处理
+        """
+        batch: List[Tuple[PanelSourceManager, ExBarData]] = []
+        rest: List[Tuple[PanelSourceManager, ExBarData]] = []
+        seen = set()
+        for bar in bars:
+            vt_symbol = bar.vt_symbol
+            sm = self.managers[vt_symbol] if vt_symbol in self.managers else self.add_symbol(vt_symbol)
+            if vt_symbol in seen:
+                rest.append((sm, bar))
+            elif sm.count == 0:
+                sm.update_bar(bar)
+                self.update_centrum([sm])
+            else:
+                batch.append((sm, bar))
+            seen.add(vt_symbol)
+
+        if len(batch) > 0:
+            is_revise = self.write_bars(batch)
+            for (sm, bar), revise in zip(batch, is_revise):
+                sm.process_bar(bar.datetime, not revise)
+            self.update_centrum([sm for sm, _ in batch])
+
+        for sm, bar in rest:
+            sm.update_bar(bar)
+            self.update_centrum([sm])
+
+    def write_bars(self, batch: List[Tuple[PanelSourceManager, ExBarData]]) -> List[bool]:
+        """
+        把一批bar写入二维数组，每个标的最多一根，且已经有历史数据
+        跟最后一根bar时间相同的，覆盖最后一行（盘中更新），否则追加
+        :return: 每个标的是否为盘中更新
+        """
+        panel = self.panel
+        stores = [sm.store for sm, _ in batch]
+        rows = np.array([sm.panel_row for sm, _ in batch])
+        sizes = np.array([len(store) for store in stores])
+        records = [bar.to_dict() for _, bar in batch]
+
+        dates = np.array([pd.Timestamp(record['datetime']).value for record in records], dtype=np.int64)
+        is_revise = panel.arrays[DATETIME_COLUMN][rows, sizes - 1] == dates
+        pos = np.where(is_revise, sizes - 1, sizes)
+        panel.reserve(int(pos.max()) + 1)
+
+        # Heikin Ashi，跟SourceManager.update_bar的计算一致
+        open_ = np.array([record['open'] for record in records], dtype=np.float64)
+        high = np.array([record['high'] for record in records], dtype=np.float64)
+        low = np.array([record['low'] for record in records], dtype=np.float64)
+        close = np.array([record['close'] for record in records], dtype=np.float64)
+        prior = np.maximum(pos - 1, 0)
+        ha_close = (open_ + high + low + close) / 4
+        ha_open = np.where(pos > 0, (panel.arrays['ha_open'][rows, prior] + panel.arrays['ha_close'][rows, prior]) / 2, open_)
+        computed = {
+            DATETIME_COLUMN: dates,
+            'ha_close': ha_close,
+            'ha_open': ha_open,
+            'ha_high': np.maximum(np.maximum(high, ha_open), ha_close),
+            'ha_low': np.minimum(np.minimum(low, ha_open), ha_close),
+        }
+
+        for name in panel.columns:
+            values = computed[name] if name in computed else np.array([record.get(name) for record in records])
+            arr = panel.arrays[name]
+            kind, value_kind = arr.dtype.kind, values.dtype.kind
+            if kind == 'O' or (kind == value_kind == 'b') or (kind in 'iuf' and value_kind in 'iu') or (kind == value_kind == 'f'):
+                arr[rows, pos] = values
+            elif kind in 'iu' and value_kind == 'f':
+                panel.astype(name, np.float64)
+                panel.arrays[name][rows, pos] = values
+            else:
+                # 包含None、字符串等，逐个写入，由BarStore处理类型提升
+                for store, p, record in zip(stores, pos, records):
+                    store._write(name, int(p), record.get(name))
+
+        for store, revise in zip(stores, is_revise):
+            if not revise:
+                store.size += 1
+            store.version += 1
+        return is_revise.tolist()
+
+    def latest(self, name: str) -> np.ndarray:
+        """
+        所有标的（按symbols顺序）最后一根bar的取值，没有数据的标的为nan
+        """
+        sizes = np.array([self.managers[vt_symbol].count for vt_symbol in self.symbols])
+        rows = np.array([self.managers[vt_symbol].panel_row for vt_symbol in self.symbols])
+        if name not in self.panel.arrays or len(rows) == 0:
+            return np.full(len(self.symbols), np.nan)
+
+        values = self.panel.arrays[name][rows, np.maximum(sizes - 1, 0)].astype(np.float64)
+        values[sizes == 0] = np.nan
+        return values
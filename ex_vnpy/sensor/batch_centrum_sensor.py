@@ -0,0 +1,419 @@
+import logging
+from typing import Any, Dict, List, Sequence
+
+import numpy as np
+import pandas as pd
+from pandas import DataFrame
+
+from ex_vnpy.sensor.pivot_store import BOTTOM_PIVOTS, PIVOT_COLUMNS, TOP_PIVOTS
+
+
+logger = logging.getLogger("BatchCentrumDetector")
+
+# 每个标的的探测状态，跟CentrumSensor的属性同名，pivot的index为时间维度的下标，-1表示None
+INDEX_STATES = ['last_pivot_index', 'last_candidate_pivot_index', 'last_backup_pivot_index']
+INT_STATES = INDEX_STATES + ['last_candidate_pivot_bars', 'last_backup_pivot_bars',
+                             'last_pivot_type', 'last_candidate_pivot_type', 'last_backup_pivot_type']
+FLOAT_STATES = ['last_pivot_high', 'last_pivot_low', 'last_candidate_pivot_high', 'last_candidate_pivot_low',
+                'last_backup_pivot_high', 'last_backup_pivot_low',
+                'last_bar_high', 'last_bar_low', 'last_before_bar_high', 'last_before_bar_low']
+# 最近的顶分型(1/2)、底分型(-1/-2)所在的下标，-1表示没有，随检查点一起回滚
+PIVOT_STATES = ['last_top_index', 'last_bottom_index']
+
+
+class BatchCentrumSensor(object):
+    """
+    多标的的中枢探测，跟CentrumSensor的探测逻辑完全一致，按 (标的 × 时间) 的二维数组存放pivot数据
+    1. 每个标的的探测状态是一列向量中的一个元素，update_bars一次调用推进所有标的的状态机，分支以掩码表示
+    2. 每根新的bar探测之前，对这些标的做检查点（状态向量，以及这一步可能改写的已有pivot），
+       同一时间的bar再次输入时为盘中更新，先回滚再重新探测
+    3. 查询按标的进行，last_top_date/last_bottom_date/last_pivot_price跟SourceManager的结果一致，
+       最近的顶底分型的下标记在状态向量中，查询为O(1)
+    跟CentrumSensor的区别：没有紧凑存储，不支持裁剪历史
+    """
+
+    def __init__(self, valid_bars: int = 5, enable_contain: bool = True, ptype: str = 'HL', capacity: int = 256):
+        """Constructor"""
+        self.name = 'BatchCentrum'
+        self.valid_bars: int = valid_bars
+        self.enable_contain: bool = enable_contain
+        self.ptype: str = ptype
+        self.tz: Any = None
+
+        self.symbols: List[str] = []
+        self.rows: Dict[str, int] = {}
+        self.capacity: int = max(capacity, 2)     # 时间维度的容量
+        self.row_capacity: int = 16               # 标的维度的容量
+        self.sizes: np.ndarray = np.zeros(self.row_capacity, dtype=np.int64)
+
+        self.dates: np.ndarray = np.zeros((self.row_capacity, self.capacity), dtype=np.int64)
+        self.arrays: Dict[str, np.ndarray] = {
+            name: np.zeros((self.row_capacity, self.capacity), dtype=np.float64 if name in ['high', 'low'] else np.int64)
+            for name in PIVOT_COLUMNS
+        }
+        self.state: Dict[str, np.ndarray] = self.new_state(self.row_capacity)
+
+        # 检查点：状态向量，以及前一根bar、last/candidate/backup pivot所在的行
+        self.backup_state: Dict[str, np.ndarray] = self.new_state(self.row_capacity)
+        self.backup_positions: np.ndarray = np.full((self.row_capacity, 4), -1, dtype=np.int64)
+        self.backup_cells: Dict[str, np.ndarray] = {name: np.zeros((self.row_capacity, 4), dtype=arr.dtype)
+                                                    for name, arr in self.arrays.items()}
+
+    @staticmethod
+    def new_state(size: int) -> Dict[str, np.ndarray]:
+        state = {name: np.zeros(size, dtype=np.int64) for name in INT_STATES}
+        state.update({name: np.full(size, -1, dtype=np.int64) for name in PIVOT_STATES})
+        for name in INDEX_STATES:
+            state[name][:] = -1
+        state.update({name: np.zeros(size, dtype=np.float64) for name in FLOAT_STATES})
+        return state
+
+    def __len__(self) -> int:
+        return len(self.symbols)
+
+    def __contains__(self, vt_symbol: str) -> bool:
+        return vt_symbol in self.rows
+
+    def row_of(self, vt_symbol: str) -> int:
+        """
+        标的所在的行，首次出现时新增一行
+        """
+        row = self.rows.get(vt_symbol)
+        if row is None:
+            row = len(self.symbols)
+            if row >= self.row_capacity:
+                self._resize(self.row_capacity * 2, self.capacity)
+            self.symbols.append(vt_symbol)
+            self.rows[vt_symbol] = row
+        return row
+
+    @staticmethod
+    def _resized(arr: np.ndarray, shape: tuple, fill: Any = 0) -> np.ndarray:
+        new_arr = np.full(shape, fill, dtype=arr.dtype)
+        new_arr[tuple(slice(0, n) for n in arr.shape)] = arr
+        return new_arr
+
+    def _resize(self, row_capacity: int, capacity: int):
+        shape = (row_capacity, capacity)
+        self.dates = self._resized(self.dates, shape)
+        self.arrays = {name: self._resized(arr, shape) for name, arr in self.arrays.items()}
+        if row_capacity > self.row_capacity:
+            self.sizes = self._resized(self.sizes, (row_capacity,))
+            for states in (self.state, self.backup_state):
+                extra = self.new_state(row_capacity - self.row_capacity)
+                for name in states:
+                    states[name] = np.concatenate([states[name], extra[name]])
+            self.backup_positions = self._resized(self.backup_positions, (row_capacity, 4), -1)
+            self.backup_cells = {name: self._resized(arr, (row_capacity, 4)) for name, arr in self.backup_cells.items()}
+        self.row_capacity = row_capacity
+        self.capacity = capacity
+
+    def _reserve(self, capacity: int):
+        if capacity <= self.capacity:
+            return
+
+        new_capacity = self.capacity
+        while new_capacity < capacity:
+            new_capacity *= 2
+        self._resize(self.row_capacity, new_capacity)
+
+    def bar_range(self, highs: np.ndarray, lows: np.ndarray, opens: np.ndarray = None, closes: np.ndarray = None):
+        """
+        参与探测的高低点：HL为最高、最低价，OC为开盘、收盘价中的高低
+        """
+        if self.ptype == "HL":
+            return np.asarray(highs, dtype=np.float64), np.asarray(lows, dtype=np.float64)
+        opens = np.asarray(opens, dtype=np.float64)
+        closes = np.asarray(closes, dtype=np.float64)
+        return np.maximum(opens, closes), np.minimum(opens, closes)
+
+    def init_sensor(self, symbols: Sequence[str], dates: np.ndarray, highs: np.ndarray, lows: np.ndarray, sizes: np.ndarray,
+                    opens: np.ndarray = None, closes: np.ndarray = None, tz: Any = None):
+        """
+        用 (标的 × 时间) 的历史数据初始化一批新的标的，按时间逐列推进，每一步同时探测所有标的
+        :param dates: int64(ns)，第i个标的的有效数据为前sizes[i]列
+        :param tz: dates的时区
+        """
+        if self.tz is None:
+            self.tz = tz
+        sizes = np.asarray(sizes, dtype=np.int64)
+        highs, lows = self.bar_range(highs, lows, opens, closes)
+        rows = np.array([self.row_of(vt_symbol) for vt_symbol in symbols], dtype=np.int64)
+        for t in range(int(sizes.max()) if len(sizes) > 0 else 0):
+            active = np.flatnonzero(sizes > t)
+            # 只有最后一根bar之前需要检查点
+            self.advance(rows[active], dates[active, t], highs[active, t], lows[active, t], backup=sizes[active] == t + 1)
+
+    def update_bars(self, symbols: Sequence[str], dates: Sequence[Any], highs: np.ndarray, lows: np.ndarray,
+                    opens: np.ndarray = None, closes: np.ndarray = None):
+        """
+        所有标的同一时刻的bar（每个标的最多一根），跟最后一根bar时间相同的为盘中更新，否则为新的bar
+        :param dates: bar的时间，int64(ns)或者时间对象
+        """
+        if len(symbols) == 0:
+            return
+
+        dates = np.asarray(dates)
+        if dates.dtype != np.int64:
+            stamps = [pd.Timestamp(d) for d in dates]
+            if self.tz is None:
+                self.tz = stamps[0].tz
+            dates = np.array([ts.value for ts in stamps], dtype=np.int64)
+        highs, lows = self.bar_range(highs, lows, opens, closes)
+        rows = np.array([self.row_of(vt_symbol) for vt_symbol in symbols], dtype=np.int64)
+        self.advance(rows, dates, highs, lows)
+
+    def advance(self, rows: np.ndarray, dates: np.ndarray, highs: np.ndarray, lows: np.ndarray, backup: np.ndarray = None):
+        """
+        :param rows: 标的所在的行，不重复
+        :param dates: int64(ns)
+        :param highs: 参与探测的高点（见bar_range）
+        :param lows: 参与探测的低点
+        :param backup: 新的bar中需要做检查点的标的，默认为全部
+        """
+
+        sizes = self.sizes[rows]
+        last_dates = self.dates[rows, np.maximum(sizes - 1, 0)]
+        revise = (sizes > 0) & (last_dates == dates)
+        stale = (sizes > 0) & (last_dates > dates)
+        if stale.any():
+            logger.warning(f"[BC] bars earlier than the last one are ignored: {[self.symbols[r] for r in rows[stale]]}")
+        opened = ~revise & ~stale
+
+        # 第一根bar不探测，只作为之后探测的起点（pivot数据为0）
+        first = (opened & (sizes == 0)) | (revise & (sizes == 1))
+        if first.any():
+            rows_f = rows[first]
+            for arr in self.arrays.values():
+                arr[rows_f, 0] = 0
+            self.dates[rows_f, 0] = dates[first]
+            self.sizes[rows_f] = 1
+            for name in PIVOT_STATES:
+                self.state[name][rows_f] = -1
+            self.state['last_bar_high'][rows_f] = highs[first]
+            self.state['last_bar_low'][rows_f] = lows[first]
+
+        step_open = opened & (sizes >= 1)
+        step_revise = revise & (sizes >= 2)
+        if step_revise.any():
+            self.rollback(rows[step_revise])
+        if step_open.any():
+            rows_o = rows[step_open]
+            self._reserve(int(sizes[step_open].max()) + 1)
+            keep = step_open if backup is None else step_open & backup
+            if keep.any():
+                self.checkpoint(rows[keep], sizes[keep])
+            self.dates[rows_o, sizes[step_open]] = dates[step_open]
+            self.sizes[rows_o] += 1
+
+        step = step_open | step_revise
+        if step.any():
+            rows_s = rows[step]
+            self.detect_pivots(rows_s, self.sizes[rows_s] - 1, highs[step], lows[step])
+
+    def checkpoint(self, rows: np.ndarray, t: np.ndarray):
+        """
+        探测第t根bar之前的检查点，这一步可能改写的已有行：前一根bar，以及last/candidate/backup pivot所在的行
+        """
+        for name, arr in self.state.items():
+            self.backup_state[name][rows] = arr[rows]
+        positions = np.stack([t - 1] + [self.state[name][rows] for name in INDEX_STATES], axis=1)
+        self.backup_positions[rows] = positions
+        valid = positions >= 0
+        r = np.broadcast_to(rows[:, None], positions.shape)
+        for name, arr in self.arrays.items():
+            self.backup_cells[name][rows] = np.where(valid, arr[r, np.maximum(positions, 0)], 0)
+
+    def rollback(self, rows: np.ndarray):
+        """
+        回滚到最后一个检查点，最后一行由随后的探测整行重写
+        """
+        for name, arr in self.state.items():
+            arr[rows] = self.backup_state[name][rows]
+        positions = self.backup_positions[rows]
+        valid = positions >= 0
+        r = np.broadcast_to(rows[:, None], positions.shape)[valid]
+        for name, arr in self.arrays.items():
+            arr[r, positions[valid]] = self.backup_cells[name][rows][valid]
+
+    def _set_pivot(self, st: Dict[str, np.ndarray], rows: np.ndarray, mask: np.ndarray, positions: np.ndarray, pivot: np.ndarray,
+                   high: np.ndarray = None, low: np.ndarray = None):
+        """
+        写入pivot，同时更新最近的顶底分型下标：顶底分型被取消资格(1/2 -> 3)的同一步里，
+        总会在更靠后的位置写入新的同类分型，因此只需要在写入时取较大的下标
+        """
+        if not mask.any():
+            return
+        r, p, values = rows[mask], positions[mask], pivot[mask]
+        self.arrays['pivot'][r, p] = values
+        if high is not None:
+            self.arrays['high'][r, p] = high[mask]
+            self.arrays['low'][r, p] = low[mask]
+        for name, codes in (('last_top_index', TOP_PIVOTS), ('last_bottom_index', BOTTOM_PIVOTS)):
+            hit = np.isin(values, codes)
+            if hit.any():
+                idx = np.flatnonzero(mask)[hit]
+                st[name][idx] = np.maximum(st[name][idx], p[hit])
+
+    @staticmethod
+    def _update_candidate(st: Dict[str, np.ndarray], mask: np.ndarray, index: np.ndarray, hi: np.ndarray, lo: np.ndarray, tp: np.ndarray):
+        st['last_candidate_pivot_index'][mask] = index[mask]
+        st['last_candidate_pivot_high'][mask] = hi[mask]
+        st['last_candidate_pivot_low'][mask] = lo[mask]
+        st['last_candidate_pivot_type'][mask] = tp[mask]
+        st['last_candidate_pivot_bars'][mask] = 1
+
+    def detect_pivots(self, rows: np.ndarray, t: np.ndarray, high: np.ndarray, low: np.ndarray):
+        """
+        对rows中的每个标的探测第t根bar，等价于对每个标的调用CentrumSensor.detect_next_pivot，
+        各个分支按相同的顺序以掩码执行
+        """
+        st = {name: arr[rows] for name, arr in self.state.items()}
+        y = t - 1
+        last_high, last_low = st['last_bar_high'], st['last_bar_low']
+        before_high, before_low = st['last_before_bar_high'], st['last_before_bar_low']
+
+        # 初始化最新一行
+        for name, values in (('pivot', 0), ('high', high), ('low', low), ('flag', 0)):
+            self.arrays[name][rows, t] = values
+
+        # 处理包含关系
+        outer = (high >= last_high) & (low <= last_low)
+        inner = (high <= last_high) & (low >= last_low)
+        contain = (outer | inner) if self.enable_contain else np.zeros(len(rows), dtype=bool)
+        rising = before_high < last_high
+        current_high = np.where(contain, np.where(rising, np.maximum(high, last_high), np.minimum(high, last_high)), high)
+        current_low = np.where(contain, np.where(rising, np.maximum(low, last_low), np.minimum(low, last_low)), low)
+        if contain.any():
+            r, p, q = rows[contain], t[contain], y[contain]
+            self.arrays['high'][r, p] = current_high[contain]
+            self.arrays['low'][r, p] = current_low[contain]
+            self.arrays['flag'][r, q] += np.where(outer[contain], 0x0001, 0x0010)
+            self.arrays['flag'][r, p] += np.where(outer[contain], 0x1000, 0x0100)
+
+        free = ~contain
+        st['last_candidate_pivot_bars'][free] += 1
+        st['last_backup_pivot_bars'][free & (st['last_backup_pivot_index'] >= 0)] += 1
+
+        # 确定新的candidate pivot
+        known = ~((before_high == 0.0) & (before_low == 0.0))
+        top = free & known & (last_high > current_high) & (last_high > before_high) & (last_low >= current_low) & (last_low >= before_low)
+        bottom = free & known & (last_high <= current_high) & (last_high <= before_high) & (last_low < current_low) & (last_low < before_low)
+        new_type = np.where(top, 1, np.where(bottom, -1, 0))
+        found = new_type != 0
+
+        # 初始化
+        init = found & (st['last_candidate_pivot_index'] < 0)
+        self._update_candidate(st, init, y, last_high, last_low, new_type)
+        self._set_pivot(st, rows, init, st['last_candidate_pivot_index'], st['last_candidate_pivot_type'] * 3,
+                        st['last_candidate_pivot_high'], st['last_candidate_pivot_low'])
+
+        # 连续相同的分型，选择顶分型的高位、底分型的低位
+        same = found & (st['last_candidate_pivot_type'] == new_type)
+        better = same & (((new_type == 1) & (last_high > st['last_candidate_pivot_high'])) |
+                         ((new_type == -1) & (last_low < st['last_candidate_pivot_low'])))
+        self._set_pivot(st, rows, better, st['last_candidate_pivot_index'], st['last_candidate_pivot_type'] * 3)
+        self._update_candidate(st, better, y, last_high, last_low, new_type)
+        self._set_pivot(st, rows, better, st['last_candidate_pivot_index'], st['last_candidate_pivot_type'] * 2,
+                        st['last_candidate_pivot_high'], st['last_candidate_pivot_low'])
+
+        use_backup = better & (st['last_backup_pivot_index'] >= 0) & (st['last_backup_pivot_bars'] >= self.valid_bars)
+        self._set_pivot(st, rows, use_backup, st['last_pivot_index'], st['last_pivot_type'] * 3)
+        for name in ['index', 'type', 'high', 'low']:
+            st[f'last_pivot_{name}'][use_backup] = st[f'last_backup_pivot_{name}'][use_backup]
+        st['last_backup_pivot_index'][use_backup] = -1
+        st['last_backup_pivot_bars'][use_backup] = 1
+        self._set_pivot(st, rows, use_backup, st['last_pivot_index'], st['last_backup_pivot_type'],
+                        st['last_backup_pivot_high'], st['last_backup_pivot_low'])
+
+        # 当前是IgnorePivot，仅做记录，5/-5
+        self._set_pivot(st, rows, same & ~better, y, new_type * 5, last_high, last_low)
+
+        # 连续不同的两个分型，需要看是否符合bar的数量要求
+        opposite = found & ~same & (st['last_candidate_pivot_type'] + new_type == 0)
+        confirm = opposite & (st['last_candidate_pivot_bars'] >= self.valid_bars)
+        for name in ['index', 'type', 'high', 'low']:
+            st[f'last_pivot_{name}'][confirm] = st[f'last_candidate_pivot_{name}'][confirm]
+        st['last_backup_pivot_index'][confirm] = -1
+        st['last_backup_pivot_bars'][confirm] = 1
+        self._set_pivot(st, rows, confirm, st['last_pivot_index'], st['last_pivot_type'], st['last_pivot_high'], st['last_pivot_low'])
+        self._update_candidate(st, confirm, y, last_high, last_low, new_type)
+        self._set_pivot(st, rows, confirm, st['last_candidate_pivot_index'], st['last_candidate_pivot_type'] * 2,
+                        st['last_candidate_pivot_high'], st['last_candidate_pivot_low'])
+        self._set_pivot(st, rows, opposite & ~confirm, y, new_type * 5, last_high, last_low)
+
+        # 候选分型尚未成立，新的分型跟上一个确定分型相同，却有更低的低点或者更高的高点，则记为backup pivot, 4/-4
+        backup = found & ~same & ~opposite & (st['last_pivot_type'] == new_type) & (st['last_candidate_pivot_bars'] < self.valid_bars)
+        backup &= ((new_type == 1) & (last_high > st['last_pivot_high'])) | ((new_type == -1) & (last_low < st['last_pivot_low']))
+        st['last_backup_pivot_index'][backup] = y[backup]
+        st['last_backup_pivot_high'][backup] = last_high[backup]
+        st['last_backup_pivot_low'][backup] = last_low[backup]
+        st['last_backup_pivot_type'][backup] = new_type[backup]
+        st['last_backup_pivot_bars'][backup] = 1
+        self._set_pivot(st, rows, backup, y, new_type * 4, last_high, last_low)
+
+        st['last_before_bar_high'] = np.where(free, last_high, before_high)
+        st['last_before_bar_low'] = np.where(free, last_low, before_low)
+        st['last_bar_high'] = current_high
+        st['last_bar_low'] = current_low
+        for name, arr in self.state.items():
+            arr[rows] = st[name]
+
+    def timestamp(self, row: int, pos: int) -> pd.Timestamp:
+        ts = pd.Timestamp(int(self.dates[row, pos]))
+        return ts.tz_localize('UTC').tz_convert(self.tz) if self.tz is not None else ts
+
+    def last_positions(self, pivot_type: str) -> np.ndarray:
+        """
+        所有标的（按symbols顺序）最近的顶(top)/底(bottom)分型的下标，没有时为-1
+        """
+        name = 'last_top_index' if pivot_type == "top" else 'last_bottom_index'
+        return self.state[name][:len(self.symbols)].copy()
+
+    def last_position(self, vt_symbol: str, pivot_type: str) -> int:
+        name = 'last_top_index' if pivot_type == "top" else 'last_bottom_index'
+        return int(self.state[name][self.rows[vt_symbol]])
+
+    def last_pivot_date(self, vt_symbol: str, pivot_type: str) -> pd.Timestamp:
+        """
+        最近的顶(top)/底(bottom)分型的日期，包括candidate，跟CentrumSensor.last_top_date/last_bottom_date一致
+        """
+        if vt_symbol not in self.rows:
+            return None
+        pos = self.last_position(vt_symbol, pivot_type)
+        return self.timestamp(self.rows[vt_symbol], pos) if pos >= 0 else None
+
+    def last_top_date(self, vt_symbol: str) -> pd.Timestamp:
+        return self.last_pivot_date(vt_symbol, "top")
+
+    def last_bottom_date(self, vt_symbol: str) -> pd.Timestamp:
+        return self.last_pivot_date(vt_symbol, "bottom")
+
+    def last_pivot_price(self, vt_symbol: str, pivot_type: str, price_type: str = 'low') -> float:
+        if vt_symbol not in self.rows:
+            return None
+        pos = self.last_position(vt_symbol, pivot_type)
+        return self.arrays[price_type][self.rows[vt_symbol], pos] if pos >= 0 else None
+
+    def get_state(self, vt_symbol: str) -> Dict[str, Any]:
+        """
+        单个标的的探测状态，跟CentrumSensor的同名属性一致（pivot的index为日期）
+        """
+        row = self.rows[vt_symbol]
+        state = {name: self.state[name][row] for name in INT_STATES + FLOAT_STATES}
+        for name in INDEX_STATES:
+            state[name] = self.timestamp(row, state[name]) if state[name] >= 0 else None
+        return state
+
+    def pivot_df(self, vt_symbol: str) -> DataFrame:
+        """
+        单个标的的pivot数据，跟CentrumSensor.pivot_df（非紧凑存储）一致
+        """
+        row = self.rows[vt_symbol]
+        size = self.sizes[row]
+        index = pd.DatetimeIndex(self.dates[row, :size].view('M8[ns]'), name='datetime')
+        if self.tz is not None:
+            index = index.tz_localize('UTC').tz_convert(self.tz)
+        data = {'ptype': np.full(size, self.ptype, dtype=object)}
+        data.update({name: self.arrays[name][row, :size] for name in PIVOT_COLUMNS})
+        return DataFrame(data=data, index=index)
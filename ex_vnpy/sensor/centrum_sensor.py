@@ -1,14 +1,44 @@
 import logging
 from datetime import datetime, timedelta
-from typing import Any, Dict
+from typing import Any
 
 import numpy as np
-from pandas import DataFrame, Series
+import pandas as pd
+from pandas import DataFrame
 from vnpy.trader.constant import Interval
 
+from ex_vnpy.sensor.centrum_zone import CentrumZone, CentrumZoneTracker
+from ex_vnpy.sensor.pivot_store import PivotStore
+
 logger = logging.getLogger("CentrumDetector")
 
 
+class SensorState(object):
+    """
+    CentrumSensor探测状态的检查点，字段布局固定（__slots__），备份、回滚只复制这些标量
+    pivot数据的改动由PivotStore的undo log回滚；inited是生命周期标志，不属于探测状态，不在检查点中
+    """
+    __slots__ = (
+        'last_pivot_index', 'last_candidate_pivot_index', 'last_backup_pivot_index',
+        'last_candidate_pivot_bars', 'last_backup_pivot_bars',
+        'last_pivot_high', 'last_pivot_low', 'last_pivot_type',
+        'last_candidate_pivot_high', 'last_candidate_pivot_low', 'last_candidate_pivot_type',
+        'last_backup_pivot_high', 'last_backup_pivot_low', 'last_backup_pivot_type',
+        'last_bar_high', 'last_bar_low', 'last_before_bar_high', 'last_before_bar_low',
+    )
+
+    @classmethod
+    def capture(cls, sensor: 'CentrumSensor') -> 'SensorState':
+        state = cls()
+        for name in cls.__slots__:
+            setattr(state, name, getattr(sensor, name))
+        return state
+
+    def restore(self, sensor: 'CentrumSensor'):
+        for name in self.__slots__:
+            setattr(sensor, name, getattr(self, name))
+
+
 class CentrumSensor(object):
     """
     缠论中枢探测
@@ -26,7 +56,7 @@ class CentrumSensor(object):
 
     """
 
-    def __init__(self, valid_bars: int = 5, enable_contain: bool = True, ptype: str = 'HL', setting=None):
+    def __init__(self, valid_bars: int = 5, enable_contain: bool = True, ptype: str = 'HL', setting=None, compact: bool = False):
         super().__init__()
         self.name = 'Centrum'
         self.valid_bars: int = valid_bars  # 分型有效间距，笔
@@ -63,14 +93,20 @@ class CentrumSensor(object):
         # 3/-3 表示历史的candidate pivot 顶底分型
         # 4/-4 表示backup pivot 顶底分型
         # 5/-5 表示ignore pivot 顶底分型
-        self.pivot_df: DataFrame = None
+        # 存放在PivotStore的数组中，pivot_df为按需构建的DataFrame视图
+        self.pivot_store: PivotStore = None
+        # 由确认的pivot增量维护的中枢
+        self.zone_tracker: CentrumZoneTracker = CentrumZoneTracker()
 
         # 指定当前的分型类型，HL: 高点低点分型，OC: 开盘收盘分型
         self.ptype = ptype
+        # 紧凑存储：pivot_df不再逐行保存ptype，pivot为int8、flag为int16
+        self.compact: bool = compact
         self.inited: bool = False
 
         self.source_df: DataFrame = None
-        self.backup_point: Dict = {}        # 用来备份当前的所有状态
+        self.backup_point: SensorState = None       # 探测最后一根bar之前的状态
+        self.batch: bool = False        # detect_history探测过程中，pivot的index为存储中的下标
 
     def init_sensor(self, source_df: DataFrame) -> bool:
         if source_df is None or len(source_df) < 2:
@@ -79,15 +115,7 @@ class CentrumSensor(object):
             return False
 
         self.source_df = source_df
-        column_data_types: dict = {
-            'ptype': str,
-            'pivot': int,
-            'high': float,
-            'low': float,
-            'flag': int
-        }
-        self.pivot_df = DataFrame(data=0, columns=list(column_data_types.keys()), index=source_df.index).astype(column_data_types)
-        self.pivot_df['ptype'] = self.ptype
+        self.pivot_store = PivotStore.from_index(source_df.index, ptype=self.ptype, compact=self.compact)
         if self.ptype == "HL":
             self.last_bar_high = source_df.high.iloc[0]
             self.last_bar_low = source_df.low.iloc[0]
@@ -97,46 +125,129 @@ class CentrumSensor(object):
             self.last_bar_high = max(last_s["open"], last_s["close"])
             self.last_bar_low = min(last_s["open"], last_s["close"])
 
-        for i in range(1, len(source_df)):      # 从第二个bar开始，尤其是处理周线数据时，做好初始化工作
-            self.detect_next_pivot(source_df.iloc[:i+1])
-
+        # 从第二个bar开始，尤其是处理周线数据时，做好初始化工作
+        # 除最后一根以外的bar在数组上一次性探测，最后一根bar可能还会被盘中更新，先备份，再按增量的方式探测
+        self.detect_history(source_df)
+        # 先标记为已初始化，再备份：盘中更新回滚到这个备份点时不能回到未初始化的状态
         self.inited = True
+        self.backup_point = self.backup_current_stats()
+        self.detect_next_pivot(source_df)
+        self.zone_tracker.load(self.pivot_store.confirmed_pivots())
+        self.follow_last_pivot()
         return True
 
-    def update_bar(self, source_df: DataFrame):
+    def detect_history(self, source_df: DataFrame):
+        """
+        对第2根到倒数第2根bar一次性运行探测的状态机：输入为high/low（OC时为开盘、收盘的高低）数组，
+        探测过程中pivot的位置用存储中的下标，最后把状态中的下标换回日期
+        结果跟逐根bar调用detect_next_pivot完全一致。只在新建的探测器上运行，没有需要沿用的状态
+        """
+        n = len(source_df)
+        if self.ptype == "HL":
+            highs = source_df['high'].to_numpy(dtype=float)
+            lows = source_df['low'].to_numpy(dtype=float)
+        else:
+            opens = source_df['open'].to_numpy(dtype=float)
+            closes = source_df['close'].to_numpy(dtype=float)
+            highs, lows = np.maximum(opens, closes), np.minimum(opens, closes)
+
+        # 跟init_pivot_row一致：探测过的bar先以自己的high/low初始化，第一根和最后一根bar为0
+        arrays = {
+            'pivot': np.zeros(n, dtype=np.int64),
+            'high': np.zeros(n, dtype=np.float64),
+            'low': np.zeros(n, dtype=np.float64),
+            'flag': np.zeros(n, dtype=np.int64),
+        }
+        arrays['high'][1:n - 1] = highs[1:n - 1]
+        arrays['low'][1:n - 1] = lows[1:n - 1]
+        self.pivot_store.load(arrays)
+
+        self.batch = True
+        try:
+            high_values, low_values = highs.tolist(), lows.tolist()
+            for i in range(1, n - 1):
+                self.detect_pivot(i - 1, i, high_values[i], low_values[i])
+        finally:
+            self.batch = False
+
+        for name in ('last_pivot_index', 'last_candidate_pivot_index', 'last_backup_pivot_index'):
+            pos = getattr(self, name)
+            if pos is not None:
+                setattr(self, name, source_df.index[pos])
+
+    @property
+    def pivot_df(self) -> DataFrame:
+        """
+        pivot数据的DataFrame（副本）
+        """
+        return self.pivot_store.to_dataframe() if self.pivot_store is not None else None
+
+    def update_bar(self, source_df: DataFrame, opened: bool = None):
+        """
+        :param opened: 最后一根bar是新的bar(True)，还是最后一根bar的盘中更新(False)，None时按长度判断
+        盘中更新时先回滚到探测这根bar之前的状态，再重新探测，只重做最后一步
+        """
         if not self.inited:
             self.init_sensor(source_df)
             return
 
-        source_len = len(source_df)
-        pivot_len = len(self.pivot_df)
-        if pivot_len < source_len:
+        if opened is None:
+            opened = len(self.pivot_store) < len(source_df)
+        self.update_last_bar(source_df.index[-1], source_df.iloc[-1], opened)
+
+    def update_last_bar(self, index: Any, bar: Any, opened: bool = None):
+        """
+        已初始化之后，只用最后一根bar的数据更新，不需要整个DataFrame，每根bar均摊O(1)
+        :param bar: 最后一根bar，按列名读取high/low（OC为open/close），可以是DataFrame的行，或者BarStore.view(-1)
+        :param opened: 新的bar(True)，还是最后一根bar的盘中更新(False)，None时按日期判断
+        """
+        if opened is None:
+            opened = pd.Timestamp(index).value > self.pivot_store.dates[len(self.pivot_store) - 1]
+        if opened:
             # for x in range(pivot_len, source_len):
             #     self.pivot_df.loc[source_df.index[x]] = Series(data=[self.ptype, 0, 0.0, 0.0, 0], index=['ptype', 'pivot', 'high', 'low', 'flag'])
             self.backup_point = self.backup_current_stats()
-            self.detect_next_pivot(source_df)
         else:
             self.restore_to_last_backup_point(self.backup_point)
-            self.detect_next_pivot(source_df)
+        self.detect_last_bar(index, bar)
+        self.follow_last_pivot()
+
+    def follow_last_pivot(self):
+        """
+        中枢跟踪对齐到最后确认的pivot，只在确认的pivot变动时才重新计算
+        """
+        price = self.last_pivot_high if self.last_pivot_type == 1 else self.last_pivot_low
+        self.zone_tracker.follow(self.last_pivot_index, self.last_pivot_type, price)
 
     def detect_next_pivot(self, source_df: DataFrame):
-        last_high = self.last_bar_high
-        last_low = self.last_bar_low
+        self.detect_last_bar(source_df.index[-1], source_df.iloc[-1])
 
-        last_s = source_df.iloc[-1]
+    def detect_last_bar(self, today_index: Any, bar: Any):
+        """
+        探测最新一根bar，前一根bar的日期取pivot数据中的前一行（跟数据源逐行对应）
+        """
         if self.ptype == "HL":
-            high = current_high = last_s["high"]
-            low = current_low = last_s["low"]
+            high = bar["high"]
+            low = bar["low"]
         else:
-            high = current_high = max(last_s["open"], last_s["close"])
-            low = current_low = min(last_s["open"], last_s["close"])
-
-        yesterday_index = source_df.index[-2] if len(source_df) > 1 else source_df.index[-1]
-        today_index = source_df.index[-1]
-        is_contain = False
+            high = max(bar["open"], bar["close"])
+            low = min(bar["open"], bar["close"])
 
         # 初始化pivot_df最新一行
-        self.pivot_df.loc[today_index] = Series(data=[self.ptype, 0, high, low, 0], index=['ptype', 'pivot', 'high', 'low', 'flag'])
+        pos = self.init_pivot_row(today_index, high, low)
+        yesterday_index = self.pivot_store.timestamp(pos - 1) if pos > 0 else today_index
+        self.detect_pivot(yesterday_index, today_index, high, low)
+
+    def detect_pivot(self, yesterday_index: Any, today_index: Any, high: float, low: float):
+        """
+        探测的状态机：最新一根bar(today_index)的high/low跟之前的有效bar比较，处理包含关系、更新各类pivot
+        index为pivot_df的日期，detect_history中为存储中的下标
+        """
+        last_high = self.last_bar_high
+        last_low = self.last_bar_low
+        current_high = high
+        current_low = low
+        is_contain = False
 
         # TODO: 包含关系需要考虑实体柱的位置，如果后一个实体柱完全处于前一个的影线区域，则不算做包含？ 2018-11-27   603501
         # 处理包含关系
@@ -158,13 +269,13 @@ class CentrumSensor(object):
             # 0x0010 表示当前bar包含后一个bar，跟前一个bar没有包含关系。比如 600111， 2022.10.10
             # 0x0101 表示当前bar被前一个bar包含，同时又被后一个bar包含。比如 600111， 2022.10.11
             # 0x1000 表示当前bar包含前一个bar，跟后一个bar没有包含关系。比如 600111， 2022.10.12
-            self.pivot_df.loc[today_index, ['high', 'low']] = [current_high, current_low]
+            self.set_bar(today_index, current_high, current_low)
             if high >= last_high and low <= last_low:
-                self.pivot_df.loc[yesterday_index, 'flag'] += 0x0001
-                self.pivot_df.loc[today_index, 'flag'] += 0x1000
+                self.add_flag(yesterday_index, 0x0001)
+                self.add_flag(today_index, 0x1000)
             else:
-                self.pivot_df.loc[yesterday_index, 'flag'] += 0x0010
-                self.pivot_df.loc[today_index, 'flag'] += 0x0100
+                self.add_flag(yesterday_index, 0x0010)
+                self.add_flag(today_index, 0x0100)
 
         else:
             # 更新candidate pivot到最新的bar的计数
@@ -189,28 +300,28 @@ class CentrumSensor(object):
                 if self.last_candidate_pivot_index is None:
                     self.update_candidate_pivot(yesterday_index, last_high, last_low, new_candidate_pivot_type)
                     # self.pivot_df.loc[self.last_candidate_pivot_index] = Series(data=[self.last_candidate_pivot_type * 3, self.last_candidate_pivot_high, self.last_candidate_pivot_low, 0], index=['pivot', 'high', 'low', 'flag'])
-                    self.pivot_df.loc[self.last_candidate_pivot_index, ['pivot', 'high', 'low']] = [self.last_candidate_pivot_type * 3, self.last_candidate_pivot_high, self.last_candidate_pivot_low]
+                    self.set_pivot(self.last_candidate_pivot_index, self.last_candidate_pivot_type * 3, self.last_candidate_pivot_high, self.last_candidate_pivot_low)
 
                 # 连续相同的相同分型，选择顶分型的高位、底分型的低位
                 if self.last_candidate_pivot_type == new_candidate_pivot_type:
                     if (new_candidate_pivot_type == 1 and last_high > self.last_candidate_pivot_high) or (
                             new_candidate_pivot_type == -1 and last_low < self.last_candidate_pivot_low):
-                        self.pivot_df.loc[self.last_candidate_pivot_index, 'pivot'] = self.last_candidate_pivot_type * 3
+                        self.set_pivot(self.last_candidate_pivot_index, self.last_candidate_pivot_type * 3)
                         self.update_candidate_pivot(yesterday_index, last_high, last_low, new_candidate_pivot_type)
                         # self.pivot_df.loc[self.last_candidate_pivot_index] = Series(data=[self.last_candidate_pivot_type * 2, self.last_candidate_pivot_high, self.last_candidate_pivot_low, 0], index=['pivot', 'high', 'low', 'flag'])
-                        self.pivot_df.loc[self.last_candidate_pivot_index, ['pivot', 'high', 'low']] = [self.last_candidate_pivot_type * 2, self.last_candidate_pivot_high, self.last_candidate_pivot_low]
+                        self.set_pivot(self.last_candidate_pivot_index, self.last_candidate_pivot_type * 2, self.last_candidate_pivot_high, self.last_candidate_pivot_low)
 
                         if self.last_backup_pivot_index is not None and self.last_backup_pivot_bars >= self.valid_bars:
                             # if self.pLastBackupPivotType == self.pLastPivotType
                             # self.pivot_df.loc[self.last_pivot_index] = Series(data=[0, None, None], index=['pivot', 'high', 'low'])
-                            self.pivot_df.loc[self.last_pivot_index, 'pivot'] = self.last_pivot_type * 3
+                            self.set_pivot(self.last_pivot_index, self.last_pivot_type * 3)
                             self.reset_last_pivot_using_backup()
                             # self.pivot_df.loc[self.last_pivot_index] = Series(data=[self.last_backup_pivot_type, self.last_backup_pivot_high, self.last_backup_pivot_low, 0], index=['pivot', 'high', 'low', 'flag'])
-                            self.pivot_df.loc[self.last_pivot_index, ['pivot', 'high', 'low']] = [self.last_backup_pivot_type, self.last_backup_pivot_high, self.last_backup_pivot_low]
+                            self.set_pivot(self.last_pivot_index, self.last_backup_pivot_type, self.last_backup_pivot_high, self.last_backup_pivot_low)
                     else:
                         # 当前是IgnorePivot，仅做记录，5/-5
                         # self.pivot_df.loc[yesterday_index] = Series(data=[new_candidate_pivot_type * 5, last_high, last_low, 0], index=['pivot', 'high', 'low', 'flag'])
-                        self.pivot_df.loc[yesterday_index,  ['pivot', 'high', 'low']] = [new_candidate_pivot_type * 5, last_high, last_low]
+                        self.set_pivot(yesterday_index, new_candidate_pivot_type * 5, last_high, last_low)
 
                 # 连续不同的两个分型，需要看是否符合bar的数量要求
                 elif self.last_candidate_pivot_type + new_candidate_pivot_type == 0:
@@ -219,15 +330,15 @@ class CentrumSensor(object):
                         # 更新新的CandidatePivot作为LastPivot
                         self.update_last_pivot_using_candidate()
                         # self.pivot_df.loc[self.last_pivot_index] = Series(data=[self.last_pivot_type, self.last_pivot_high, self.last_pivot_low, 0], index=['pivot', 'high', 'low', 'flag'])
-                        self.pivot_df.loc[self.last_pivot_index, ['pivot', 'high', 'low']] = [self.last_pivot_type, self.last_pivot_high, self.last_pivot_low]
+                        self.set_pivot(self.last_pivot_index, self.last_pivot_type, self.last_pivot_high, self.last_pivot_low)
 
                         self.update_candidate_pivot(yesterday_index, last_high, last_low, new_candidate_pivot_type)
                         # self.pivot_df.loc[self.last_candidate_pivot_index] = Series(data=[self.last_candidate_pivot_type * 2, self.last_candidate_pivot_high, self.last_candidate_pivot_low, 0], index=['pivot', 'high', 'low', 'flag'])
-                        self.pivot_df.loc[self.last_candidate_pivot_index, ['pivot', 'high', 'low']] = [self.last_candidate_pivot_type * 2, self.last_candidate_pivot_high, self.last_candidate_pivot_low]
+                        self.set_pivot(self.last_candidate_pivot_index, self.last_candidate_pivot_type * 2, self.last_candidate_pivot_high, self.last_candidate_pivot_low)
                     else:
                         # 当前是IgnorePivot，仅做记录，5/-5
                         # self.pivot_df.loc[yesterday_index] = Series(data=[new_candidate_pivot_type * 5, last_high, last_low, 0], index=['pivot', 'high', 'low', 'flag'])
-                        self.pivot_df.loc[yesterday_index, ['pivot', 'high', 'low']] = [new_candidate_pivot_type * 5, last_high, last_low]
+                        self.set_pivot(yesterday_index, new_candidate_pivot_type * 5, last_high, last_low)
 
                 # 候选分型尚未成立，新的分型跟上一个确定分型相同，却有更低的低点或者更高的高点，则更新上一个确定分型
                 elif self.last_pivot_type == new_candidate_pivot_type and self.last_candidate_pivot_bars < self.valid_bars:
@@ -236,7 +347,7 @@ class CentrumSensor(object):
                         self.update_last_backup_pivot(yesterday_index, last_high, last_low, new_candidate_pivot_type)
                         # 当前是backup pivot, 仅做记录, 4/-4
                         # self.pivot_df.loc[self.last_backup_pivot_index] = Series(data=[self.last_backup_pivot_type * 4, self.last_backup_pivot_high, self.last_backup_pivot_low, 0], index=['pivot', 'high', 'low', 'flag'])
-                        self.pivot_df.loc[self.last_backup_pivot_index, ['pivot', 'high', 'low']] = [self.last_backup_pivot_type * 4, self.last_backup_pivot_high, self.last_backup_pivot_low]
+                        self.set_pivot(self.last_backup_pivot_index, self.last_backup_pivot_type * 4, self.last_backup_pivot_high, self.last_backup_pivot_low)
 
         if not is_contain:
             self.last_before_bar_high = last_high
@@ -285,54 +396,111 @@ class CentrumSensor(object):
         self.last_backup_pivot_index = None
         self.last_backup_pivot_bars = 1
 
+    def row_position(self, index: Any) -> int:
+        return index if self.batch else self.pivot_store.position(index)
+
+    def set_pivot(self, index: Any, pivot: int, high: float = None, low: float = None):
+        """
+        写入index所在bar的pivot类型，指定high/low时一并写入
+        """
+        self.pivot_store.set_pivot(self.row_position(index), pivot, high, low)
+
+    def set_bar(self, index: Any, high: float, low: float):
+        """
+        写入index所在bar处理包含关系之后的high/low
+        """
+        self.pivot_store.set_bar(self.row_position(index), high, low)
+
+    def add_flag(self, index: Any, flag: int):
+        self.pivot_store.add_flag(self.row_position(index), flag)
+
+    def init_pivot_row(self, index: Any, high: float, low: float):
+        """
+        pivot数据中index所在的行重置为未分型的bar，不存在时追加
+        :return: 所在的行
+        """
+        return self.pivot_store.reset_row(index, high, low)
+
+    def pivot_value(self, index: Any, name: str) -> Any:
+        """
+        index所在bar的pivot数据，等价于pivot_df.loc[index, name]，不构建DataFrame
+        """
+        return self.pivot_store.value(self.pivot_store.position(index), name)
+
+    def memory_usage(self) -> int:
+        """
+        pivot数据占用的字节数（数组以及缓存的DataFrame视图）
+        """
+        return sum(self.pivot_store.memory_usage().values()) if self.pivot_store is not None else 0
+
     @property
     def last_bottom_date(self):
-        bottoms = self.pivot_df[self.pivot_df["pivot"].isin([-1, -2])]
-        return bottoms.index[-1] if len(bottoms) > 0 else None
+        pos = self.pivot_store.last_bottom if self.pivot_store is not None else None
+        return self.pivot_store.timestamp(pos) if pos is not None else None
 
     @property
     def last_top_date(self):
-        ups = self.pivot_df[self.pivot_df["pivot"].isin([1, 2])]
-        return ups.index[-1] if len(ups) > 0 else None
-
-    def backup_current_stats(self):
-        backup_point = {}
-        self_dict = vars(self)
-        for name, value in self_dict.items():
-            if name not in ['name', 'valid_bars', 'pivot_df', 'backup_point']:
-                backup_point[name] = value
-
-        if self.last_backup_pivot_index is not None:
-            backup_point['last_candidate_pivot_index_value_s'] = self.pivot_df.loc[self.last_candidate_pivot_index]
-        if self.last_pivot_index is not None:
-            backup_point['last_pivot_index_value_s'] = self.pivot_df.loc[self.last_pivot_index]
-        return backup_point
-
-    def restore_to_last_backup_point(self, backup_point: Dict):
-        if self.last_candidate_pivot_index is not None and 'last_candidate_pivot_index' in backup_point.keys() and self.last_candidate_pivot_index != backup_point['last_candidate_pivot_index']:
-            self.pivot_df.loc[self.last_candidate_pivot_index, 'pivot'] = 0
-        if self.last_pivot_index is not None and 'last_pivot_index' in backup_point.keys() and self.last_pivot_index != backup_point['last_pivot_index']:
-            self.pivot_df.loc[self.last_pivot_index, 'pivot'] *= 2
-
-        if 'last_candidate_pivot_index_value_s' in backup_point.keys():
-            last_candidate_pivot_index = backup_point['last_candidate_pivot_index']
-            self.pivot_df.loc[last_candidate_pivot_index] = backup_point['last_candidate_pivot_index_value_s']
-        if 'last_pivot_index_value_s' in backup_point.keys():
-            last_pivot_index = backup_point['last_pivot_index']
-            self.pivot_df.loc[last_pivot_index] = backup_point['last_pivot_index_value_s']
-
-        for name, value in backup_point.items():
-            if name not in ['last_candidate_pivot_index_value_s', 'last_pivot_index_value_s']:
-                setattr(self, name, value)
+        pos = self.pivot_store.last_top if self.pivot_store is not None else None
+        return self.pivot_store.timestamp(pos) if pos is not None else None
+
+    @property
+    def current_zone(self) -> CentrumZone:
+        """
+        最后一个中枢（当前的，或者最近结束的），没有时为None
+        """
+        return self.zone_tracker.last_zone
+
+    def above_last_zone(self, price: float) -> bool:
+        return self.zone_tracker.above_last_zone(price)
+
+    @property
+    def earliest_reference_date(self):
+        """
+        当前状态（包括备份点）引用的最早的pivot日期，裁剪历史时不能越过该日期
+        """
+        dates = [self.last_pivot_index, self.last_candidate_pivot_index, self.last_backup_pivot_index]
+        if self.backup_point is not None:
+            backup = self.backup_point
+            dates += [backup.last_pivot_index, backup.last_candidate_pivot_index, backup.last_backup_pivot_index]
+        dates = [d for d in dates if d is not None]
+        return min(dates) if len(dates) > 0 else None
+
+    def trim_history(self, before):
+        """
+        裁剪掉before之前的pivot数据，最近的pivot引用（last/candidate/backup）所在的行会被保留
+        """
+        if self.pivot_store is None:
+            return
+
+        earliest = self.earliest_reference_date
+        if earliest is not None and earliest < before:
+            before = earliest
+        self.pivot_store.trim(self.pivot_store.count_before(before))
+
+    def backup_current_stats(self) -> SensorState:
+        """
+        备份探测下一根bar之前的状态：标量状态复制到检查点，pivot数据从这里开始记录undo log
+        """
+        self.pivot_store.begin_undo()
+        return SensorState.capture(self)
+
+    def restore_to_last_backup_point(self, backup_point: SensorState):
+        """
+        回滚到backup_current_stats时的状态：按undo log恢复改写过的pivot数据，再恢复检查点中的标量
+        """
+        if backup_point is None:
+            return
 
+        self.pivot_store.rollback()
+        backup_point.restore(self)
 
     def latest_pivot_df(self, last_signal_days, today):
         if not self.inited:
             return None
 
-        new_pivot_df = self.pivot_df.copy()
         # 对于最新出现的backup pivot，需要纳入到背离范围
         if self.last_backup_pivot_index is not None and self.last_backup_pivot_index + timedelta(days=last_signal_days) >= today:
-            new_pivot_df.loc[self.last_backup_pivot_index, ['pivot', 'high', 'low']] = [self.last_backup_pivot_type * 3, self.last_backup_pivot_high, self.last_backup_pivot_low]
+            return self.pivot_store.overlay(self.pivot_store.position(self.last_backup_pivot_index), self.last_backup_pivot_type * 3,
+                                            self.last_backup_pivot_high, self.last_backup_pivot_low)
 
-        return new_pivot_df
+        return self.pivot_df
@@ -0,0 +1,136 @@
+import logging
+from dataclasses import dataclass, replace
+from typing import Any, List, Optional, Tuple
+
+logger = logging.getLogger("CentrumZone")
+
+
+@dataclass
+class CentrumZone:
+    """
+    中枢：至少三笔连续重叠的区间
+    ZG/ZD为形成中枢的三笔的重叠区间（高点的最小值/低点的最大值），GG/DD为中枢内所有笔的最高/最低点
+    """
+    start: Any          # 第一笔的起点日期
+    end: Any            # 最后一笔的终点日期
+    zg: float
+    zd: float
+    gg: float
+    dd: float
+    strokes: int = 3    # 中枢包含的笔数
+    first: int = 0      # 第一笔的序号
+
+    def overlaps(self, low: float, high: float) -> bool:
+        return low < self.zg and high > self.zd
+
+
+class CentrumZoneTracker(object):
+    """
+    增量的中枢跟踪，由CentrumSensor确认的pivot（1/-1）驱动，计算量只跟pivot数相关，跟bar数无关
+    相邻的两个确认pivot构成一笔；连续三笔重叠形成中枢，之后与[ZD, ZG]重叠的笔延伸中枢，
+    出现第一笔不重叠的笔时中枢结束，从这一笔开始寻找下一个中枢
+    确认的pivot只可能在末尾变动（backup替换最后的pivot、盘中更新回滚），每一笔都保存处理之前的状态，末尾回退为O(1)
+    """
+
+    def __init__(self):
+        """Constructor"""
+        self.pivots: List[Tuple[Any, int, float]] = []      # (日期, 1/-1, 价格)，顶取high，底取low
+        self.zones: List[CentrumZone] = []                  # 已结束的历史中枢
+        self.current: Optional[CentrumZone] = None          # 当前（最后一个未结束的）中枢
+        self.search_from: int = 0                           # 从第几笔开始寻找新的中枢
+        self.checkpoints: List[Tuple[Optional[CentrumZone], int, int]] = []     # 每一笔处理之前的状态
+
+    def __len__(self) -> int:
+        return len(self.zones) + (1 if self.current is not None else 0)
+
+    @property
+    def stroke_count(self) -> int:
+        return max(len(self.pivots) - 1, 0)
+
+    def stroke(self, i: int) -> Tuple[Any, Any, float, float]:
+        """
+        第i笔：(起点日期, 终点日期, 低点, 高点)
+        """
+        (start, _, p0), (end, _, p1) = self.pivots[i], self.pivots[i + 1]
+        return start, end, min(p0, p1), max(p0, p1)
+
+    def load(self, pivots: List[Tuple[Any, int, float]]):
+        """
+        按确认的pivot序列重建
+        """
+        self.__init__()
+        for index, pivot_type, price in pivots:
+            self.push(index, pivot_type, price)
+
+    def push(self, index: Any, pivot_type: int, price: float):
+        self.pivots.append((index, pivot_type, float(price)))
+        if len(self.pivots) < 2:
+            return
+
+        self.checkpoints.append((replace(self.current) if self.current is not None else None, len(self.zones), self.search_from))
+        i = len(self.pivots) - 2
+        _, end, low, high = self.stroke(i)
+        zone = self.current
+        if zone is not None:
+            if zone.overlaps(low, high):
+                zone.end = end
+                zone.gg = max(zone.gg, high)
+                zone.dd = min(zone.dd, low)
+                zone.strokes = i - zone.first + 1
+                return
+            self.zones.append(zone)
+            self.current = None
+            self.search_from = i
+
+        if i - self.search_from >= 2:
+            strokes = [self.stroke(k) for k in range(i - 2, i + 1)]
+            zg = min(s[3] for s in strokes)
+            zd = max(s[2] for s in strokes)
+            if zg > zd:
+                self.current = CentrumZone(start=strokes[0][0], end=end, zg=zg, zd=zd,
+                                           gg=max(s[3] for s in strokes), dd=min(s[2] for s in strokes), first=i - 2)
+
+    def pop(self):
+        if not self.pivots:
+            return
+        self.pivots.pop()
+        if self.checkpoints and len(self.checkpoints) >= len(self.pivots):
+            current, n_zones, self.search_from = self.checkpoints.pop()
+            self.current = current
+            del self.zones[n_zones:]
+
+    def follow(self, index: Any, pivot_type: int, price: float):
+        """
+        跟CentrumSensor最后确认的pivot对齐：末尾不一致的pivot先回退，再追加新的pivot
+        index为None表示还没有确认的pivot
+        """
+        target = (index, pivot_type, float(price)) if index is not None else None
+        while self.pivots:
+            last_index, last_type, _ = self.pivots[-1]
+            if target is not None and last_index < index and last_type != pivot_type:
+                break
+            if self.pivots[-1] == target:
+                return
+            self.pop()
+        if target is not None:
+            self.push(*target)
+
+    @property
+    def last_zone(self) -> Optional[CentrumZone]:
+        """
+        最后一个中枢（当前的，或者最近结束的）
+        """
+        if self.current is not None:
+            return self.current
+        return self.zones[-1] if self.zones else None
+
+    def above_last_zone(self, price: float) -> bool:
+        zone = self.last_zone
+        return zone is not None and price > zone.zg
+
+    def below_last_zone(self, price: float) -> bool:
+        zone = self.last_zone
+        return zone is not None and price < zone.zd
+
+    def all_zones(self) -> List[CentrumZone]:
+        return self.zones + ([self.current] if self.current is not None else [])
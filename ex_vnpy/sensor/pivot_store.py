@@ -0,0 +1,347 @@
+import logging
+from bisect import bisect_left, insort
+from typing import Any, Dict, List, Tuple
+
+import numpy as np
+import pandas as pd
+from pandas import DataFrame, DatetimeIndex
+
+
+logger = logging.getLogger("PivotStore")
+
+PIVOT_COLUMNS = ['pivot', 'high', 'low', 'flag']
+TOP_PIVOTS = (1, 2)         # 确定的、candidate的顶分型
+BOTTOM_PIVOTS = (-1, -2)    # 确定的、candidate的底分型
+
+
+class PivotStore(object):
+    """
+    CentrumSensor的pivot数据存储，跟BarStore一样以预分配的numpy数组按列存放
+    1. 日期以int64(ns)存储，按日期定位行为二分查找，探测时写入的都是最近的几行，先比较最后一行
+    2. pivot不为0的行记在稀疏的事件列表中（绝对位置，有序），顶分型(1/2)、底分型(-1/-2)另外单独记录，
+       最近的顶底分型为O(1)查询
+    3. DataFrame视图在访问时才构建，并缓存到下一次数据变动，跟原来的pivot_df列、类型完全一致；
+       缓存的视图只在内部共享，对外返回副本
+    4. begin_undo之后，每次改写记录 (绝对位置, 列, 原值) 到undo log，rollback倒序恢复，并去掉之后追加的行
+    """
+
+    def __init__(self, ptype: str = 'HL', compact: bool = False, capacity: int = 256, index_name: str = None):
+        """Constructor"""
+        self.ptype: str = ptype
+        self.compact: bool = compact
+        self.index_name: str = index_name
+        self.capacity: int = max(capacity, 1)
+        self.size: int = 0
+        self.offset: int = 0        # 已经从头部裁剪掉的行数，offset + pos 即为行的绝对位置
+        self.tz: Any = None
+        self.version: int = 0
+
+        self.dtypes: Dict[str, np.dtype] = {
+            'pivot': np.dtype(np.int8 if compact else np.int64),
+            'high': np.dtype(np.float64),
+            'low': np.dtype(np.float64),
+            'flag': np.dtype(np.int16 if compact else np.int64),
+        }
+        self.dates: np.ndarray = np.zeros(self.capacity, dtype=np.int64)
+        self.arrays: Dict[str, np.ndarray] = {name: np.zeros(self.capacity, dtype=dtype) for name, dtype in self.dtypes.items()}
+
+        self.events: List[int] = []         # pivot不为0的行
+        self.tops: List[int] = []           # pivot为1/2的行
+        self.bottoms: List[int] = []        # pivot为-1/-2的行
+
+        self.recording: bool = False
+        self.undo_log: List[Tuple[int, str, Any]] = []
+        self.undo_size: int = 0             # begin_undo时的行数（绝对位置）
+
+        self._df: DataFrame = None
+        self._df_version: int = -1
+
+    @classmethod
+    def from_index(cls, index: DatetimeIndex, ptype: str = 'HL', compact: bool = False) -> 'PivotStore':
+        """
+        以index中的日期初始化，所有行为未分型的空行
+        """
+        store = cls(ptype=ptype, compact=compact, capacity=len(index) * 2, index_name=index.name)
+        store.tz = index.tz
+        store.dates[:len(index)] = index.as_unit('ns').asi8
+        store.size = len(index)
+        store.version += 1
+        return store
+
+    def __len__(self) -> int:
+        return self.size
+
+    def __getstate__(self) -> Dict[str, Any]:
+        """
+        序列化时去掉DataFrame视图缓存，并且只保留有效的行
+        """
+        state = dict(self.__dict__)
+        state['_df'], state['_df_version'] = None, -1
+        state['dates'] = self.dates[:self.size].copy()
+        state['arrays'] = {name: arr[:self.size].copy() for name, arr in self.arrays.items()}
+        state['capacity'] = max(self.size, 1)
+        return state
+
+    def __setstate__(self, state: Dict[str, Any]):
+        self.__dict__.update(state)
+        if len(self.dates) < self.capacity:
+            self._grow(self.capacity)
+
+    def _grow(self, min_capacity: int):
+        new_capacity = max(self.capacity, 1)
+        while new_capacity < min_capacity:
+            new_capacity *= 2
+
+        dates = np.zeros(new_capacity, dtype=np.int64)
+        dates[:self.size] = self.dates[:self.size]
+        self.dates = dates
+        for name, arr in self.arrays.items():
+            new_arr = np.zeros(new_capacity, dtype=arr.dtype)
+            new_arr[:self.size] = arr[:self.size]
+            self.arrays[name] = new_arr
+        self.capacity = new_capacity
+
+    def position(self, index: Any) -> int:
+        """
+        日期所在的行，不存在时抛出KeyError
+        """
+        value = pd.Timestamp(index).value
+        last = self.size - 1
+        if last >= 0 and self.dates[last] == value:
+            return last
+        pos = int(np.searchsorted(self.dates[:self.size], value))
+        if pos >= self.size or self.dates[pos] != value:
+            raise KeyError(index)
+        return pos
+
+    def __contains__(self, index: Any) -> bool:
+        try:
+            self.position(index)
+        except KeyError:
+            return False
+        return True
+
+    def timestamp(self, pos: int) -> pd.Timestamp:
+        ts = pd.Timestamp(int(self.dates[pos]))
+        return ts.tz_localize('UTC').tz_convert(self.tz) if self.tz is not None else ts
+
+    def reset_row(self, index: Any, high: float, low: float) -> int:
+        """
+        index所在的行重置为未分型的bar，日期晚于最后一行时追加
+        """
+        value = pd.Timestamp(index).value
+        if self.size == 0 or value > self.dates[self.size - 1]:
+            if self.size == 0 and self.tz is None:
+                self.tz = pd.Timestamp(index).tz
+            if self.size >= self.capacity:
+                self._grow(self.size + 1)
+            pos = self.size
+            self.dates[pos] = value
+            self.size += 1
+        else:
+            pos = self.position(index)
+            self.set_pivot(pos, 0)
+            self._record(pos, 'high', 'low', 'flag')
+
+        self.arrays['pivot'][pos] = 0
+        self.arrays['high'][pos] = high
+        self.arrays['low'][pos] = low
+        self.arrays['flag'][pos] = 0
+        self.version += 1
+        return pos
+
+    def _record(self, pos: int, *names: str):
+        if self.recording:
+            apos = self.offset + pos
+            for name in names:
+                self.undo_log.append((apos, name, self.arrays[name][pos]))
+
+    def begin_undo(self):
+        """
+        清空undo log，从当前的数据开始记录改写
+        """
+        self.recording = True
+        self.undo_log = []
+        self.undo_size = self.offset + self.size
+
+    def rollback(self):
+        """
+        恢复到begin_undo时的数据，之后继续记录
+        """
+        log, self.undo_log = self.undo_log, []
+        recording, self.recording = self.recording, False
+        for apos, name, value in reversed(log):
+            pos = apos - self.offset
+            if pos < 0:         # 已经被裁剪掉
+                continue
+            if name == 'pivot':
+                self.set_pivot(pos, int(value))
+            else:
+                self.arrays[name][pos] = value
+        # 之后追加的行，pivot已经恢复为0，直接去掉
+        self.size = min(self.size, max(self.undo_size - self.offset, 0))
+        self.recording = recording
+        self.version += 1
+
+    @staticmethod
+    def _mark(positions: List[int], apos: int, present: bool):
+        """
+        在有序的位置列表中加入/去掉apos，探测改动的都是最近的行，通常只涉及列表末尾
+        """
+        if present:
+            if not positions or positions[-1] < apos:
+                positions.append(apos)
+            elif positions[bisect_left(positions, apos)] != apos:
+                insort(positions, apos)
+        elif positions:
+            if positions[-1] == apos:
+                positions.pop()
+            else:
+                i = bisect_left(positions, apos)
+                if i < len(positions) and positions[i] == apos:
+                    del positions[i]
+
+    def set_pivot(self, pos: int, pivot: int, high: float = None, low: float = None):
+        arr = self.arrays['pivot']
+        old = int(arr[pos])
+        if high is not None:
+            self._record(pos, 'pivot', 'high', 'low')
+        elif old != pivot:
+            self._record(pos, 'pivot')
+        if old != pivot:
+            apos = self.offset + pos
+            if (old != 0) != (pivot != 0):
+                self._mark(self.events, apos, pivot != 0)
+            if (old in TOP_PIVOTS) != (pivot in TOP_PIVOTS):
+                self._mark(self.tops, apos, pivot in TOP_PIVOTS)
+            if (old in BOTTOM_PIVOTS) != (pivot in BOTTOM_PIVOTS):
+                self._mark(self.bottoms, apos, pivot in BOTTOM_PIVOTS)
+            arr[pos] = pivot
+        if high is not None:
+            self.arrays['high'][pos] = high
+            self.arrays['low'][pos] = low
+        self.version += 1
+
+    def set_bar(self, pos: int, high: float, low: float):
+        self._record(pos, 'high', 'low')
+        self.arrays['high'][pos] = high
+        self.arrays['low'][pos] = low
+        self.version += 1
+
+    def add_flag(self, pos: int, flag: int):
+        self._record(pos, 'flag')
+        self.arrays['flag'][pos] += flag
+        self.version += 1
+
+    def load(self, arrays: Dict[str, np.ndarray]):
+        """
+        整列写入探测结果（长度跟存储一致），并重建事件列表
+        """
+        for name in PIVOT_COLUMNS:
+            self.arrays[name][:self.size] = arrays[name]
+        pivots = self.arrays['pivot'][:self.size]
+        self.events = (np.flatnonzero(pivots) + self.offset).tolist()
+        self.tops = (np.flatnonzero(np.isin(pivots, TOP_PIVOTS)) + self.offset).tolist()
+        self.bottoms = (np.flatnonzero(np.isin(pivots, BOTTOM_PIVOTS)) + self.offset).tolist()
+        self.version += 1
+
+    def value(self, pos: int, name: str) -> Any:
+        if name == 'ptype':
+            return self.ptype
+        return self.arrays[name][pos]
+
+    def last_position(self, positions: List[int]) -> int:
+        return positions[-1] - self.offset if positions else None
+
+    @property
+    def last_top(self) -> int:
+        return self.last_position(self.tops)
+
+    @property
+    def last_bottom(self) -> int:
+        return self.last_position(self.bottoms)
+
+    def pivot_positions(self) -> List[int]:
+        """
+        pivot不为0的行（相对位置，有序）
+        """
+        return [apos - self.offset for apos in self.events]
+
+    def confirmed_pivots(self) -> List[Tuple[pd.Timestamp, int, float]]:
+        """
+        确认的pivot（1/-1）：(日期, 1/-1, 价格)，顶取high，底取low
+        """
+        result = []
+        pivots = self.arrays['pivot']
+        for apos in self.events:
+            pos = apos - self.offset
+            pivot = int(pivots[pos])
+            if pivot == 1 or pivot == -1:
+                price = self.arrays['high'][pos] if pivot == 1 else self.arrays['low'][pos]
+                result.append((self.timestamp(pos), pivot, float(price)))
+        return result
+
+    def count_before(self, index: Any) -> int:
+        """
+        日期早于index的行数
+        """
+        return int(np.searchsorted(self.dates[:self.size], pd.Timestamp(index).value))
+
+    def trim(self, n: int):
+        """
+        从头部裁剪掉n行，剩余数据原地前移
+        """
+        n = min(max(n, 0), self.size)
+        if n == 0:
+            return
+
+        remain = self.size - n
+        self.dates[:remain] = self.dates[n:self.size]
+        for arr in self.arrays.values():
+            arr[:remain] = arr[n:self.size]
+        self.size = remain
+        self.offset += n
+        for positions in (self.events, self.tops, self.bottoms):
+            del positions[:bisect_left(positions, self.offset)]
+        self.version += 1
+
+    @property
+    def index(self) -> DatetimeIndex:
+        index = pd.DatetimeIndex(self.dates[:self.size].view('M8[ns]'), name=self.index_name)
+        return index.tz_localize('UTC').tz_convert(self.tz) if self.tz is not None else index
+
+    def frame(self) -> DataFrame:
+        """
+        按需构建DataFrame视图，数据未变动时重复访问直接返回缓存（内部共享的视图，不要修改）
+        紧凑存储时没有ptype列
+        """
+        if self._df_version != self.version:
+            data = {name: self.arrays[name][:self.size] for name in PIVOT_COLUMNS}     # 由dict构建时pandas会复制
+            if not self.compact:
+                data = {'ptype': np.full(self.size, self.ptype, dtype=object), **data}
+            self._df = DataFrame(data=data, index=self.index)
+            self._df_version = self.version
+        return self._df
+
+    def to_dataframe(self) -> DataFrame:
+        """
+        DataFrame视图的副本，调用方可以随意修改
+        """
+        return self.frame().copy()
+
+    def overlay(self, pos: int, pivot: int, high: float, low: float) -> DataFrame:
+        """
+        在DataFrame视图的副本上改写一行
+        """
+        df = self.frame().copy()
+        df.loc[df.index[pos], ['pivot', 'high', 'low']] = [pivot, high, low]
+        return df
+
+    def memory_usage(self) -> Dict[str, int]:
+        """
+        占用的字节数：arrays为列数组（按容量预分配）以及事件列表，frame为缓存的DataFrame视图
+        """
+        arrays = self.dates.nbytes + sum(arr.nbytes for arr in self.arrays.values())
+        arrays += sum(8 * len(positions) for positions in (self.events, self.tops, self.bottoms))
+        frame = int(self._df.memory_usage(deep=True).sum()) if self._df is not None else 0
+        return {'arrays': arrays, 'frame': frame}
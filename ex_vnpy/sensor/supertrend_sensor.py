@@ -23,9 +23,9 @@ class SupertrendSensor(object):
         if source_df is None or ind_values is None:
             return
 
-        self.supertrend_df = DataFrame(columns=['atr', 'ph', 'pl', 'pp', 'center', 'up', 'down', 'trend', 'signal'],
+        # 直接以0.0填充，所有列都是float64（在没有类型的空DataFrame上fillna会得到object列）
+        self.supertrend_df = DataFrame(data=0.0, columns=['atr', 'ph', 'pl', 'pp', 'center', 'up', 'down', 'trend', 'signal'],
                                        index=source_df.index)
-        self.supertrend_df.fillna(0, inplace=True)
         self.inited = True
 
         # 初始化指标取值
@@ -110,6 +110,18 @@ class SupertrendSensor(object):
         self.supertrend_df.loc[source_df.index[-1], 'atr'] = ind_values[-1]
         self.detect_next_trend(source_df)
 
+    def trim_history(self, before):
+        """
+        裁剪掉before之前的趋势数据，最后一次趋势信号所在的行会被保留
+        """
+        if self.supertrend_df is None:
+            return
+
+        signal_index = self.supertrend_df.index[self.supertrend_df['signal'] != 0]
+        if len(signal_index) > 0 and signal_index[-1] < before:
+            before = signal_index[-1]
+        self.supertrend_df = self.supertrend_df[self.supertrend_df.index >= before].copy()
+
     @property
     def last_trend_signal(self) -> float:
         return self.supertrend_df.iloc[-1]['trend']
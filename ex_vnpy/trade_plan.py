@@ -251,10 +251,9 @@ class TradePlan:
             reason = ind_reason
 
         # 止损价格只能上升，不能下降
-        _, lw, _ = self.stoploss_price_date.isocalendar()
-        _, tw, _ = sm.today.isocalendar()
+        same_week = sm.calendar.same_week(self.stoploss_price_date, sm.today)
         # 对于当周的数据，由于周线未定型，允许向下调整止损价；对于非当周数据，只允许向上调整
-        if (lw == tw and self.entry_buy_price > self.stoploss_price) or new_sl_price > self.stoploss_price:
+        if (same_week and self.entry_buy_price > self.stoploss_price) or new_sl_price > self.stoploss_price:
             # TODO: 向下调整止损位，必须要是同一周、同一个策略触发的价格
             if new_sl_price < self.stoploss_price and self.stoploss_records:
                 if reason != self.stoploss_records[-1].change_reason:
@@ -683,8 +682,7 @@ class TradePlan:
 
         di_factor = settings["di_factor"]
 
-        last_pivot_s = sm.dc_sensor.pivot_df.loc[last_bar["datetime"]]
-        if last_pivot_s["pivot"] == 2:
+        if sm.dc_sensor.pivot_value(last_bar["datetime"], "pivot") == 2:
             di_space = atr_values[-1] * adx_values[-1]/100 * di_factor
             a_ind_change_price = bar["low"] - di_space
             a_ind_reason = StoplossReason.TopPivot
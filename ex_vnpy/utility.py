@@ -49,13 +49,15 @@ def has_large_drop(today_bar: Series, yesterday_bar: Series, atr: list, drop_fac
     return False
 
 def find_real_test_days(sm: SourceManager, entry_date: datetime, max_test_days: int):
-    real_test_days = 0
-    for ix in range(2, max_test_days+1):
-        if sm.daily_df.iloc[-1 * ix]["datetime"] == entry_date:
-            # real_test_days = ix
-            real_test_days = ix
-            break
-    return real_test_days
+    """
+    入场日是倒数第几根日线（2 ~ max_test_days），不在该范围内时返回0
+    """
+    calendar = sm.calendar
+    pos = calendar.position(entry_date)
+    if pos is None:
+        return 0
+    real_test_days = len(calendar.store) - pos
+    return real_test_days if 2 <= real_test_days <= max_test_days else 0
 
 def is_speed_low(input: list, drop_days: int):
     if None in input:
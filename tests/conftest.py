@@ -0,0 +1,54 @@
+import copy
+import random
+from datetime import datetime, timedelta
+
+import pytest
+from vnpy.trader.constant import Exchange, Interval
+
+from ex_vnpy.object import ExBarData
+
+# 资金流的字段（ExBarData在BarData之外扩展的字段）
+CAPITAL_FIELDS = [name for name in ExBarData.__dataclass_fields__ if name.split('_')[0] in ('order', 'volume', 'turnover')
+                  and name.split('_')[-1] in ('XL', 'L', 'M', 'S')]
+
+
+def generate_bars(n: int, seed: int = 1, start: datetime = datetime(2019, 1, 2), symbol: str = "600111") -> list:
+    """
+    随机游走的日线，跳过周末，偶尔停牌
+    """
+    rnd = random.Random(seed)
+    bars, price, day = [], 10.0, start
+    while len(bars) < n:
+        if day.weekday() < 5 and rnd.random() > 0.03:
+            o = price * (1 + rnd.gauss(0, 0.01))
+            c = o * (1 + rnd.gauss(0, 0.02))
+            h = max(o, c) * (1 + abs(rnd.gauss(0, 0.01)))
+            l = min(o, c) * (1 - abs(rnd.gauss(0, 0.01)))
+            capital = {name: (rnd.random() * 1e5 if name.startswith('turnover') else rnd.randint(0, 1000)) for name in CAPITAL_FIELDS}
+            bars.append(ExBarData(gateway_name="DB", symbol=symbol, exchange=Exchange.SSE, datetime=day,
+                                  interval=Interval.DAILY, volume=float(rnd.randint(1000, 9000)),
+                                  turnover=rnd.random() * 1e6, open_interest=0, open_price=round(o, 2),
+                                  high_price=round(h, 2), low_price=round(l, 2), close_price=round(c, 2), **capital))
+            price = c
+        day += timedelta(days=1)
+    return bars
+
+
+def intraday_ticks(bar: ExBarData, rnd: random.Random, count: int) -> list:
+    """
+    同一根bar在收盘前的盘中推送，价格随机偏离最终的bar
+    """
+    ticks = []
+    for _ in range(count):
+        tick = copy.copy(bar)
+        tick.close_price = round(bar.close_price * (1 + rnd.gauss(0, 0.03)), 2)
+        tick.high_price = max(round(bar.high_price * (1 + abs(rnd.gauss(0, 0.03))), 2), tick.close_price)
+        tick.low_price = min(round(bar.low_price * (1 - abs(rnd.gauss(0, 0.03))), 2), tick.close_price)
+        tick.volume = bar.volume * rnd.random()
+        ticks.append(tick)
+    return ticks
+
+
+@pytest.fixture
+def bars():
+    return generate_bars(400)
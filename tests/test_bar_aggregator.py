@@ -0,0 +1,80 @@
+import copy
+import random
+from datetime import timedelta
+
+import pytest
+from vnpy.trader.constant import Interval
+
+from ex_vnpy.manager.bar_aggregator import ExInterval
+from ex_vnpy.manager.source_manager import SourceManager
+
+from conftest import CAPITAL_FIELDS, intraday_ticks
+
+INTERVALS = [Interval.DAILY, Interval.WEEKLY, ExInterval.MONTHLY]
+
+
+def hourly_bars(bars, rnd: random.Random) -> list:
+    """
+    每根日线拆成4根小时线：价格在日线的高低点之间随机游走，成交量、资金流按比例分配
+    """
+    hours = []
+    for bar in bars:
+        weights = [rnd.random() + 0.1 for _ in range(4)]
+        total = sum(weights)
+        prices = [bar.open_price] + [round(rnd.uniform(bar.low_price, bar.high_price), 2) for _ in range(3)] + [bar.close_price]
+        for i in range(4):
+            hour = copy.copy(bar)
+            hour.interval = Interval.HOUR
+            hour.datetime = bar.datetime + timedelta(hours=10 + i)
+            hour.open_price, hour.close_price = prices[i], prices[i + 1]
+            hour.high_price = bar.high_price if i == 1 else max(prices[i], prices[i + 1])
+            hour.low_price = bar.low_price if i == 2 else min(prices[i], prices[i + 1])
+            hour.volume = bar.volume * weights[i] / total
+            hour.turnover = bar.turnover * weights[i] / total
+            for name in CAPITAL_FIELDS:
+                setattr(hour, name, getattr(bar, name) * weights[i] / total)
+            hours.append(hour)
+    return hours
+
+
+def assert_same_stores(actual: SourceManager, expected: SourceManager, intervals):
+    for interval in intervals:
+        assert actual.get_store(interval).to_dataframe().equals(expected.get_store(interval).to_dataframe()), interval
+
+
+@pytest.mark.parametrize("start", [1, 3, 40])
+def test_update_equals_init(bars, start):
+    rnd = random.Random(start)
+    incremental = SourceManager(bars[:start])
+    for interval in INTERVALS[1:]:
+        incremental.get_store(interval)
+    for bar in bars[start:]:
+        for tick in intraday_ticks(bar, rnd, rnd.randint(0, 2)):
+            incremental.update_bar(tick)
+        incremental.update_bar(bar)
+    assert_same_stores(incremental, SourceManager(bars), INTERVALS[1:])
+
+
+@pytest.mark.parametrize("start", [1, 6, 200])
+def test_intraday_update_equals_init(bars, start):
+    rnd = random.Random(start)
+    hours = hourly_bars(bars[:120], rnd)
+    incremental = SourceManager(hours[:start], base_interval=Interval.HOUR)
+    for interval in INTERVALS[1:]:
+        incremental.get_store(interval)
+    for hour in hours[start:]:
+        for tick in intraday_ticks(hour, rnd, rnd.randint(0, 1)):
+            incremental.update_bar(tick)
+        incremental.update_bar(hour)
+    assert_same_stores(incremental, SourceManager(hours, base_interval=Interval.HOUR), INTERVALS)
+
+
+def test_intraday_is_up_compares_daily_bars(bars):
+    hours = hourly_bars(bars[:60], random.Random(5))
+    sm = SourceManager(hours[:8], base_interval=Interval.HOUR)
+    for hour in hours[8:]:
+        sm.update_bar(hour)
+        daily = sm.daily_df
+        if len(daily) >= 2:
+            assert sm.is_up == (daily['high'].iloc[-1] >= daily['high'].iloc[-2])
+            assert sm.is_down == (daily['low'].iloc[-1] <= daily['low'].iloc[-2])
@@ -0,0 +1,75 @@
+import pandas as pd
+import pytest
+from vnpy.trader.constant import Exchange, Interval
+
+from ex_vnpy.manager.source_manager import SourceManager
+
+from conftest import CAPITAL_FIELDS
+
+TA = {
+    "ema": {"kind": "EMA", "params": [10], "input_values": ["close"], "output_values": "ema", "interval": Interval.DAILY},
+    "adx_w": {"kind": "ADX", "params": [5, 3], "input_values": ["high", "low", "close"],
+              "output_values": {"adx": "adx", "plus_di": "plus_di", "minus_di": "minus_di"}, "interval": Interval.WEEKLY},
+    "cfnisn": {"kind": "CFNISN", "params": ["volume", 5], "input_values": CAPITAL_FIELDS, "output_values": "cfnisn",
+               "interval": Interval.DAILY},
+}
+
+
+def bar_columns(bars) -> dict:
+    """
+    按列存放的bar，价格列使用ExBarData的属性名（open_price等），标的信息为字符串
+    """
+    df = pd.DataFrame([bar.to_dict() for bar in bars])
+    df = df.rename(columns={"open": "open_price", "high": "high_price", "low": "low_price", "close": "close_price"})
+    df["exchange"] = df["exchange"].map(lambda exchange: exchange.value)
+    df["interval"] = df["interval"].map(lambda interval: interval.value)
+    return {name: df[name].to_numpy() for name in df.columns}
+
+
+def assert_same_manager(actual: SourceManager, expected: SourceManager):
+    assert (actual.symbol, actual.exchange, actual.interval, actual.gateway_name) == \
+           (expected.symbol, expected.exchange, expected.interval, expected.gateway_name)
+    assert actual.data_df.equals(expected.data_df)
+    assert actual.weekly_df.equals(expected.weekly_df)
+    for name in TA:
+        assert actual.get_indicator_values(name) == expected.get_indicator_values(name), name
+    assert actual.dc_sensor.pivot_df.equals(expected.dc_sensor.pivot_df)
+
+
+def continue_both(actual: SourceManager, expected: SourceManager, bars):
+    for bar in bars:
+        actual.update_bar(bar)
+        expected.update_bar(bar)
+    assert_same_manager(actual, expected)
+
+
+def test_from_columns_equals_bar_objects(bars):
+    expected = SourceManager(bars[:300], ta=TA, centrum=True, min_size=30)
+    actual = SourceManager.from_columns(bar_columns(bars[:300]), ta=TA, centrum=True, min_size=30)
+    assert actual.exchange == Exchange.SSE
+    assert_same_manager(actual, expected)
+    continue_both(actual, expected, bars[300:])
+
+
+def test_from_parquet_equals_bar_objects(bars, tmp_path):
+    pytest.importorskip("pyarrow")
+    path = str(tmp_path / "bars.parquet")
+    pd.DataFrame(bar_columns(bars[:300])).to_parquet(path)
+
+    expected = SourceManager(bars[:300], ta=TA, centrum=True, min_size=30)
+    actual = SourceManager.from_parquet(path, ta=TA, centrum=True, min_size=30)
+    assert_same_manager(actual, expected)
+    continue_both(actual, expected, bars[300:])
+
+    # 限定读取的列之外，只有datetime和OHLC
+    projected = SourceManager.from_parquet(path, columns=["volume"])
+    columns = list(projected.data_df.columns)
+    assert sorted(name for name in columns if not name.startswith("ha_")) == ["close", "datetime", "high", "low", "open", "volume"]
+    assert projected.data_df.equals(expected.data_df[columns].iloc[:300])
+
+
+def test_missing_price_column(bars):
+    data = bar_columns(bars[:10])
+    data.pop("close_price")
+    with pytest.raises(ValueError):
+        SourceManager.from_columns(data)
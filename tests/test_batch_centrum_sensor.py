@@ -0,0 +1,84 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from ex_vnpy.sensor.batch_centrum_sensor import FLOAT_STATES, INT_STATES, BatchCentrumSensor
+from ex_vnpy.sensor.centrum_sensor import CentrumSensor
+
+
+def make_frame(n: int, seed: int) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    close = np.round(10 + np.cumsum(rng.normal(0, 0.2, n)), 2)
+    open_ = np.round(close + rng.normal(0, 0.1, n), 2)
+    high = np.maximum(open_, close) + np.round(np.abs(rng.normal(0, 0.1, n)), 2)
+    low = np.minimum(open_, close) - np.round(np.abs(rng.normal(0, 0.1, n)), 2)
+    index = pd.date_range("2016-01-01", periods=n, freq="B", name="datetime")
+    return pd.DataFrame({"open": open_, "high": high, "low": low, "close": close}, index=index)
+
+
+def assert_same(batch: BatchCentrumSensor, vt_symbol: str, sensor: CentrumSensor):
+    assert batch.pivot_df(vt_symbol).equals(sensor.pivot_df)
+    state = batch.get_state(vt_symbol)
+    for name in INT_STATES + FLOAT_STATES:
+        assert state[name] == getattr(sensor, name), name
+    assert batch.last_top_date(vt_symbol) == sensor.last_top_date
+    assert batch.last_bottom_date(vt_symbol) == sensor.last_bottom_date
+    for pivot_type, date in (("top", sensor.last_top_date), ("bottom", sensor.last_bottom_date)):
+        expected = sensor.pivot_value(date, "low") if date is not None else None
+        assert batch.last_pivot_price(vt_symbol, pivot_type, "low") == expected
+
+
+@pytest.mark.parametrize("ptype", ["HL", "OC"])
+@pytest.mark.parametrize("valid_bars", [3, 5])
+def test_batch_equals_scalar_sensors(ptype, valid_bars):
+    rng = np.random.default_rng(valid_bars)
+    frames = {f"s{i}.SSE": make_frame(120, i * 7 + valid_bars) for i in range(12)}
+    history = {s: int(rng.integers(0, 50)) for s in frames}
+    # 一部分标的用历史数据批量初始化，其余的之后才逐根加入
+    init_symbols = [s for i, s in enumerate(frames) if i < 8 and history[s] > 0]
+    late = [s for s in frames if s not in init_symbols]
+    for s in late:
+        history[s] = 0
+
+    width = max(history[s] for s in init_symbols)
+    shape = (len(init_symbols), width)
+    dates, highs, lows = np.zeros(shape, np.int64), np.zeros(shape), np.zeros(shape)
+    opens, closes = np.zeros(shape), np.zeros(shape)
+    for r, s in enumerate(init_symbols):
+        df = frames[s].iloc[:history[s]]
+        n = len(df)
+        dates[r, :n] = df.index.as_unit("ns").asi8
+        highs[r, :n], lows[r, :n], opens[r, :n], closes[r, :n] = df.high, df.low, df.open, df.close
+
+    batch = BatchCentrumSensor(valid_bars=valid_bars, ptype=ptype, capacity=4)
+    batch.init_sensor(init_symbols, dates, highs, lows, [history[s] for s in init_symbols], opens, closes)
+    sensors = {s: CentrumSensor(valid_bars=valid_bars, ptype=ptype) for s in frames}
+    for s in init_symbols:
+        sensors[s].init_sensor(frames[s].iloc[:history[s]])
+
+    positions = dict(history)
+    for day in range(60):
+        symbols = [s for s in frames if positions[s] < len(frames[s]) and rng.random() < 0.9]
+        # 新的bar，一次盘中更新，最后再输入最终的bar
+        for step in range(3):
+            rows = []
+            for s in symbols:
+                df = frames[s].iloc[:positions[s] + 1].copy()
+                if step == 1:
+                    df.iloc[-1, 1] += rng.normal(0, 0.3)
+                    df.iloc[-1, 2] -= abs(rng.normal(0, 0.3))
+                    df.iloc[-1, 3] = df.iloc[-1, 1] - 0.01
+                sensors[s].update_bar(df, step == 0)
+                rows.append(df.iloc[-1])
+            batch.update_bars(symbols, [row.name for row in rows], [row.high for row in rows], [row.low for row in rows],
+                              [row.open for row in rows], [row.close for row in rows])
+        for s in symbols:
+            positions[s] += 1
+
+    for s, sensor in sensors.items():
+        if sensor.inited:
+            assert_same(batch, s, sensor)
+    tops = batch.last_positions("top")
+    for row, s in enumerate(batch.symbols):
+        date = sensors[s].last_top_date
+        assert (batch.timestamp(row, tops[row]) if tops[row] >= 0 else None) == date
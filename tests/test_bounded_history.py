@@ -0,0 +1,116 @@
+import random
+
+import pytest
+from vnpy.trader.constant import Interval
+
+from talipp.ohlcv import OHLCV
+
+from ex_vnpy.indicators import PRI
+from ex_vnpy.manager.bar_aggregator import ExInterval
+from ex_vnpy.manager.source_manager import SourceManager
+from ex_vnpy.sensor.supertrend_sensor import SupertrendSensor
+
+from conftest import CAPITAL_FIELDS, generate_bars, intraday_ticks
+
+OHLC = ["open", "high", "low", "close"]
+HLC = ["high", "low", "close"]
+
+TA = {
+    "ema": {"kind": "EMA", "params": [10], "input_values": ["close"], "output_values": "ema", "interval": Interval.DAILY},
+    "macd": {"kind": "MACD", "params": [12, 26, 9], "input_values": ["close"],
+             "output_values": {"macd": "macd", "signal": "signal", "histogram": "histogram"}, "interval": Interval.DAILY},
+    "atr": {"kind": "ATR", "params": [14], "input_values": HLC, "output_values": "atr", "interval": Interval.DAILY},
+    "adx": {"kind": "ADX", "params": [14, 14], "input_values": HLC,
+            "output_values": {"adx": "adx", "plus_di": "plus_di", "minus_di": "minus_di"}, "interval": Interval.DAILY},
+    "asx": {"kind": "ASX", "params": [14, 6], "input_values": OHLC,
+            "output_values": {"asx": "asx", "plus_si": "plus_si", "minus_si": "minus_si"}, "interval": Interval.DAILY},
+    "impulse": {"kind": "Impulse", "params": [12, 26, 9, 13], "input_values": ["close"], "output_values": "impulse",
+                "interval": Interval.DAILY},
+    "chg": {"kind": "ChangePct", "params": [5], "input_values": ["close"], "output_values": "chg", "interval": Interval.DAILY},
+    "contup": {"kind": "ContUp", "params": [], "input_values": ["close"], "output_values": "contup", "interval": Interval.DAILY},
+    "maxup": {"kind": "MaxUpDays", "params": [], "input_values": ["close"], "output_values": "maxup", "interval": Interval.DAILY},
+    "cfni": {"kind": "CFNI", "params": ["turnover"], "input_values": CAPITAL_FIELDS, "output_values": "cfni", "interval": Interval.DAILY},
+    "cfnid": {"kind": "CFNIDays", "params": ["volume"], "input_values": CAPITAL_FIELDS, "output_values": "cfnid", "interval": Interval.DAILY},
+    "cfnis": {"kind": "CFNIS", "params": ["volume"], "input_values": CAPITAL_FIELDS, "output_values": "cfnis", "interval": Interval.DAILY},
+    "cfnisn": {"kind": "CFNISN", "params": ["volume", 5], "input_values": CAPITAL_FIELDS, "output_values": "cfnisn", "interval": Interval.DAILY},
+    "adx_w": {"kind": "ADX", "params": [5, 3], "input_values": HLC,
+              "output_values": {"adx": "adx", "plus_di": "plus_di", "minus_di": "minus_di"}, "interval": Interval.WEEKLY},
+    "asx_w": {"kind": "ASX", "params": [5, 3], "input_values": OHLC,
+              "output_values": {"asx": "asx", "plus_si": "plus_si", "minus_si": "minus_si"}, "interval": Interval.WEEKLY},
+}
+
+
+def assert_same_tail(bounded: list, unbounded: list, name: str):
+    assert len(bounded) > 0, name
+    assert bounded == unbounded[len(unbounded) - len(bounded):], name
+
+
+@pytest.mark.parametrize("seed", [1, 2])
+def test_bounded_indicators_equal_unbounded_with_revises(seed):
+    bars = generate_bars(900, seed=seed)
+    rnd = random.Random(seed)
+    unbounded = SourceManager(bars[:150], ta=TA)
+    bounded = SourceManager(bars[:150], ta=TA, max_history=200)
+    for bar in bars[150:]:
+        for tick in intraday_ticks(bar, rnd, rnd.randint(0, 2)) + [bar]:
+            unbounded.update_bar(tick)
+            bounded.update_bar(tick)
+            for name in TA:
+                expected, actual = unbounded.get_indicator_values(name), bounded.get_indicator_values(name)
+                for key in expected:
+                    assert_same_tail(actual[key], expected[key], (name, key))
+    assert len(bounded.data_df) < 250
+
+
+def test_pri_purge_keeps_inputs_aligned(bars):
+    # PRI只接受OHLCV输入，不经过SourceManager
+    rows = [OHLCV(bar.open_price, bar.high_price, bar.low_price, bar.close_price) for bar in bars]
+    patterns = ["Doji", "Doji2", "Spinning", "Candle", "Revert"]
+    full, purged = PRI(patterns), PRI(patterns)
+    for row in rows[:100]:
+        full.add_input_value(row)
+        purged.add_input_value(row)
+    purged.purge_oldest(60)
+    for row in rows[100:200]:
+        for pri in (full, purged):
+            pri.add_input_value(OHLCV(row.open, row.high * 1.02, row.low, row.high * 1.02))
+            pri.remove_input_value()
+            pri.add_input_value(row)
+        assert len(purged.high) == len(purged.input_values)
+        assert purged.output_values[-1] == full.output_values[-1]
+
+
+def assert_frame_tail(bounded, unbounded, name: str):
+    assert 0 < len(bounded) < len(unbounded), name
+    assert bounded.equals(unbounded.iloc[len(unbounded) - len(bounded):]), name
+
+
+@pytest.mark.filterwarnings("ignore::FutureWarning")
+def test_bounded_structures_equal_unbounded():
+    bars = generate_bars(700, seed=4)
+    rnd = random.Random(4)
+    ta = {name: TA[name] for name in ("atr", "macd", "adx_w")}
+    unbounded = SourceManager(bars[:150], ta=ta, centrum=True)
+    bounded = SourceManager(bars[:150], ta=ta, centrum=True, max_history=200)
+    trends = {}
+    for sm in (unbounded, bounded):
+        trends[sm] = SupertrendSensor("PIVOT", 2, "close", 3, 3)
+        sm.add_history_listener(trends[sm])
+
+    for bar in bars[150:]:
+        for tick in intraday_ticks(bar, rnd, rnd.randint(0, 1)) + [bar]:
+            for sm in (unbounded, bounded):
+                sm.update_bar(tick)
+                trends[sm].update_bar(sm.daily_df, sm.get_indicator_value("atr", "atr"))
+
+    # 周线、月线和中枢探测器都在裁剪之后才第一次使用
+    assert_frame_tail(bounded.data_df, unbounded.data_df, "data_df")
+    assert_frame_tail(bounded.weekly_df, unbounded.weekly_df, "weekly_df")
+    assert_frame_tail(bounded.get_dataframe(ExInterval.MONTHLY), unbounded.get_dataframe(ExInterval.MONTHLY), "monthly")
+    assert_frame_tail(bounded.dc_sensor.pivot_df, unbounded.dc_sensor.pivot_df, "dc pivot_df")
+    assert_frame_tail(bounded.wc_sensor.pivot_df, unbounded.wc_sensor.pivot_df, "wc pivot_df")
+    assert_frame_tail(trends[bounded].supertrend_df, trends[unbounded].supertrend_df, "supertrend_df")
+    for name in ta:
+        expected, actual = unbounded.get_indicator_values(name), bounded.get_indicator_values(name)
+        for key in expected:
+            assert_same_tail(actual[key], expected[key], (name, key))
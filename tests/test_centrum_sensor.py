@@ -0,0 +1,113 @@
+import random
+
+import pytest
+
+from ex_vnpy.manager.bar_store import BarStore
+from ex_vnpy.manager.source_manager import SourceManager
+from ex_vnpy.sensor.centrum_sensor import CentrumSensor, SensorState
+
+from conftest import intraday_ticks
+
+
+def run_source_manager(bars, start: int, seed: int = None) -> SourceManager:
+    """
+    从start开始逐根输入bar，seed不为None时每根bar之前先推送随机的盘中更新
+    """
+    rnd = random.Random(seed)
+    sm = SourceManager(bars[:start], centrum=True, min_size=30)
+    sm.dc_sensor, sm.wc_sensor
+    if seed is not None:
+        # 初始化之后的第一次更新就是盘中更新
+        for tick in intraday_ticks(bars[start - 1], rnd, 2):
+            sm.update_bar(tick)
+        sm.update_bar(bars[start - 1])
+    for bar in bars[start:]:
+        if seed is not None:
+            for tick in intraday_ticks(bar, rnd, rnd.randint(1, 3)):
+                sm.update_bar(tick)
+        sm.update_bar(bar)
+    return sm
+
+
+@pytest.mark.parametrize("seed", [3, 7])
+@pytest.mark.parametrize("start", [60, 62])
+def test_revised_run_equals_final_bars(bars, monkeypatch, start, seed):
+    final = run_source_manager(bars, start)
+
+    init_sizes = []
+    init_sensor = CentrumSensor.init_sensor
+
+    def spy(sensor, source_df):
+        init_sizes.append(len(source_df))
+        return init_sensor(sensor, source_df)
+
+    monkeypatch.setattr(CentrumSensor, "init_sensor", spy)
+    revised = run_source_manager(bars, start, seed)
+
+    # 日线、周线的探测器各初始化一次，盘中更新不会触发重新初始化
+    assert len(init_sizes) == 2
+    for name in ("dc_sensor", "wc_sensor"):
+        expected, actual = getattr(final, name), getattr(revised, name)
+        assert actual.pivot_df.equals(expected.pivot_df)
+        assert actual.zone_tracker.all_zones() == expected.zone_tracker.all_zones()
+
+
+@pytest.mark.parametrize("ptype", ["HL", "OC"])
+def test_checkpoint_rollback_equals_final_bars(bars, ptype):
+    data = SourceManager(bars).data_df
+    rnd = random.Random(5)
+    final, revised = CentrumSensor(ptype=ptype), CentrumSensor(ptype=ptype)
+    final.init_sensor(data.iloc[:50])
+    revised.init_sensor(data.iloc[:50])
+    for i in range(49, len(data)):
+        source_df = data.iloc[:i + 1]
+        if i >= 50:
+            final.update_bar(source_df, True)
+            revised.update_bar(source_df, True)
+        for _ in range(rnd.randint(0, 3)):
+            tick = source_df.copy()
+            tick.iloc[-1, tick.columns.get_loc("high")] *= 1 + rnd.random() * 0.05
+            tick.iloc[-1, tick.columns.get_loc("low")] *= 1 - rnd.random() * 0.05
+            tick.iloc[-1, tick.columns.get_loc("close")] *= 1 + rnd.gauss(0, 0.03)
+            revised.update_bar(tick, False)
+        revised.update_bar(source_df, False)
+
+        assert revised.inited
+        for name in SensorState.__slots__:
+            assert getattr(revised, name) == getattr(final, name), name
+    assert revised.pivot_df.equals(final.pivot_df)
+
+
+def test_update_reads_only_the_last_bar(bars, monkeypatch):
+    sm = SourceManager(bars[:100], centrum=True, min_size=30)
+    sm.dc_sensor, sm.wc_sensor
+    calls = []
+    to_dataframe = BarStore.to_dataframe
+
+    def spy(store):
+        calls.append(len(store))
+        return to_dataframe(store)
+
+    monkeypatch.setattr(BarStore, "to_dataframe", spy)
+    for bar in bars[100:]:
+        sm.update_bar(bar)
+    assert calls == []
+
+    monkeypatch.setattr(BarStore, "to_dataframe", to_dataframe)
+    for name, data in (("dc_sensor", sm.daily_df), ("wc_sensor", sm.weekly_df)):
+        expected = CentrumSensor()
+        expected.init_sensor(data)
+        assert getattr(sm, name).pivot_df.equals(expected.pivot_df)
+
+
+def test_returned_pivot_df_is_a_copy(bars):
+    sm = SourceManager(bars, centrum=True, min_size=30)
+    sensor = sm.dc_sensor
+    expected = sensor.pivot_df
+    today = expected.index[-1]
+    # 最新的backup pivot在背离范围内外两种情况
+    for last_signal_days in (0, 10000):
+        for df in (sensor.pivot_df, sensor.latest_pivot_df(last_signal_days, today)):
+            df.loc[:, ["pivot", "high", "low"]] = 0
+        assert sensor.pivot_df.equals(expected)
+        assert sensor.pivot_store.frame().equals(expected)
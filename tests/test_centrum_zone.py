@@ -0,0 +1,58 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from ex_vnpy.sensor.centrum_sensor import CentrumSensor
+from ex_vnpy.sensor.centrum_zone import CentrumZone
+
+
+def rebuild_zones(pivots) -> list:
+    """
+    直接按定义从全部确认的pivot重新划分中枢
+    """
+    strokes = [(p0[0], p1[0], min(p0[2], p1[2]), max(p0[2], p1[2])) for p0, p1 in zip(pivots, pivots[1:])]
+    zones, i = [], 0
+    while i + 2 < len(strokes):
+        zg, zd = min(s[3] for s in strokes[i:i + 3]), max(s[2] for s in strokes[i:i + 3])
+        if zg <= zd:
+            i += 1
+            continue
+        j = i + 3
+        while j < len(strokes) and strokes[j][2] < zg and strokes[j][3] > zd:
+            j += 1
+        window = strokes[i:j]
+        zones.append(CentrumZone(window[0][0], window[-1][1], zg, zd, max(s[3] for s in window),
+                                 min(s[2] for s in window), j - i, i))
+        i = j
+    return zones
+
+
+@pytest.mark.parametrize("ptype", ["HL", "OC"])
+@pytest.mark.parametrize("seed", [0, 1, 2])
+def test_incremental_zones_equal_rebuild(ptype, seed):
+    rng = np.random.default_rng(seed)
+    n = 300
+    close = 10 + np.cumsum(rng.normal(0, 0.3, n))
+    open_ = close + rng.normal(0, 0.1, n)
+    high = np.maximum(open_, close) + rng.random(n) * 0.3
+    low = np.minimum(open_, close) - rng.random(n) * 0.3
+    index = pd.date_range("2020-01-01", periods=n, freq="D", name="datetime")
+    data = pd.DataFrame({"open": open_, "high": high, "low": low, "close": close}, index=index)
+
+    sensor = CentrumSensor(ptype=ptype)
+    sensor.init_sensor(data.iloc[:100])
+    zones = 0
+    for i in range(100, n):
+        sensor.update_bar(data.iloc[:i + 1], True)
+        # 盘中更新之后再回到最终的bar
+        tick = data.iloc[:i + 1].copy()
+        tick.iloc[-1, 1] += rng.random() * 0.5
+        tick.iloc[-1, 2] -= rng.random() * 0.5
+        sensor.update_bar(tick, False)
+        sensor.update_bar(data.iloc[:i + 1], False)
+
+        pivots = sensor.pivot_store.confirmed_pivots()
+        assert sensor.zone_tracker.pivots == pivots
+        assert sensor.zone_tracker.all_zones() == rebuild_zones(pivots)
+        zones = len(sensor.zone_tracker)
+    assert zones > 0
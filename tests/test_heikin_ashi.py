@@ -0,0 +1,27 @@
+import numpy as np
+
+from ex_vnpy.manager.heikin_ashi import heikin_ashi_values
+from ex_vnpy.manager.source_manager import SourceManager
+
+HA_COLUMNS = ['ha_open', 'ha_high', 'ha_low', 'ha_close']
+
+
+def test_batch_equals_incremental(bars):
+    batch = SourceManager(bars)
+    incremental = SourceManager(bars[:1])
+    for bar in bars[1:]:
+        incremental.update_bar(bar)
+    for name in HA_COLUMNS:
+        assert np.array_equal(batch.store.column(name), incremental.store.column(name)), name
+
+
+def test_recurrence():
+    open_ = np.array([10.0, 11.0, 12.0])
+    high, low, close = open_ + 1, open_ - 1, open_ + 0.5
+    ha_open, ha_high, ha_low, ha_close = heikin_ashi_values(open_, high, low, close)
+    assert ha_open[0] == open_[0]
+    for i in range(1, len(open_)):
+        assert ha_open[i] == (ha_open[i - 1] + ha_close[i - 1]) / 2
+    assert np.array_equal(ha_high, np.maximum(np.maximum(high, ha_open), ha_close))
+    assert np.array_equal(ha_low, np.minimum(np.minimum(low, ha_open), ha_close))
+    assert [len(a) for a in heikin_ashi_values(*[np.empty(0)] * 4)] == [0, 0, 0, 0]
@@ -0,0 +1,58 @@
+import random
+
+import pytest
+from vnpy.trader.constant import Interval
+
+from ex_vnpy.manager.source_manager import SourceManager
+
+from conftest import CAPITAL_FIELDS, generate_bars, intraday_ticks
+
+HLC = ["high", "low", "close"]
+
+TA = {
+    "ema": {"kind": "EMA", "params": [13], "input_values": ["close"], "output_values": "ema", "interval": Interval.DAILY},
+    "macd": {"kind": "MACD", "params": [12, 26, 9], "input_values": ["close"],
+             "output_values": {"macd": "macd", "signal": "signal", "histogram": "histogram"}, "interval": Interval.DAILY},
+    "impulse": {"kind": "Impulse", "params": [12, 26, 9, 13], "input_values": ["close"], "output_values": "impulse",
+                "interval": Interval.DAILY},
+    "atr": {"kind": "ATR", "params": [14], "input_values": HLC, "output_values": "atr", "interval": Interval.DAILY},
+    "asx": {"kind": "ASX", "params": [14, 6], "input_values": ["open"] + HLC,
+            "output_values": {"asx": "asx", "plus_si": "plus_si", "minus_si": "minus_si"}, "interval": Interval.DAILY},
+    "adx": {"kind": "ADX", "params": [14, 14], "input_values": HLC,
+            "output_values": {"adx": "adx", "plus_di": "plus_di", "minus_di": "minus_di"}, "interval": Interval.DAILY},
+    "cfni": {"kind": "CFNI", "params": ["volume"], "input_values": CAPITAL_FIELDS, "output_values": "cfni", "interval": Interval.DAILY},
+    "cfnid": {"kind": "CFNIDays", "params": ["volume"], "input_values": CAPITAL_FIELDS, "output_values": "cfnid", "interval": Interval.DAILY},
+    "cfnis": {"kind": "CFNIS", "params": ["volume"], "input_values": CAPITAL_FIELDS, "output_values": "cfnis", "interval": Interval.DAILY},
+    "cfnisn": {"kind": "CFNISN", "params": ["volume", 5], "input_values": CAPITAL_FIELDS, "output_values": "cfnisn", "interval": Interval.DAILY},
+    "ema_copy": {"kind": "EMA", "params": [13], "input_values": ["close"], "output_values": "ema", "interval": Interval.DAILY},
+    "ema_w": {"kind": "EMA", "params": [13], "input_values": ["close"], "output_values": "ema", "interval": Interval.WEEKLY},
+}
+
+
+def test_shared_sub_indicators():
+    sm = SourceManager(generate_bars(100), ta=TA)
+    ind = sm.indicators
+    assert ind["impulse"].macd is ind["macd"] and ind["impulse"].ema is ind["ema"]
+    assert ind["asx"].atr is ind["atr"]
+    assert ind["cfnid"].cfni is ind["cfnis"].cfni is ind["cfnisn"].cfni is ind["cfni"]
+    assert ind["ema_copy"] is ind["ema"]
+    # 周期不同的不共享
+    assert ind["ema_w"] is not ind["ema"]
+
+
+@pytest.mark.parametrize("bulk_warmup", [False, True])
+@pytest.mark.parametrize("max_history", [None, 120])
+def test_shared_indicators_equal_independent(bulk_warmup, max_history):
+    bars = generate_bars(400, seed=3)
+    rnd = random.Random(3)
+    shared = SourceManager(bars[:150], ta=TA, bulk_warmup=bulk_warmup, max_history=max_history)
+    # 每个指标单独一个SourceManager，各自构建私有的子指标
+    independent = {name: SourceManager(bars[:150], ta={name: setting}, bulk_warmup=bulk_warmup, max_history=max_history)
+                   for name, setting in TA.items()}
+    for bar in bars[150:]:
+        for tick in intraday_ticks(bar, rnd, rnd.randint(0, 2)) + [bar]:
+            shared.update_bar(tick)
+            for sm in independent.values():
+                sm.update_bar(tick)
+        for name, sm in independent.items():
+            assert shared.get_indicator_values(name) == sm.get_indicator_values(name), name
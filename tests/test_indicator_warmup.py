@@ -0,0 +1,75 @@
+import random
+
+import pytest
+from vnpy.trader.constant import Interval
+
+import talipp.indicators as tainds
+from ex_vnpy.manager import indicator_graph, indicator_warmup
+from ex_vnpy.manager.source_manager import SourceManager
+
+from conftest import CAPITAL_FIELDS, intraday_ticks
+
+TA = {
+    "ema": {"kind": "EMA", "params": [10], "input_values": ["close"], "output_values": "ema", "interval": Interval.DAILY},
+    "macd": {"kind": "MACD", "params": [12, 26, 9], "input_values": ["close"],
+             "output_values": {"macd": "macd", "signal": "signal", "histogram": "histogram"}, "interval": Interval.DAILY},
+    "atr": {"kind": "ATR", "params": [14], "input_values": ["high", "low", "close"], "output_values": "atr", "interval": Interval.DAILY},
+    "adx": {"kind": "ADX", "params": [14, 14], "input_values": ["high", "low", "close"],
+            "output_values": {"adx": "adx", "plus_di": "plus_di", "minus_di": "minus_di"}, "interval": Interval.DAILY},
+    "adx_w": {"kind": "ADX", "params": [5, 3], "input_values": ["high", "low", "close"],
+              "output_values": {"adx": "adx", "plus_di": "plus_di", "minus_di": "minus_di"}, "interval": Interval.WEEKLY},
+    "impulse_w": {"kind": "Impulse", "params": [12, 26, 9, 13], "input_values": ["close"], "output_values": "impulse", "interval": Interval.WEEKLY},
+    "cfni": {"kind": "CFNI", "params": ["turnover"], "input_values": CAPITAL_FIELDS, "output_values": "cfni", "interval": Interval.DAILY},
+    "cfnis": {"kind": "CFNIS", "params": ["volume"], "input_values": CAPITAL_FIELDS, "output_values": "cfnis", "interval": Interval.DAILY},
+    "cfnisn": {"kind": "CFNISN", "params": ["volume", 5], "input_values": CAPITAL_FIELDS, "output_values": "cfnisn", "interval": Interval.DAILY},
+    "cfnid": {"kind": "CFNIDays", "params": ["volume"], "input_values": CAPITAL_FIELDS, "output_values": "cfnid", "interval": Interval.DAILY},
+    "chg": {"kind": "ChangePct", "params": [5], "input_values": ["close"], "output_values": "chg", "interval": Interval.DAILY},
+    "contup": {"kind": "ContUp", "params": [], "input_values": ["close"], "output_values": "contup", "interval": Interval.DAILY},
+}
+
+INTERNALS = ('tr', 'pdm', 'mdm', 'spdm', 'smdm', 'pdi', 'mdi', 'dx')
+
+
+def indicator_state(ind) -> list:
+    """
+    指标的输出以及内部序列，包括子指标
+    """
+    state = [len(ind.input_values), list(ind.output_values)]
+    state += [list(getattr(ind, name)) for name in INTERNALS if hasattr(ind, name)]
+    state += [indicator_state(sub) for sub in ind.sub_indicators]
+    return state
+
+
+@pytest.mark.parametrize("size", [1, 14, 15, 40, 150])
+def test_warmup_equals_replay(bars, monkeypatch, size):
+    replay = SourceManager(bars[:size], ta=TA, min_size=100)
+
+    warmed = []
+
+    def spy(ind, inputs, columns):
+        ok = indicator_warmup.warm_up(ind, inputs, columns)
+        warmed.append(ok)
+        return ok
+
+    monkeypatch.setattr(indicator_graph, "warm_up", spy)
+    warmup = SourceManager(bars[:size], ta=TA, min_size=100, bulk_warmup=True)
+    assert any(warmed)
+    for name in TA:
+        assert indicator_state(warmup.indicators[name]) == indicator_state(replay.indicators[name]), name
+
+    # 之后的新bar、盘中更新跟逐个输入初始化的结果一致
+    rnd = random.Random(size)
+    for bar in bars[size:size + 80]:
+        for tick in intraday_ticks(bar, rnd, rnd.randint(0, 2)) + [bar]:
+            replay.update_bar(tick)
+            warmup.update_bar(tick)
+    for name in TA:
+        assert warmup.get_indicator_values(name) == replay.get_indicator_values(name), name
+        assert indicator_state(warmup.indicators[name]) == indicator_state(replay.indicators[name]), name
+
+
+def test_unverified_talipp_falls_back_to_replay(monkeypatch):
+    monkeypatch.setattr(indicator_warmup, "TALIPP_VERIFIED", False)
+    ind = tainds.EMA(3)
+    assert not indicator_warmup.warm_up(ind, [1.0, 2.0, 3.0], {})
+    assert len(ind.output_values) == 0
@@ -0,0 +1,46 @@
+import random
+
+import pandas as pd
+import pytest
+
+from ex_vnpy.sensor.pivot_store import PivotStore
+
+
+def snapshot(store: PivotStore):
+    return store.to_dataframe().copy(), list(store.events), list(store.tops), list(store.bottoms)
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_rollback_restores_checkpoint(seed):
+    rnd = random.Random(seed)
+    index = pd.date_range("2020-01-01", periods=50, freq="D", name="datetime")
+    store = PivotStore.from_index(index)
+    for pos in range(len(index)):
+        store.set_pivot(pos, rnd.choice([0, 0, 1, -1, 2, -2, 3, -5]), rnd.random(), rnd.random())
+
+    for step in range(20):
+        store.begin_undo()
+        expected = snapshot(store)
+        # 改写最近的几行，并追加新的行
+        for _ in range(rnd.randint(1, 6)):
+            pos = rnd.randint(len(store) - 5, len(store) - 1)
+            action = rnd.choice(["pivot", "bar", "flag", "reset"])
+            if action == "pivot":
+                store.set_pivot(pos, rnd.choice([0, 1, -1, 2, -2, 4]), rnd.random(), rnd.random())
+            elif action == "bar":
+                store.set_bar(pos, rnd.random(), rnd.random())
+            elif action == "flag":
+                store.add_flag(pos, rnd.choice([1, 2, 4]))
+            else:
+                store.reset_row(store.timestamp(pos), rnd.random(), rnd.random())
+        if rnd.random() < 0.5:
+            store.reset_row(store.timestamp(len(store) - 1) + pd.Timedelta(days=1), 1.0, 0.5)
+            store.set_pivot(len(store) - 1, 1, 1.0, 0.5)
+
+        store.rollback()
+        df, events, tops, bottoms = expected
+        assert store.to_dataframe().equals(df)
+        assert (store.events, store.tops, store.bottoms) == (events, tops, bottoms)
+
+        # 下一步在检查点之后追加一行
+        store.reset_row(store.timestamp(len(store) - 1) + pd.Timedelta(days=1), 1.0, 0.5)
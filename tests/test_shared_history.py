@@ -0,0 +1,54 @@
+import random
+
+import numpy as np
+import pytest
+from vnpy.trader.constant import Interval
+
+from ex_vnpy.manager.source_manager import SourceManager
+
+from conftest import CAPITAL_FIELDS, intraday_ticks
+
+TA = {
+    "ema": {"kind": "EMA", "params": [10], "input_values": ["close"], "output_values": "ema", "interval": Interval.DAILY},
+    "adx_w": {"kind": "ADX", "params": [5, 3], "input_values": ["high", "low", "close"],
+              "output_values": {"adx": "adx", "plus_di": "plus_di", "minus_di": "minus_di"}, "interval": Interval.WEEKLY},
+    "cfnisn": {"kind": "CFNISN", "params": ["volume", 5], "input_values": CAPITAL_FIELDS, "output_values": "cfnisn",
+               "interval": Interval.DAILY},
+}
+
+
+def assert_same_manager(actual: SourceManager, expected: SourceManager):
+    assert actual.state_key() == expected.state_key()
+    assert actual.data_df.equals(expected.data_df)
+    assert actual.weekly_df.equals(expected.weekly_df)
+    for name in TA:
+        assert actual.get_indicator_values(name) == expected.get_indicator_values(name), name
+    assert actual.dc_sensor.pivot_df.equals(expected.dc_sensor.pivot_df)
+    assert actual.wc_sensor.pivot_df.equals(expected.wc_sensor.pivot_df)
+
+
+@pytest.mark.parametrize("max_history", [None, 150])
+def test_shared_history_equals_private_copy(bars, tmp_path, max_history):
+    options = {"ta": TA, "centrum": True, "min_size": 30, "max_history": max_history}
+    directory = str(tmp_path)
+    SourceManager(bars[:200]).share_history(directory, reserve=50)
+
+    vt_symbol = bars[0].vt_symbol
+    shared = [SourceManager.from_shared_history(directory, vt_symbol, **options) for _ in range(2)]
+    private = SourceManager(bars[:200], **options)
+    assert isinstance(shared[0].store.arrays["close"], np.memmap)
+    for sm in shared:
+        assert_same_manager(sm, private)
+
+    # 新的bar超出预留的容量，并且有盘中更新
+    rnd = random.Random(7)
+    for bar in bars[200:]:
+        for tick in intraday_ticks(bar, rnd, rnd.randint(0, 2)) + [bar]:
+            for sm in shared + [private]:
+                sm.update_bar(tick)
+    for sm in shared:
+        assert_same_manager(sm, private)
+
+    # 挂载方的写入不会改动共享段
+    attached = SourceManager.from_shared_history(directory, vt_symbol)
+    assert attached.data_df.equals(SourceManager(bars[:200]).data_df)
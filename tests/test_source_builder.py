@@ -0,0 +1,64 @@
+import os
+from datetime import datetime
+
+import pytest
+from vnpy.trader.constant import Interval
+
+from ex_vnpy.manager.source_builder import build_source_managers
+from ex_vnpy.manager.source_manager import SourceManager
+from ex_vnpy.sensor.centrum_sensor import SensorState
+
+from conftest import generate_bars
+
+TA = {
+    "ema": {"kind": "EMA", "params": [10], "input_values": ["close"], "output_values": "ema", "interval": Interval.DAILY},
+    "impulse": {"kind": "Impulse", "params": [12, 26, 9, 13], "input_values": ["close"], "output_values": "impulse",
+                "interval": Interval.DAILY},
+    "adx_w": {"kind": "ADX", "params": [5, 3], "input_values": ["high", "low", "close"],
+              "output_values": {"adx": "adx", "plus_di": "plus_di", "minus_di": "minus_di"}, "interval": Interval.WEEKLY},
+    "cfnisn": {"kind": "CFNISN", "params": ["volume", 5], "input_values": ["volume_XL_in", "volume_XL_out"],
+               "output_values": "cfnisn", "interval": Interval.DAILY},
+}
+
+
+def universe_bars() -> dict:
+    bars = {f"60000{i}.SSE": generate_bars(260 - 30 * i, seed=i + 1, start=datetime(2019, 1, 2 + i), symbol=f"60000{i}")
+            for i in range(4)}
+    bars["600009.SSE"] = []
+    return bars
+
+
+def assert_same_manager(actual: SourceManager, expected: SourceManager):
+    assert actual.state_key() == expected.state_key()
+    assert actual.data_df.equals(expected.data_df)
+    assert actual.weekly_df.equals(expected.weekly_df)
+    for name in TA:
+        assert actual.get_indicator_values(name) == expected.get_indicator_values(name), name
+    for name in ("dc_sensor", "wc_sensor"):
+        sensor, other = getattr(actual, name), getattr(expected, name)
+        assert sensor.pivot_df.equals(other.pivot_df), name
+        for slot in SensorState.__slots__:
+            assert getattr(sensor, slot) == getattr(other, slot), (name, slot)
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_parallel_build_equals_serial(workers):
+    bars = universe_bars()
+    managers = build_source_managers(list(bars), bars.get, ta=TA, workers=workers, centrum=True, min_size=30)
+    assert list(managers) == list(bars)
+    for vt_symbol, symbol_bars in bars.items():
+        expected = SourceManager(symbol_bars, ta=TA, centrum=True, min_size=30)
+        if symbol_bars:
+            assert_same_manager(managers[vt_symbol], expected)
+        else:
+            assert managers[vt_symbol].count == 0
+
+
+def test_build_to_state_dir(tmp_path):
+    bars = universe_bars()
+    symbols = [vt_symbol for vt_symbol in bars if bars[vt_symbol]]
+    paths = build_source_managers(symbols, bars.get, ta=TA, workers=2, state_dir=str(tmp_path), centrum=True, min_size=30)
+    for vt_symbol in symbols:
+        assert os.path.dirname(paths[vt_symbol]) == str(tmp_path)
+        loaded = SourceManager.load_state(paths[vt_symbol], ta=TA, bars=bars[vt_symbol])
+        assert_same_manager(loaded, SourceManager(bars[vt_symbol], ta=TA, centrum=True, min_size=30))
@@ -0,0 +1,122 @@
+import random
+
+import pytest
+from vnpy.trader.constant import Interval
+
+from ex_vnpy.manager.source_manager import STATE_FIELDS, TRANSIENT_FIELDS, SourceManager
+from ex_vnpy.sensor.centrum_sensor import SensorState
+
+from conftest import intraday_ticks
+
+TA = {
+    "ema": {"kind": "EMA", "params": [10], "input_values": ["close"], "output_values": "ema", "interval": Interval.DAILY},
+    "macd": {"kind": "MACD", "params": [12, 26, 9], "input_values": ["close"],
+             "output_values": {"macd": "macd", "signal": "signal", "histogram": "histogram"}, "interval": Interval.DAILY},
+    "adx_w": {"kind": "ADX", "params": [5, 3], "input_values": ["high", "low", "close"],
+              "output_values": {"adx": "adx", "plus_di": "plus_di", "minus_di": "minus_di"}, "interval": Interval.WEEKLY},
+}
+
+
+def test_indicator_values_are_read_only(bars):
+    sm = SourceManager(bars[:100], ta=TA)
+    expected = {name: sm.get_indicator_values(name) for name in TA}
+
+    for name in TA:
+        outputs = sm.get_indicator_values(name)
+        key = next(iter(outputs))
+        # 同一根bar内重复读取返回同一个视图，不再复制
+        assert sm.get_indicator_value(name, key) is outputs[key]
+        with pytest.raises(TypeError):
+            outputs[key][0] = None
+        outputs[key] = ()
+        outputs.clear()
+        assert sm.get_indicator_values(name) == expected[name]
+
+    fresh = SourceManager(bars[:101], ta=TA)
+    sm.update_bar(bars[100])
+    for name in TA:
+        assert sm.get_indicator_values(name) == fresh.get_indicator_values(name)
+
+
+def feed(sm: SourceManager, bars, rnd: random.Random):
+    for bar in bars:
+        for tick in intraday_ticks(bar, rnd, rnd.randint(0, 2)):
+            sm.update_bar(tick)
+        sm.update_bar(bar)
+
+
+def assert_same_managers(actual: SourceManager, expected: SourceManager, ta: dict = TA):
+    for interval in (Interval.DAILY, Interval.WEEKLY):
+        assert actual.get_store(interval).to_dataframe().equals(expected.get_store(interval).to_dataframe()), interval
+    for name in ta:
+        assert actual.get_indicator_values(name) == expected.get_indicator_values(name), name
+    for name in ("dc_sensor", "wc_sensor"):
+        sensor, other = getattr(actual, name), getattr(expected, name)
+        assert sensor.pivot_df.equals(other.pivot_df), name
+        for slot in SensorState.__slots__:
+            assert getattr(sensor, slot) == getattr(other, slot), (name, slot)
+        assert sensor.zone_tracker.all_zones() == other.zone_tracker.all_zones(), name
+
+
+def test_lazy_structures_equal_eager(bars):
+    ta = {name: setting for name, setting in TA.items() if setting["interval"] == Interval.DAILY}
+    eager = SourceManager(bars[:120], ta=ta, centrum=True, min_size=30)
+    eager.build_lazy_structures()
+    lazy = SourceManager(bars[:120], ta=ta, centrum=True, min_size=30)
+    feed(eager, bars[120:300], random.Random(17))
+    feed(lazy, bars[120:300], random.Random(17))
+
+    # 没有用到的周线、月线和中枢探测器一直没有创建
+    assert set(lazy.aggregators) == set() and lazy.sensors == {}
+    assert lazy.monthly_df.equals(eager.monthly_df)
+    assert_same_managers(lazy, eager, ta)
+
+    # 首次访问之后跟一开始就创建的一样增量更新
+    feed(eager, bars[300:], random.Random(19))
+    feed(lazy, bars[300:], random.Random(19))
+    assert lazy.monthly_df.equals(eager.monthly_df)
+    assert_same_managers(lazy, eager, ta)
+
+
+@pytest.mark.parametrize("revised", [False, True])
+def test_state_round_trip(bars, tmp_path, revised):
+    rnd = random.Random(11)
+    sm = SourceManager(bars[:120], ta=TA, centrum=True, min_size=30)
+    sm.dc_sensor, sm.wc_sensor
+    feed(sm, bars[120:200], rnd)
+    if revised:
+        # 快照保存时最后一根bar尚未完成，恢复时由最终的bar更新
+        sm.update_bar(intraday_ticks(bars[200], rnd, 1)[0])
+
+    path = sm.save_state(str(tmp_path))
+    loaded = SourceManager.load_state(path, ta=TA, bars=bars[:201])
+    sm.update_bar(bars[200])
+    assert_same_managers(loaded, sm)
+
+    # 恢复之后继续增量更新，跟从未保存过的一致
+    feed(loaded, bars[201:], random.Random(13))
+    feed(sm, bars[201:], random.Random(13))
+    assert_same_managers(loaded, sm)
+
+
+def test_state_fields_cover_all_attributes(bars):
+    # 新增的属性必须显式地决定是否进入快照，否则快照格式会在不改版本号的情况下变化
+    sm = SourceManager(bars[:250], ta=TA, centrum=True, max_history=100)
+    for bar in bars[250:]:
+        sm.update_bar(bar)
+    sm.dc_sensor, sm.wc_sensor, sm.calendar, sm.recent_week_high(3)
+    assert set(vars(sm)) == set(STATE_FIELDS) | set(TRANSIENT_FIELDS)
+
+
+def test_state_discarded_when_ta_changes(bars, tmp_path):
+    path = SourceManager(bars[:120], ta=TA).save_state(str(tmp_path))
+    ta = dict(TA, ema=dict(TA["ema"], params=[20]))
+    assert SourceManager.load_state(path, ta=ta) is None
+
+
+@pytest.mark.parametrize("week_num", [0, 1, 3, 1000])
+def test_last_week_hl_gap(bars, week_num):
+    sm = SourceManager(bars[:100])
+    weekly = sm.weekly_df
+    data = weekly.iloc[-1 * min(week_num, len(weekly))]
+    assert sm.last_week_hl_gap(week_num) == (data['high'] - data['low']) / data['close']
@@ -0,0 +1,19 @@
+from datetime import timedelta
+
+from ex_vnpy.manager.source_manager import SourceManager
+from ex_vnpy.manager.trading_calendar import DUPLICATE_DAYS, DUPLICATE_TRADING_DAYS, in_duplicate_window
+
+
+def test_duplicate_window_counts_trading_days(bars):
+    calendar = SourceManager(bars[:200]).calendar
+    order_date = bars[120].datetime
+    for offset in range(1, 40):
+        today = bars[120 + offset].datetime
+        assert in_duplicate_window(order_date, today, calendar) == (offset <= DUPLICATE_TRADING_DAYS), offset
+
+
+def test_duplicate_window_without_calendar_uses_calendar_days(bars):
+    order_date = bars[120].datetime
+    for days in range(0, 30):
+        today = order_date + timedelta(days=days)
+        assert in_duplicate_window(order_date, today) == (days <= DUPLICATE_DAYS), days
@@ -0,0 +1,83 @@
+import random
+from collections import defaultdict
+from datetime import datetime
+
+import pytest
+from vnpy.trader.constant import Interval
+
+from ex_vnpy.manager.source_manager import SourceManager
+from ex_vnpy.manager.universe_source_manager import UniverseSourceManager
+
+from conftest import generate_bars, intraday_ticks
+
+TA = {
+    "ema": {"kind": "EMA", "params": [10], "input_values": ["close"], "output_values": "ema", "interval": Interval.DAILY},
+    "adx": {"kind": "ADX", "params": [14, 14], "input_values": ["high", "low", "close"],
+            "output_values": {"adx": "adx", "plus_di": "plus_di", "minus_di": "minus_di"}, "interval": Interval.DAILY},
+    "cfnisn": {"kind": "CFNISN", "params": ["volume", 5], "input_values": ["volume_XL_in", "volume_XL_out"],
+               "output_values": "cfnisn", "interval": Interval.DAILY},
+}
+
+
+def universe_bars() -> dict:
+    """
+    4个标的，上市时间不同，各自随机停牌
+    """
+    starts = [datetime(2019, 1, 2), datetime(2019, 1, 2), datetime(2019, 3, 4), datetime(2019, 6, 3)]
+    return {f"60000{i}.SSE": generate_bars(220 - 40 * i, seed=i + 1, start=start, symbol=f"60000{i}")
+            for i, start in enumerate(starts)}
+
+
+def assert_same_manager(actual: SourceManager, expected: SourceManager):
+    assert actual.data_df.equals(expected.data_df)
+    assert actual.weekly_df.equals(expected.weekly_df)
+    for name in TA:
+        assert actual.get_indicator_values(name) == expected.get_indicator_values(name), name
+    assert actual.dc_sensor.pivot_df.equals(expected.dc_sensor.pivot_df)
+
+
+def feed(universe: UniverseSourceManager, separate: dict, bars: dict, rnd: random.Random):
+    days = defaultdict(list)
+    for symbol_bars in bars.values():
+        for bar in symbol_bars:
+            days[bar.datetime].append(bar)
+    for day in sorted(days):
+        for step in range(2):
+            batch = [intraday_ticks(bar, rnd, 1)[0] if step == 0 else bar for bar in days[day]]
+            universe.update_bars(batch)
+            for bar in batch:
+                separate.setdefault(bar.vt_symbol, SourceManager(ta=TA, centrum=True, min_size=30)).update_bar(bar)
+
+
+def split(bars: dict, size: int):
+    return {s: b[:size] for s, b in bars.items() if size > 0}, {s: b[size:] for s, b in bars.items()}
+
+
+def test_update_bars_equals_separate_managers():
+    history, rest = split(universe_bars(), 60)
+    history = {s: b for s, b in history.items() if s != "600003.SSE"}      # 之后才上市的标的
+    universe = UniverseSourceManager(history, ta=TA, centrum=True, min_size=30)
+    separate = {s: SourceManager(b, ta=TA, centrum=True, min_size=30) for s, b in history.items()}
+    feed(universe, separate, {s: b if s in history else universe_bars()[s] for s, b in rest.items()}, random.Random(1))
+
+    assert set(universe) == set(separate)
+    for vt_symbol, sm in separate.items():
+        assert_same_manager(universe[vt_symbol], sm)
+
+
+def test_panel_state_round_trip(tmp_path):
+    history, rest = split(universe_bars(), 60)
+    universe = UniverseSourceManager(history, ta=TA, centrum=True, min_size=30)
+    separate = {s: SourceManager(b, ta=TA, centrum=True, min_size=30) for s, b in history.items()}
+    vt_symbol = "600001.SSE"
+    path = universe[vt_symbol].save_state(str(tmp_path))
+
+    # 快照是独立的副本，之后BarPanel的更新不会影响它
+    feed(universe, separate, rest, random.Random(2))
+    loaded = SourceManager.load_state(path, ta=TA)
+    assert type(loaded) is SourceManager
+    assert loaded.count == 60
+    for bar in rest[vt_symbol]:
+        loaded.update_bar(bar)
+    assert_same_manager(loaded, separate[vt_symbol])
+    assert_same_manager(universe[vt_symbol], separate[vt_symbol])